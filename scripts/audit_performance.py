@@ -2,87 +2,105 @@
 """
 Performance auditing tool for monitoring upscaling FPS in real-time.
 
-Monitors the output file as it's being written and calculates:
-- Actual processing FPS
-- Real-time multiplier (actual FPS / target FPS)
+Follows a running job's progress feed (srgan_progress.py: a small JSON
+file per job, updated by the pipeline) and calculates:
+- Actual processing FPS (per sample and overall)
+- Per-stage FPS (decode, infer, encode), the lowest is the bottleneck
+- Real-time multiplier (actual FPS / source FPS, taken from the stream)
 - Performance status (STABLE if >= 1.0x, SLOW if < 1.0x)
+
+Each sample is a single small file read; the growing output file is
+never scanned, so sampling costs the same at frame 100 and frame 100000.
 """
 import argparse
 import os
-import subprocess
 import sys
 import time
 
+from srgan_progress import list_progress, progress_dir, read_progress
 
-def check_ffprobe():
-    """Check if ffprobe is available."""
-    try:
-        subprocess.run(
-            ["ffprobe", "-version"],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            check=True
-        )
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
-
-
-def get_frame_count(output_file):
-    """Get current frame count from file using ffprobe."""
-    cmd = [
-        "ffprobe", "-v", "error", "-select_streams", "v:0",
-        "-count_packets", "-show_entries", "stream=nb_read_packets",
-        "-of", "csv=p=0", output_file
-    ]
+FINISHED_STATES = ("complete", "failed", "cancelled")
 
-    try:
-        result = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
-        return int(result.decode().strip())
-    except (subprocess.CalledProcessError, ValueError) as exc:
+
+def find_job(directory, job=None, output=None):
+    """Name (input file name) of the job to follow, or None."""
+    if job:
+        name = os.path.basename(job)
+        return name if read_progress(name, directory) is not None else None
+
+    if output:
+        output_abs = os.path.abspath(output)
+        for data in list_progress(directory, active_only=False):
+            if data.get("output") in (output, output_abs):
+                return data["filename"]
         return None
 
+    # Default: the most recently updated active job
+    jobs = list_progress(directory)
+    return jobs[0]["filename"] if jobs else None
+
+
+def format_stages(stage_fps):
+    """decode/infer/encode rates, e.g. 'dec 80.1 | inf 25.3 | enc 120.0'"""
+    if not stage_fps:
+        return "stages n/a"
+    parts = []
+    for stage, label in (("decode", "dec"), ("infer", "inf"), ("encode", "enc")):
+        fps = stage_fps.get(stage)
+        parts.append(f"{label} {fps:6.1f}" if fps else f"{label}    n/a")
+    return " | ".join(parts)
+
+
+def bottleneck(stage_fps):
+    rates = {stage: fps for stage, fps in (stage_fps or {}).items() if fps}
+    return min(rates, key=rates.get) if rates else None
 
-def get_perf_stats(output_ts_file, target_fps, sample_seconds):
+
+def get_perf_stats(directory, name, target_fps, sample_seconds):
     """Calculates live FPS and real-time multiplier."""
-    print(f"📊 Auditing: {os.path.basename(output_ts_file)}")
-    print(f"🎯 Target FPS: {target_fps}")
+    data = read_progress(name, directory)
+    if data is None:
+        print(f"❌ no progress for {name}")
+        return
+    source_fps = target_fps or data.get("source_fps")
+    if not source_fps:
+        print("❌ Source FPS unknown (not in the progress feed); pass --target-fps")
+        return
+
+    print(f"📊 Auditing: {name}")
+    print(f"🎯 Source FPS: {source_fps:.3f}{' (from stream)' if not target_fps else ''}")
     print(f"⏱️  Sample interval: {sample_seconds}s")
     print()
-    print("Waiting for initial frame count...")
-
-    # Wait for file to have some frames
-    start_frames = None
-    for attempt in range(10):
-        start_frames = get_frame_count(output_ts_file)
-        if start_frames is not None and start_frames > 0:
-            break
-        time.sleep(1)
-
-    if start_frames is None or start_frames == 0:
-        print("❌ Could not read frame count from file")
-        print("   File may be empty or still initializing")
-        return
 
-    print(f"✓ Initial frame count: {start_frames}")
+    start_frames = data.get("frames_done") or 0
+    start_time = data.get("updated_at") or time.time()
+    total = data.get("total_frames")
+    print(f"✓ Initial frame count: {start_frames}" + (f" of {total}" if total else ""))
     print()
     print("Monitoring performance (Press Ctrl+C to stop)...")
     print("-" * 70)
 
-    start_time = time.time()
     last_frames = start_frames
     last_time = start_time
 
     try:
-        while True:
+        while data.get("status") not in FINISHED_STATES:
             time.sleep(sample_seconds)
 
-            current_frames = get_frame_count(output_ts_file)
-            if current_frames is None:
-                print("\r⚠️  Could not read frame count, retrying...", end="", flush=True)
+            data = read_progress(name, directory)
+            if data is None:
+                # Progress files are replaced atomically, so an unreadable one
+                # was removed (pruned) after the job finished
+                data = {"status": "finished", "message": "progress entry removed"}
+                break
+
+            current_frames = data.get("frames_done") or 0
+            current_time = data.get("updated_at") or time.time()
+            if current_time <= last_time:
+                if data.get("stale"):
+                    print("\r⚠️  No progress for a while, the worker may have stopped...", end="", flush=True)
                 continue
 
-            current_time = time.time()
             elapsed_total = current_time - start_time
             elapsed_sample = current_time - last_time
 
@@ -95,7 +113,7 @@ def get_perf_stats(output_ts_file, target_fps, sample_seconds):
             avg_fps = total_frames / elapsed_total if elapsed_total > 0 else 0
 
             # Calculate real-time multiplier
-            multiplier = avg_fps / target_fps if target_fps > 0 else 0
+            multiplier = avg_fps / source_fps if source_fps > 0 else 0
 
             # Determine status
             if multiplier >= 1.0:
@@ -111,6 +129,7 @@ def get_perf_stats(output_ts_file, target_fps, sample_seconds):
                 f"Sample FPS: {sample_fps:6.2f} | "
                 f"Avg FPS: {avg_fps:6.2f} | "
                 f"Multiplier: {multiplier:5.2f}x | "
+                f"{format_stages(data.get('stage_fps'))} | "
                 f"{status}",
                 end="",
                 flush=True
@@ -119,66 +138,83 @@ def get_perf_stats(output_ts_file, target_fps, sample_seconds):
             last_frames = current_frames
             last_time = current_time
 
+        print("\n" + "-" * 70)
+        print(f"Job {data.get('status')}: {data.get('message', '')}")
     except KeyboardInterrupt:
         print("\n" + "-" * 70)
         print("Audit stopped.")
 
-        # Final summary
-        final_frames = get_frame_count(output_ts_file)
-        if final_frames is not None:
-            total_elapsed = time.time() - start_time
-            total_frames = final_frames - start_frames
-            final_avg_fps = total_frames / total_elapsed if total_elapsed > 0 else 0
-            final_multiplier = final_avg_fps / target_fps if target_fps > 0 else 0
-
-            print()
-            print("Final Statistics:")
-            print(f"  Total frames processed: {total_frames}")
-            print(f"  Total time: {total_elapsed:.1f}s")
-            print(f"  Average FPS: {final_avg_fps:.2f}")
-            print(f"  Real-time multiplier: {final_multiplier:.2f}x")
-            print()
-
-            if final_multiplier >= 1.0:
-                print("✅ Performance: GOOD - Processing faster than or equal to real-time")
-            elif final_multiplier >= 0.8:
-                print("⚠️  Performance: ACCEPTABLE - Processing slightly slower than real-time")
-            else:
-                print("❌ Performance: POOR - Processing significantly slower than real-time")
-    except Exception as exc:
-        print(f"\n❌ Error during monitoring: {exc}")
-        sys.exit(1)
+    # Final summary
+    total_elapsed = last_time - start_time
+    total_frames = last_frames - start_frames
+    if total_elapsed <= 0:
+        return
+    final_avg_fps = total_frames / total_elapsed
+    final_multiplier = final_avg_fps / source_fps if source_fps > 0 else 0
+    stage_fps = (data or {}).get("stage_fps")
+
+    print()
+    print("Final Statistics:")
+    print(f"  Total frames processed: {total_frames}")
+    print(f"  Total time: {total_elapsed:.1f}s")
+    print(f"  Average FPS: {final_avg_fps:.2f}")
+    print(f"  Real-time multiplier: {final_multiplier:.2f}x")
+    if stage_fps:
+        print(f"  Stage FPS: {format_stages(stage_fps)}")
+        print(f"  Bottleneck: {bottleneck(stage_fps)}")
+    print()
+
+    if final_multiplier >= 1.0:
+        print("✅ Performance: GOOD - Processing faster than or equal to real-time")
+    elif final_multiplier >= 0.8:
+        print("⚠️  Performance: ACCEPTABLE - Processing slightly slower than real-time")
+    else:
+        print("❌ Performance: POOR - Processing significantly slower than real-time")
+
 
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(
-        description="Audit live upscaling performance by monitoring output FPS.",
+        description="Audit live upscaling performance from the pipeline's progress feed.",
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
-  # Monitor default output file
+  # Monitor the most recently active job
   python3 audit_performance.py
 
-  # Monitor specific file with custom target FPS
-  python3 audit_performance.py --output /data/upscaled/movie.ts --target-fps 24
+  # Monitor the job for a specific input file
+  python3 audit_performance.py --job "Movie (2020).mkv"
+
+  # Monitor the job writing a specific output file
+  python3 audit_performance.py --output /data/upscaled/movie.mkv
 
   # Use shorter sample interval for faster updates
   python3 audit_performance.py --sample-seconds 2
 
   # Use environment variables
-  OUTPUT_FILE=/data/upscaled/movie.ts TARGET_FPS=30 python3 audit_performance.py
+  SRGAN_QUEUE_FILE=./cache/queue.jsonl SAMPLE_SECONDS=2 python3 audit_performance.py
         """
     )
+    parser.add_argument(
+        "--job",
+        default=os.environ.get("AUDIT_JOB"),
+        help="Input file name of the job to follow (default: most recently active job)",
+    )
     parser.add_argument(
         "--output",
-        default=os.environ.get("OUTPUT_FILE", "/mnt/media/upscaled/test_movie.ts"),
-        help="Path to the growing output .ts file (default: %(default)s)",
+        default=os.environ.get("OUTPUT_FILE"),
+        help="Follow the job writing this output file instead",
+    )
+    parser.add_argument(
+        "--progress-dir",
+        default=None,
+        help="Progress feed directory (default: progress/ next to SRGAN_QUEUE_FILE)",
     )
     parser.add_argument(
         "--target-fps",
         type=float,
-        default=float(os.environ.get("TARGET_FPS", "23.976")),
-        help="Expected source FPS (default: %(default)s)",
+        default=float(os.environ["TARGET_FPS"]) if os.environ.get("TARGET_FPS") else None,
+        help="Override the source FPS reported by the job",
     )
     parser.add_argument(
         "--sample-seconds",
@@ -193,16 +229,8 @@ Examples:
     print("=" * 70)
     print()
 
-    # Check prerequisites
-    if not check_ffprobe():
-        print("❌ Error: ffprobe not found")
-        print("   Please install ffmpeg:")
-        print("   - Ubuntu: sudo apt install ffmpeg")
-        print("   - macOS: brew install ffmpeg")
-        sys.exit(1)
-
     # Validate arguments
-    if args.target_fps <= 0:
+    if args.target_fps is not None and args.target_fps <= 0:
         print(f"❌ Error: Invalid target FPS: {args.target_fps}")
         print("   Target FPS must be greater than 0")
         sys.exit(1)
@@ -212,32 +240,24 @@ Examples:
         print("   Sample interval must be greater than 0")
         sys.exit(1)
 
-    # Check if output file exists
-    if not os.path.exists(args.output):
-        print(f"❌ Error: Output file not found: {args.output}")
+    directory = args.progress_dir or progress_dir(os.environ.get("SRGAN_QUEUE_FILE", "./cache/queue.jsonl"))
+    name = find_job(directory, job=args.job, output=args.output)
+    if name is None:
+        target = args.job or args.output
+        print(f"❌ Error: No progress feed for {target}" if target else "❌ Error: No active upscaling job")
+        print(f"   Looked in: {directory}")
         print()
-        print("The file must exist before monitoring can start.")
         print("Start an upscaling job first, then run this script.")
         print()
         print("Example:")
-        print("  1. Start upscaling: docker compose run srgan-upscaler input.mkv output.ts")
-        print("  2. Monitor progress: python3 audit_performance.py --output output.ts")
-        sys.exit(1)
-
-    # Check if file is readable
-    try:
-        with open(args.output, 'rb') as f:
-            f.read(1)
-    except PermissionError:
-        print(f"❌ Error: No permission to read file: {args.output}")
-        sys.exit(1)
-    except Exception as exc:
-        print(f"❌ Error: Cannot read file: {exc}")
+        print("  1. Start upscaling: docker compose run srgan-upscaler input.mkv output.mkv")
+        print("  2. Monitor progress: python3 audit_performance.py --job input.mkv")
         sys.exit(1)
 
     # Start monitoring
     get_perf_stats(
-        args.output,
+        directory,
+        name,
         target_fps=args.target_fps,
         sample_seconds=args.sample_seconds
     )
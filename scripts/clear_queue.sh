@@ -1,6 +1,7 @@
 #!/bin/bash
 # Clear job queue to remove any old HLS/TS jobs
 
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 QUEUE_FILE="${SRGAN_QUEUE_FILE:-./cache/queue.jsonl}"
 
 if [[ -f "$QUEUE_FILE" ]]; then
@@ -22,3 +23,6 @@ else
     echo "Queue file not found: $QUEUE_FILE"
     echo "Nothing to clear."
 fi
+
+# Queued jobs live in the SQLite job store next to the queue file
+SRGAN_QUEUE_FILE="$QUEUE_FILE" python3 "${SCRIPT_DIR}/srgan_queue.py" clear
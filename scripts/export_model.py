@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Export the SRGAN generator to an optimized inference artifact.
+
+Traces _SRGANGenerator from the .pth weights for a given scale and saves
+it next to the weights:
+
+- torchscript (default): keyed by torch version (see
+  srgan_inference.compiled_model_path); both model backends pick it up
+  automatically unless SRGAN_COMPILED_MODEL=0.
+- onnx: dynamic batch/height/width axes, used with SRGAN_BACKEND=onnxruntime.
+
+Usage:
+    python3 export_model.py --weights /app/models/swift_srgan_4x.pth --scale 4
+    python3 export_model.py --device cuda --no-optimize
+    python3 export_model.py --format onnx
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+from srgan_inference import (
+    OnnxRuntimeGenerator,
+    compiled_model_path,
+    export_onnx,
+    export_torchscript,
+    onnx_model_path,
+)
+from your_model_file_ffmpeg import _load_model
+
+
+def _benchmark(model, device, size, runs=3):
+    x = torch.rand(1, 3, size, size, device=device).contiguous(memory_format=torch.channels_last)
+    with torch.no_grad():
+        # TorchScript's profiling executor optimizes after a few calls
+        for _ in range(3):
+            model(x)
+        start = time.time()
+        for _ in range(runs):
+            model(x)
+    return (time.time() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the SRGAN generator for faster inference")
+    parser.add_argument(
+        "--weights",
+        default=os.environ.get("SRGAN_MODEL_PATH", "/app/models/swift_srgan_4x.pth"),
+        help="Generator weights (.pth)",
+    )
+    parser.add_argument("--scale", type=int, default=4, help="Upscale factor (2 or 4)")
+    parser.add_argument(
+        "--format", choices=["torchscript", "onnx"], default="torchscript",
+        help="Artifact type (onnx is for SRGAN_BACKEND=onnxruntime, CPU only)",
+    )
+    parser.add_argument(
+        "--device",
+        default=os.environ.get("SRGAN_DEVICE", "cuda" if torch.cuda.is_available() else "cpu"),
+        help="Device the artifact is built for (cpu or cuda)",
+    )
+    parser.add_argument(
+        "--no-optimize", action="store_true",
+        help="Skip freezing / channels_last (CPU only)",
+    )
+    parser.add_argument(
+        "--benchmark", type=int, default=128, metavar="SIZE",
+        help="Compare eager vs exported latency on a SIZE×SIZE frame (0 to skip)",
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        print(f"ERROR: Weights not found: {args.weights}", file=sys.stderr)
+        return 1
+
+    if args.format == "onnx":
+        args.device = "cpu"
+    eager = _load_model(args.weights, args.device, args.scale, use_compiled=False)
+    if args.format == "onnx":
+        path = onnx_model_path(args.weights, args.scale)
+        print(f"Exporting ONNX model for {args.scale}x...")
+        export_onnx(eager, path)
+        print(f"✓ Saved {path}")
+        exported = OnnxRuntimeGenerator(path)
+    else:
+        path = compiled_model_path(args.weights, args.scale, args.device)
+        print(f"Exporting TorchScript model for {args.device}, {args.scale}x...")
+        export_torchscript(eager, path, args.device, optimize=not args.no_optimize)
+        print(f"✓ Saved {path}")
+        # The file just written, whatever SRGAN_COMPILED_MODEL says
+        exported = torch.jit.load(path, map_location=args.device).eval()
+
+    x = torch.rand(1, 3, 32, 32, device=args.device)
+    with torch.no_grad():
+        diff = (eager(x) - exported(x)).abs().max().item()
+    print(f"✓ Max difference vs eager model: {diff:.2e}")
+
+    if args.benchmark > 0:
+        eager_time = _benchmark(eager, args.device, args.benchmark)
+        exported_time = _benchmark(exported, args.device, args.benchmark)
+        print(f"  Eager:    {eager_time * 1000:.1f} ms/frame")
+        print(f"  Exported: {exported_time * 1000:.1f} ms/frame ({eager_time / exported_time:.2f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -124,6 +124,9 @@ cat > /etc/default/srgan-watchdog-api << EOF
 # Jellyfin API Configuration
 JELLYFIN_URL=${JELLYFIN_URL}
 JELLYFIN_API_KEY=${API_KEY}
+JELLYFIN_SESSIONS_TTL=2
+JELLYFIN_ACTIVE_WITHIN=960
+JELLYFIN_WEBSOCKET=0
 
 # Watchdog Configuration
 UPSCALED_DIR=/mnt/media/upscaled
@@ -131,6 +134,7 @@ SRGAN_QUEUE_FILE=${REPO_DIR}/cache/queue.jsonl
 ENABLE_HLS_STREAMING=1
 HLS_SERVER_HOST=localhost
 HLS_SERVER_PORT=8080
+SRGAN_START_DEBOUNCE_SECONDS=30
 EOF
 
 chmod 600 /etc/default/srgan-watchdog-api
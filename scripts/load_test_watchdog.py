@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Load test for the watchdog: hundreds of concurrent PlaybackStart webhooks
+against a stub Jellyfin.
+
+Starts, in one process:
+- a stub Jellyfin serving /Sessions (N sessions playing real temp files,
+  with configurable latency) that counts upstream calls
+- the watchdog on its production server (make_server) with a temporary
+  queue and a live worker heartbeat, so no container is started
+
+then fires the webhooks from a client thread pool and reports latency
+percentiles, status codes, upstream /Sessions calls and queued jobs.
+Exits 1 if any webhook failed or a file was queued more than once.
+
+Usage:
+    python3 load_test_watchdog.py
+    python3 load_test_watchdog.py --webhooks 1000 --concurrency 300 --latency 0.2
+    python3 load_test_watchdog.py --server werkzeug
+"""
+
+import argparse
+import collections
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+def _stub_jellyfin(sessions, latency):
+    """Threaded stand-in for Jellyfin's /Sessions. Returns (server, url, call counter)."""
+    calls = collections.Counter()
+    body = json.dumps(sessions).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            calls[self.path.split("?")[0]] += 1
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", calls
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_load_test(webhooks=500, concurrency=200, sessions=10, latency=0.05, server_kind=None,
+                  verbose=False):
+    """Run one load test and return its statistics as a dict."""
+    work_dir = tempfile.mkdtemp(prefix="srgan_load_")
+    media = []
+    for index in range(sessions):
+        path = os.path.join(work_dir, f"Movie {index} (2020).mkv")
+        with open(path, "wb") as handle:
+            handle.write(b"\0" * 1024)
+        media.append({
+            "Id": f"session-{index}",
+            "UserName": f"user{index}",
+            "Client": "Load test",
+            "PlayState": {"IsPaused": False},
+            "NowPlayingItem": {"Id": f"item-{index}", "Name": f"Movie {index}", "Path": path},
+        })
+    jellyfin, jellyfin_url, upstream_calls = _stub_jellyfin(media, latency)
+
+    queue_file = os.path.join(work_dir, "queue.jsonl")
+    settings = {
+        "JELLYFIN_URL": jellyfin_url,
+        "JELLYFIN_API_KEY": "load-test",
+        "SRGAN_QUEUE_FILE": queue_file,
+        "SRGAN_PROGRESS_DIR": os.path.join(work_dir, "progress"),
+    }
+    saved_env = {name: os.environ.get(name) for name in settings}
+    os.environ.update(settings)
+    import watchdog_api
+    from srgan_queue import WorkerHeartbeat, open_queue
+    from srgan_supervisor import UpscalerSupervisor
+
+    # The watchdog reads part of its configuration at import time; point it
+    # at this run even if it was imported before
+    watchdog_api.JELLYFIN_URL = jellyfin_url
+    watchdog_api.JELLYFIN_API_KEY = "load-test"
+    watchdog_api._session_client = None
+    watchdog_api.supervisor = UpscalerSupervisor(queue_file)
+    watchdog_api.processed_items.clear()
+    watchdog_api._processed_expiry.clear()
+
+    if not verbose:
+        logging.getLogger("watchdog_api").setLevel(logging.WARNING)
+        logging.getLogger("srgan_jellyfin").setLevel(logging.WARNING)
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    # A live worker, as far as the supervisor can tell: nothing to start
+    heartbeat = WorkerHeartbeat(queue_file, name="load-test")
+    server = watchdog_api.make_server(host="127.0.0.1", port=0, kind=server_kind)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.port}/upscale-trigger"
+
+    def fire(index):
+        payload = {"NotificationType": "PlaybackStart", "ItemId": f"item-{index % sessions}"}
+        start = time.perf_counter()
+        try:
+            status = requests.post(url, json=payload, timeout=60).status_code
+        except requests.exceptions.RequestException as e:
+            status = type(e).__name__
+        return status, time.perf_counter() - start
+
+    try:
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as clients:
+            results = list(clients.map(fire, range(webhooks)))
+        elapsed = time.perf_counter() - began
+        queue_counts = open_queue(queue_file).counts()
+    finally:
+        server.shutdown()
+        jellyfin.shutdown()
+        heartbeat.close()
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    latencies = sorted(latency for _, latency in results)
+    return {
+        "server": server.name,
+        "webhooks": webhooks,
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        "throughput": webhooks / elapsed if elapsed > 0 else 0.0,
+        "status_codes": dict(collections.Counter(status for status, _ in results)),
+        "p50": _percentile(latencies, 0.50),
+        "p95": _percentile(latencies, 0.95),
+        "p99": _percentile(latencies, 0.99),
+        "max": latencies[-1] if latencies else 0.0,
+        "upstream_calls": upstream_calls["/Sessions"],
+        "jobs": sum(queue_counts.values()),
+        "sessions": sessions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the watchdog with concurrent webhooks")
+    parser.add_argument("--webhooks", type=int, default=500, help="Webhooks to send (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=200, help="Concurrent senders (default: %(default)s)")
+    parser.add_argument("--sessions", type=int, default=10, help="Sessions playing on the stub (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Stub /Sessions latency in seconds (default: %(default)s)")
+    parser.add_argument("--server", choices=["auto", "waitress", "werkzeug"], default=None,
+                        help="Watchdog server (default: SRGAN_WATCHDOG_SERVER or auto)")
+    parser.add_argument("--verbose", action="store_true", help="Keep the watchdog's per-request logging")
+    args = parser.parse_args()
+
+    stats = run_load_test(args.webhooks, args.concurrency, args.sessions, args.latency,
+                          args.server, args.verbose)
+
+    print("=" * 70)
+    print(f"Watchdog load test ({stats['server']})")
+    print("=" * 70)
+    print(f"  Webhooks:        {stats['webhooks']} ({stats['concurrency']} concurrent)")
+    print(f"  Elapsed:         {stats['elapsed']:.2f}s ({stats['throughput']:.0f} webhooks/s)")
+    print(f"  Status codes:    {stats['status_codes']}")
+    print(f"  Latency:         p50 {stats['p50'] * 1000:.0f} ms | p95 {stats['p95'] * 1000:.0f} ms | "
+          f"p99 {stats['p99'] * 1000:.0f} ms | max {stats['max'] * 1000:.0f} ms")
+    print(f"  /Sessions calls: {stats['upstream_calls']}")
+    print(f"  Jobs queued:     {stats['jobs']} (sessions playing: {stats['sessions']})")
+
+    ok = stats["status_codes"] == {200: stats["webhooks"]} and stats["jobs"] == stats["sessions"]
+    print("✅ PASS" if ok else "❌ FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
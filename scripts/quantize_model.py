@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Quantized CPU inference for the SRGAN generator.
+
+calibrate: samples frames from the media library, calibrates activation
+           ranges and writes a static int8 ONNX model next to the weights
+           (<stem>.x<scale>.int8.onnx), used with SRGAN_QUANTIZE=int8.
+check:     upscales frames from a held-out clip with fp32 and with a
+           quantized mode (int8 or bf16) and reports PSNR/SSIM against
+           fp32 together with the speedup, to decide whether it's worth it.
+
+Usage:
+    python3 quantize_model.py calibrate /media/movies /media/tv --samples 64
+    python3 quantize_model.py check /media/held_out.mkv --mode int8
+    python3 quantize_model.py check /media/held_out.mkv --mode bf16
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+import torch
+
+from srgan_inference import (
+    GaussianDenoiser,
+    OnnxRuntimeGenerator,
+    export_onnx,
+    onnx_model_path,
+    quantize_onnx_int8,
+)
+from srgan_probe import probe_media
+from your_model_file_ffmpeg import _load_eager_model
+
+VIDEO_EXTENSIONS = (".mkv", ".mp4", ".avi", ".mov", ".m4v", ".ts", ".webm")
+
+
+def _find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos.extend(
+                    os.path.join(root, name) for name in files
+                    if name.lower().endswith(VIDEO_EXTENSIONS)
+                )
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            videos.append(path)
+    return sorted(videos)
+
+
+def _decode_frame(path, timestamp, width, height):
+    """Decode one RGB frame at timestamp as a 1×3×H×W float tensor in [0, 1]"""
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-ss", f"{timestamp:.3f}", "-i", path,
+        "-frames:v", "1",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-",
+    ]
+    data = subprocess.run(cmd, capture_output=True, check=True).stdout
+    if len(data) != width * height * 3:
+        return None
+    frame = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+    return torch.from_numpy(frame.copy()).permute(2, 0, 1).unsqueeze(0).float() / 255.0
+
+
+def _crop(frame, size, rng):
+    height, width = frame.shape[-2:]
+    if size <= 0 or (height <= size and width <= size):
+        return frame
+    top = rng.randint(0, max(0, height - size))
+    left = rng.randint(0, max(0, width - size))
+    return frame[..., top:top + size, left:left + size]
+
+
+def _preprocess(frame, denoiser):
+    """Match what the pipeline feeds the model"""
+    return denoiser(frame) if denoiser is not None else frame
+
+
+def _make_denoiser():
+    if os.environ.get("SRGAN_DENOISE", "1") != "1":
+        return None
+    return GaussianDenoiser(float(os.environ.get("SRGAN_DENOISE_STRENGTH", "0.5")))
+
+
+def _sample_frames(videos, count, crop, seed):
+    """Yield count crops from random timestamps across the library"""
+    rng = random.Random(seed)
+    denoiser = _make_denoiser()
+    produced = 0
+    attempts = 0
+    while produced < count and attempts < count * 4:
+        attempts += 1
+        path = rng.choice(videos)
+        try:
+            info = probe_media(path)
+        except Exception as e:
+            print(f"Warning: Skipping {path}: {e}", file=sys.stderr)
+            continue
+        if not info or not info["width"] or not info["height"]:
+            continue
+        timestamp = rng.uniform(0, max(0.0, (info["duration"] or 0) - 1))
+        try:
+            frame = _decode_frame(path, timestamp, info["width"], info["height"])
+        except subprocess.CalledProcessError:
+            frame = None
+        if frame is None:
+            continue
+        produced += 1
+        yield _preprocess(_crop(frame, crop, rng), denoiser).numpy()
+
+
+def _psnr(reference, candidate):
+    mse = torch.mean((reference - candidate) ** 2).item()
+    return float("inf") if mse == 0 else 10 * np.log10(1.0 / mse)
+
+
+def _ssim(reference, candidate):
+    """Mean SSIM over channels with an 11×11 Gaussian window (sigma 1.5)"""
+    channels = reference.shape[1]
+    x = torch.arange(11, dtype=torch.float32) - 5
+    gauss = torch.exp(-x**2 / (2 * 1.5**2))
+    gauss = gauss / gauss.sum()
+    window = (gauss.view(-1, 1) @ gauss.view(1, -1)).expand(channels, 1, 11, 11)
+
+    def blur(t):
+        return torch.nn.functional.conv2d(t, window, groups=channels)
+
+    c1, c2 = 0.01**2, 0.03**2
+    mu_x, mu_y = blur(reference), blur(candidate)
+    sigma_x = blur(reference * reference) - mu_x**2
+    sigma_y = blur(candidate * candidate) - mu_y**2
+    sigma_xy = blur(reference * candidate) - mu_x * mu_y
+    ssim_map = ((2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2)) / (
+        (mu_x**2 + mu_y**2 + c1) * (sigma_x + sigma_y + c2)
+    )
+    return ssim_map.mean().item()
+
+
+def _calibrate(args):
+    videos = _find_videos(args.paths)
+    if not videos:
+        print("ERROR: No video files found to sample from", file=sys.stderr)
+        return 1
+
+    fp32_path = onnx_model_path(args.weights, args.scale)
+    if not os.path.exists(fp32_path) or os.path.getmtime(fp32_path) < os.path.getmtime(args.weights):
+        print(f"Exporting ONNX model to {fp32_path}...")
+        export_onnx(_load_eager_model(args.weights, "cpu", args.scale), fp32_path)
+
+    int8_path = onnx_model_path(args.weights, args.scale, "int8")
+    print(f"Calibrating on {args.samples} frames sampled from {len(videos)} videos...")
+    samples = list(_sample_frames(videos, args.samples, args.crop, args.seed))
+    if not samples:
+        print("ERROR: Could not decode any calibration frames", file=sys.stderr)
+        return 1
+    quantize_onnx_int8(fp32_path, int8_path, samples)
+    print(f"✓ Saved {int8_path} ({len(samples)} calibration frames)")
+    print("  Enable with SRGAN_QUANTIZE=int8; check quality with: quantize_model.py check <clip>")
+    return 0
+
+
+def _check(args):
+    info = probe_media(args.clip)
+    if not info:
+        print(f"ERROR: No video stream in {args.clip}", file=sys.stderr)
+        return 1
+
+    reference_model = _load_eager_model(args.weights, "cpu", args.scale)
+    if args.mode == "int8":
+        int8_path = onnx_model_path(args.weights, args.scale, "int8")
+        if not os.path.exists(int8_path):
+            print(f"ERROR: {int8_path} not found, run calibrate first", file=sys.stderr)
+            return 1
+        candidate_model = OnnxRuntimeGenerator(int8_path)
+
+        def candidate(x):
+            return candidate_model(x)
+    else:
+        def candidate(x):
+            with torch.autocast("cpu", dtype=torch.bfloat16):
+                return reference_model(x).float()
+
+    # Evenly spaced frames from the held-out clip
+    duration = info["duration"] or 1.0
+    rng = random.Random(args.seed)
+    denoiser = _make_denoiser()
+    frames = []
+    for index in range(args.frames):
+        timestamp = duration * (index + 0.5) / args.frames
+        frame = _decode_frame(args.clip, timestamp, info["width"], info["height"])
+        if frame is not None:
+            frames.append(_preprocess(_crop(frame, args.crop, rng), denoiser))
+    if not frames:
+        print("ERROR: Could not decode frames from the clip", file=sys.stderr)
+        return 1
+
+    psnrs, ssims = [], []
+    reference_time = candidate_time = 0.0
+    with torch.no_grad():
+        # Warm up both paths so one-off initialization isn't timed
+        reference_model(frames[0])
+        candidate(frames[0])
+        for frame in frames:
+            start = time.time()
+            reference = reference_model(frame).clamp(0, 1)
+            reference_time += time.time() - start
+            start = time.time()
+            output = candidate(frame).clamp(0, 1)
+            candidate_time += time.time() - start
+            psnrs.append(_psnr(reference, output))
+            ssims.append(_ssim(reference, output))
+
+    print(f"Quality check: {args.mode} vs fp32 on {len(frames)} frames of {os.path.basename(args.clip)}")
+    print(f"  PSNR: mean {np.mean(psnrs):.2f} dB, min {np.min(psnrs):.2f} dB")
+    print(f"  SSIM: mean {np.mean(ssims):.4f}, min {np.min(ssims):.4f}")
+    print(f"  fp32:   {reference_time / len(frames) * 1000:.1f} ms/frame")
+    print(f"  {args.mode}: {candidate_time / len(frames) * 1000:.1f} ms/frame "
+          f"({reference_time / candidate_time:.2f}x)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantized CPU inference for the SRGAN generator")
+    parser.add_argument(
+        "--weights",
+        default=os.environ.get("SRGAN_MODEL_PATH", "/app/models/swift_srgan_4x.pth"),
+        help="Generator weights (.pth)",
+    )
+    parser.add_argument("--scale", type=int, default=4, help="Upscale factor (2 or 4)")
+    parser.add_argument("--seed", type=int, default=0, help="Sampling seed")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    calibrate = subparsers.add_parser("calibrate", help="Build the int8 model from library samples")
+    calibrate.add_argument("paths", nargs="+", help="Video files or library directories to sample")
+    calibrate.add_argument("--samples", type=int, default=64, help="Calibration frames")
+    calibrate.add_argument("--crop", type=int, default=128, help="Random crop size (0 = full frame)")
+
+    check = subparsers.add_parser("check", help="Report PSNR/SSIM of a quantized mode vs fp32")
+    check.add_argument("clip", help="Held-out clip (not used for calibration)")
+    check.add_argument("--mode", choices=["int8", "bf16"], default="int8")
+    check.add_argument("--frames", type=int, default=8, help="Frames to compare")
+    check.add_argument("--crop", type=int, default=256, help="Random crop size (0 = full frame)")
+
+    args = parser.parse_args()
+    if not os.path.exists(args.weights):
+        print(f"ERROR: Weights not found: {args.weights}", file=sys.stderr)
+        return 1
+    if args.command == "calibrate":
+        return _calibrate(args)
+    return _check(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Shared inference helpers for the SRGAN model modules
+
+Used by both your_model_file_ffmpeg.py and your_model_file.py so the two
+video I/O backends run the generator the same way.
+"""
+
+import os
+import sys
+from typing import Callable, List, Optional, Tuple
+
+import torch
+
+
+def _tile_starts(length: int, tile: int, overlap: int) -> List[int]:
+    """Start offsets covering [0, length) with tiles of size tile overlapping by overlap"""
+    if length <= tile:
+        return [0]
+    step = max(1, tile - overlap)
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)
+    return starts
+
+
+def _feather_ramp(length: int, ramp: int, fade_in: bool, fade_out: bool) -> torch.Tensor:
+    """1D blend weights: linear ramps at the edges that overlap a neighbouring tile"""
+    weights = torch.ones(length, dtype=torch.float32)
+    ramp = min(ramp, length // 2)
+    if ramp <= 0:
+        return weights
+    edge = (torch.arange(ramp, dtype=torch.float32) + 0.5) / ramp
+    if fade_in:
+        weights[:ramp] = edge
+    if fade_out:
+        weights[length - ramp:] = edge.flip(0)
+    return weights
+
+
+def tiled_forward(
+    model: Callable[[torch.Tensor], torch.Tensor],
+    x: torch.Tensor,
+    tile_size: int,
+    overlap: int = 16,
+    tile_batch: int = 1,
+) -> torch.Tensor:
+    """
+    Upscale an N×C×H×W batch tile by tile and blend the seams.
+
+    Each tile is tile_size×tile_size input pixels and overlaps its
+    neighbours by overlap pixels. Overlapping output regions are
+    cross-faded with a linear feather window, so peak activation memory
+    depends on tile_size instead of the frame size. Up to tile_batch
+    tiles are stacked into one forward pass.
+    """
+    n, _, height, width = x.shape
+    tile_h = min(tile_size, height)
+    tile_w = min(tile_size, width)
+    if tile_h == height and tile_w == width:
+        return model(x)
+
+    overlap = max(0, min(overlap, tile_size // 2))
+    boxes: List[Tuple[int, int]] = [
+        (top, left)
+        for top in _tile_starts(height, tile_h, overlap)
+        for left in _tile_starts(width, tile_w, overlap)
+    ]
+
+    output = None
+    weight = None
+    scale = 1
+    for start in range(0, len(boxes), max(1, tile_batch)):
+        group = boxes[start:start + max(1, tile_batch)]
+        tiles = torch.cat(
+            [x[:, :, top:top + tile_h, left:left + tile_w] for top, left in group], dim=0
+        )
+        upscaled = model(tiles).float()
+
+        if output is None:
+            scale = upscaled.shape[-1] // tile_w
+            output = torch.zeros(
+                (n, upscaled.shape[1], height * scale, width * scale),
+                dtype=torch.float32, device=upscaled.device,
+            )
+            weight = torch.zeros((1, 1, height * scale, width * scale),
+                                 dtype=torch.float32, device=upscaled.device)
+
+        ramp = overlap * scale
+        for index, (top, left) in enumerate(group):
+            rows = _feather_ramp(tile_h * scale, ramp, top > 0, top + tile_h < height)
+            cols = _feather_ramp(tile_w * scale, ramp, left > 0, left + tile_w < width)
+            mask = (rows.view(-1, 1) * cols.view(1, -1)).to(upscaled.device)
+
+            y0, x0 = top * scale, left * scale
+            y1, x1 = y0 + tile_h * scale, x0 + tile_w * scale
+            output[:, :, y0:y1, x0:x1] += upscaled[index * n:(index + 1) * n] * mask
+            weight[:, :, y0:y1, x0:x1] += mask
+
+    return output / weight
+
+
+class GaussianDenoiser:
+    """
+    Gaussian pre-upscale denoise as two separable depthwise conv passes.
+
+    The kernel is built once per job instead of per frame, and every
+    channel goes through the same grouped conv. Passing scale=1/255 with a
+    raw 0-255 batch folds the uint8 -> float normalization into the second
+    pass and the blend, so normalizing and denoising take one pass.
+    """
+
+    def __init__(self, strength: float = 0.5, channels: int = 3, device="cpu"):
+        self.strength = strength
+        self.channels = channels
+        self.alpha = min(1.0, strength)
+        self.kernel_size = max(3, int(strength * 7) | 1)
+        sigma = strength * 2.0
+        x = torch.arange(self.kernel_size, dtype=torch.float32) - (self.kernel_size - 1) / 2
+        gauss_1d = torch.exp(-x**2 / (2 * sigma**2))
+        gauss_1d = gauss_1d / gauss_1d.sum()
+        self.gauss_1d = gauss_1d.to(device)
+        self.vertical = self.gauss_1d.view(1, 1, -1, 1).repeat(channels, 1, 1, 1)
+        self._horizontal = {}
+
+    def _horizontal_kernel(self, weight: float) -> torch.Tensor:
+        kernel = self._horizontal.get(weight)
+        if kernel is None:
+            kernel = (self.gauss_1d * weight).view(1, 1, 1, -1).repeat(self.channels, 1, 1, 1)
+            self._horizontal[weight] = kernel
+        return kernel
+
+    def __call__(self, x: torch.Tensor, scale: float = 1.0) -> torch.Tensor:
+        """Return scale * ((1 - alpha) * x + alpha * blur(x)) for an N×C×H×W float batch"""
+        if self.strength <= 0:
+            return x * scale if scale != 1.0 else x
+        pad = self.kernel_size // 2
+        blurred = torch.nn.functional.pad(x, (pad, pad, pad, pad), mode="reflect")
+        blurred = torch.nn.functional.conv2d(blurred, self.vertical, groups=self.channels)
+        blurred = torch.nn.functional.conv2d(
+            blurred, self._horizontal_kernel(self.alpha * scale), groups=self.channels
+        )
+        return blurred.add_(x, alpha=(1.0 - self.alpha) * scale)
+
+
+# Kr, Kb luma coefficients for limited-range ("tv") 8-bit YUV
+_YUV_COEFFICIENTS = {
+    "bt601": (0.299, 0.114),
+    "bt709": (0.2126, 0.0722),
+    "bt2020": (0.2627, 0.0593),
+}
+
+
+def yuv420_to_rgb(y: torch.Tensor, u: torch.Tensor, v: torch.Tensor,
+                  matrix: str = "bt709") -> torch.Tensor:
+    """
+    Convert limited-range 8-bit YUV 4:2:0 planes to an N×3×H×W RGB batch in [0, 1].
+
+    y is N×H×W and u, v are N×(H/2)×(W/2), in any dtype; chroma is
+    upsampled bilinearly before the matrix is applied. Full-range sources
+    are piped as rgb24 instead (your_model_file_ffmpeg._is_full_range).
+    """
+    kr, kb = _YUV_COEFFICIENTS[matrix]
+    kg = 1.0 - kr - kb
+    luma = (y.float() - 16.0) / 219.0
+    chroma = torch.stack((u, v), dim=1).float().sub_(128.0).div_(224.0)
+    chroma = torch.nn.functional.interpolate(
+        chroma, scale_factor=2, mode="bilinear", align_corners=False
+    )
+    cb, cr = chroma[:, 0], chroma[:, 1]
+    r = luma + 2.0 * (1.0 - kr) * cr
+    g = luma - (2.0 * kb * (1.0 - kb) / kg) * cb - (2.0 * kr * (1.0 - kr) / kg) * cr
+    b = luma + 2.0 * (1.0 - kb) * cb
+    return torch.stack((r, g, b), dim=1).clamp_(0.0, 1.0)
+
+
+def rgb_to_yuv420(rgb: torch.Tensor, matrix: str = "bt709") -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Inverse of yuv420_to_rgb for an N×3×H×W batch in [0, 1].
+
+    Returns (y, u, v) float planes already rounded to 8-bit code values;
+    chroma is averaged over each 2×2 block.
+    """
+    kr, kb = _YUV_COEFFICIENTS[matrix]
+    kg = 1.0 - kr - kb
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    luma = kr * r + kg * g + kb * b
+    cb = (b - luma) / (2.0 * (1.0 - kb))
+    cr = (r - luma) / (2.0 * (1.0 - kr))
+    chroma = torch.nn.functional.avg_pool2d(torch.stack((cb, cr), dim=1), 2)
+    y = luma.mul_(219.0).add_(16.0).round_().clamp_(0.0, 255.0)
+    chroma = chroma.mul_(224.0).add_(128.0).round_().clamp_(0.0, 255.0)
+    return y, chroma[:, 0], chroma[:, 1]
+
+
+def _cgroup_cpu_limit() -> Optional[int]:
+    """CPU quota of the container (cgroup v2 cpu.max), or None if unlimited"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r", encoding="utf-8") as handle:
+            quota, period = handle.read().split()[:2]
+    except (OSError, ValueError):
+        return None
+    if quota == "max":
+        return None
+    return max(1, int(int(quota) // int(period)))
+
+
+def cpu_thread_allotment() -> int:
+    """
+    Threads this process may use for inference.
+
+    The CPU allotment is SRGAN_CPU_THREADS, or else the smaller of the
+    affinity mask and the container's cgroup quota. It is divided by
+    SRGAN_CPU_SHARE, the number of processes sharing it. srgan_pipeline
+    sets that for --workers, so the processes split the cores instead of
+    each claiming all of them. Parallel segments (srgan_segments) are
+    threads of one worker; configure_runtime() splits its allotment
+    between them.
+    """
+    total = int(os.environ.get("SRGAN_CPU_THREADS", "0") or "0")
+    if total <= 0:
+        try:
+            total = len(os.sched_getaffinity(0))
+        except AttributeError:
+            total = os.cpu_count() or 1
+        limit = _cgroup_cpu_limit()
+        if limit is not None:
+            total = min(total, limit)
+    share = max(1, int(os.environ.get("SRGAN_CPU_SHARE", "1") or "1"))
+    return max(1, total // share)
+
+
+def configure_runtime(device: str, cpu_share: int = 1) -> dict:
+    """
+    Apply the torch threading configuration for this process and return it.
+
+    Intra-op threads come from cpu_thread_allotment(), divided by
+    cpu_share when that many threads of this process run inference at
+    once (parallel segments): each of them forks its own team of intra-op
+    threads, so they would otherwise use cpu_share times the allotment. Inter-op
+    parallelism gains nothing for a single chain of convolutions, so it
+    defaults to 1 thread (SRGAN_INTEROP_THREADS). torch only accepts the
+    inter-op setting before its first parallel op, so a warm worker keeps
+    the value it started with. channels_last (SRGAN_CHANNELS_LAST,
+    default on) is applied by the callers with to_channels_last().
+    """
+    cpu_share = max(1, cpu_share)
+    threads = max(1, cpu_thread_allotment() // cpu_share)
+    torch.set_num_threads(threads)
+    interop = max(1, int(os.environ.get("SRGAN_INTEROP_THREADS", "1") or "1"))
+    if torch.get_num_interop_threads() != interop:
+        try:
+            torch.set_num_interop_threads(interop)
+        except RuntimeError:
+            pass  # Already fixed by earlier parallel work in this process
+    return {
+        "device": device,
+        "intra_op_threads": torch.get_num_threads(),
+        "inter_op_threads": torch.get_num_interop_threads(),
+        "cpu_share": max(1, int(os.environ.get("SRGAN_CPU_SHARE", "1") or "1")) * cpu_share,
+        "channels_last": os.environ.get("SRGAN_CHANNELS_LAST", "1") == "1",
+    }
+
+
+def to_channels_last(model):
+    """
+    Convert an eager generator's weights to channels_last (NHWC).
+
+    oneDNN (CPU) and cuDNN tensor cores run NHWC convolutions without
+    the layout reorders NCHW needs. TorchScript exports are already
+    converted when they are built, and ONNX Runtime models pick their own
+    layout, so anything that isn't a plain nn.Module is returned as is.
+    """
+    if isinstance(model, torch.nn.Module) and not isinstance(model, torch.jit.ScriptModule):
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+
+def compiled_model_path(model_path: str, scale: int, device: str) -> str:
+    """
+    Where the TorchScript export of model_path lives: next to the weights,
+    keyed by scale, device type and torch version, since a frozen CPU
+    graph or a different torch release can't be shared.
+    """
+    stem = os.path.splitext(model_path)[0]
+    device_type = device.split(":", 1)[0]
+    version = torch.__version__.split("+", 1)[0]
+    return f"{stem}.x{scale}.{device_type}.torch{version}.ts"
+
+
+def export_torchscript(model: torch.nn.Module, path: str, device: str, optimize: bool = True) -> str:
+    """
+    Trace model into a TorchScript artifact at path.
+
+    On CPU the graph is also frozen (weights folded into constants, dead
+    code removed) and converted to channels_last, which matches the layout
+    the frame converter feeds. CUDA exports stay unfrozen so the loader
+    can still cast them to fp16.
+    """
+    model = model.eval().to(device)
+    example = torch.rand(1, 3, 64, 64, device=device)
+    cpu = device.split(":", 1)[0] == "cpu"
+    if optimize and cpu:
+        model = model.to(memory_format=torch.channels_last)
+        example = example.contiguous(memory_format=torch.channels_last)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        if optimize and cpu:
+            traced = torch.jit.freeze(traced)
+
+    # Write atomically so concurrent workers never load a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    traced.save(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_compiled_model(model_path: str, scale: int, device: str,
+                        build: Optional[Callable[[], torch.nn.Module]] = None) -> Optional[torch.nn.Module]:
+    """
+    Load the cached TorchScript export for model_path, if there is one.
+
+    SRGAN_COMPILED_MODEL controls this: "auto" (default) uses an existing
+    artifact, "build" also exports one with build() when it's missing,
+    "0" always uses the eager model. Artifacts older than the weights are
+    ignored. Returns None when the eager model should be used.
+    """
+    mode = os.environ.get("SRGAN_COMPILED_MODEL", "auto").lower()
+    if mode in ("0", "off", "false"):
+        return None
+
+    path = compiled_model_path(model_path, scale, device)
+    stale = not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(model_path)
+    if stale:
+        if mode != "build" or build is None:
+            return None
+        try:
+            print(f"Exporting TorchScript model to {path}...", file=sys.stderr)
+            export_torchscript(build(), path, device)
+        except Exception as e:
+            print(f"Warning: TorchScript export failed, using eager model: {e}", file=sys.stderr)
+            return None
+
+    try:
+        model = torch.jit.load(path, map_location=device)
+    except Exception as e:
+        print(f"Warning: Could not load {path}, using eager model: {e}", file=sys.stderr)
+        return None
+    model.eval()
+    print(f"✓ Using TorchScript model {os.path.basename(path)}", file=sys.stderr)
+    return model
+
+
+def cpu_quantize_mode(device: str) -> str:
+    """
+    SRGAN_QUANTIZE for this device: "off", "int8" (calibrated ONNX Runtime
+    model from quantize_model.py) or "bf16" (CPU autocast). Quantized
+    modes only apply to CPU inference; CUDA uses SRGAN_FP16 instead.
+    """
+    mode = os.environ.get("SRGAN_QUANTIZE", "off").lower() or "off"
+    if mode in ("0", "none", "fp32"):
+        mode = "off"
+    if mode not in ("off", "int8", "bf16"):
+        print(f"Warning: Unknown SRGAN_QUANTIZE '{mode}', using fp32", file=sys.stderr)
+        return "off"
+    if mode != "off" and device.split(":", 1)[0] != "cpu":
+        print(f"Warning: SRGAN_QUANTIZE={mode} only applies to CPU inference", file=sys.stderr)
+        return "off"
+    return mode
+
+
+def model_cache_key(device: str, scale: int, use_fp16: bool, quantize: str) -> tuple:
+    """
+    Everything besides the weights file that the backends' _prepare_model()
+    depends on, for keying a warm model cache (srgan_pipeline._ModelCache)
+    """
+    return (
+        device, scale, use_fp16, quantize,
+        os.environ.get("SRGAN_BACKEND", "torch").lower(),
+        os.environ.get("SRGAN_CHANNELS_LAST", "1") == "1",
+        os.environ.get("SRGAN_COMPILED_MODEL", "auto").lower(),
+        os.environ.get("SRGAN_MODEL_FORMAT", "").lower(),
+    )
+
+
+def onnx_model_path(model_path: str, scale: int, variant: str = "") -> str:
+    """Where the ONNX export of model_path lives (next to the weights)"""
+    suffix = f".{variant}" if variant else ""
+    return f"{os.path.splitext(model_path)[0]}.x{scale}{suffix}.onnx"
+
+
+def export_onnx(model: torch.nn.Module, path: str, opset: int = 17) -> str:
+    """
+    Export model to ONNX with dynamic batch, height and width axes.
+    """
+    model = model.eval().to("cpu")
+    example = torch.rand(1, 3, 64, 64)
+    dynamic_axes = {
+        "input": {0: "batch", 2: "height", 3: "width"},
+        "output": {0: "batch", 2: "height", 3: "width"},
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            model, example, tmp_path,
+            input_names=["input"], output_names=["output"],
+            dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False,
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+def quantize_onnx_int8(fp32_path: str, int8_path: str, samples) -> str:
+    """
+    Statically quantize an ONNX generator to int8 (QDQ, per-channel weights).
+
+    samples is an iterable of N×3×H×W float32 numpy arrays representative
+    of what the model sees in production; activation ranges are calibrated
+    on them.
+    """
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self.samples = iter(samples)
+
+        def get_next(self):
+            sample = next(self.samples, None)
+            return None if sample is None else {"input": sample}
+
+    tmp_path = f"{int8_path}.{os.getpid()}.tmp"
+    quantize_static(
+        fp32_path, tmp_path, _Reader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+    os.replace(tmp_path, int8_path)
+    return int8_path
+
+
+class OnnxRuntimeGenerator:
+    """
+    Runs the exported generator with ONNX Runtime on CPU.
+
+    Drop-in for the torch model: called with an N×3×H×W float tensor and
+    returns one. Threading follows SRGAN_ORT_THREADS (intra-op, 0 = this
+    process's cpu_thread_allotment()) and SRGAN_ORT_INTER_THREADS.
+    """
+
+    def __init__(self, path: str):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = (
+            int(os.environ.get("SRGAN_ORT_THREADS", "0") or "0") or cpu_thread_allotment()
+        )
+        options.inter_op_num_threads = int(os.environ.get("SRGAN_ORT_INTER_THREADS", "0") or "0")
+        self.path = path
+        self.session = onnxruntime.InferenceSession(
+            path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        inputs = x.detach().float().contiguous().numpy()
+        (output,) = self.session.run(None, {self.input_name: inputs})
+        return torch.from_numpy(output)
+
+    # Interface parity with torch.nn.Module where the backends use it
+    def eval(self) -> "OnnxRuntimeGenerator":
+        return self
+
+
+def load_onnx_model(model_path: str, scale: int, device: str,
+                    build: Optional[Callable[[], torch.nn.Module]] = None,
+                    quantized: bool = False) -> Optional[OnnxRuntimeGenerator]:
+    """
+    Load the ONNX Runtime generator for model_path (SRGAN_BACKEND=onnxruntime).
+
+    Exports the ONNX model with build() when it is missing or older than
+    the weights. quantized=True loads the int8 model from
+    quantize_model.py instead, which needs calibration data and so is
+    never built here. Returns None, after a warning, when ONNX Runtime
+    isn't usable so the caller falls back to torch.
+    """
+    if device.split(":", 1)[0] != "cpu":
+        print("Warning: The onnxruntime backend is CPU-only, using torch", file=sys.stderr)
+        return None
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        print("Warning: onnxruntime is not installed, using torch "
+              "(pip install onnxruntime)", file=sys.stderr)
+        return None
+
+    path = onnx_model_path(model_path, scale, "int8" if quantized else "")
+    try:
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(model_path):
+            if quantized:
+                print(f"Warning: No calibrated int8 model at {path} "
+                      f"(run quantize_model.py calibrate), using fp32", file=sys.stderr)
+                return None
+            if build is None:
+                return None
+            print(f"Exporting ONNX model to {path}...", file=sys.stderr)
+            export_onnx(build(), path)
+        model = OnnxRuntimeGenerator(path)
+    except Exception as e:
+        print(f"Warning: ONNX Runtime backend failed, using torch: {e}", file=sys.stderr)
+        return None
+    print(f"✓ Using ONNX Runtime model {os.path.basename(path)}", file=sys.stderr)
+    return model
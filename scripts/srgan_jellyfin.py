@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Jellyfin /Sessions client shared by the watchdog endpoints
+
+Every webhook, /status, /sessions and /playing request needs the list of
+active sessions. JellyfinSessionClient makes that cheap for Jellyfin:
+
+- one persistent requests.Session (keep-alive connection pool)
+- a short TTL cache (JELLYFIN_SESSIONS_TTL seconds) shared by all callers
+- request coalescing: concurrent callers that miss the cache wait for the
+  one request already in flight instead of each calling Jellyfin, so a
+  burst of PlaybackStart webhooks makes a single upstream call
+- activeWithinSeconds, so idle sessions are filtered out by the server
+
+JellyfinSessionListener replaces polling altogether (JELLYFIN_WEBSOCKET=1):
+it keeps one WebSocket subscription to the server's session events, holds
+an in-memory index of what each session is playing and reports new
+playback as soon as Jellyfin pushes it. Needs websocket-client
+(pip install websocket-client); without it the watchdog keeps polling.
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import websocket  # websocket-client
+except ImportError:
+    websocket = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 2.0
+DEFAULT_ACTIVE_WITHIN = 960  # What the Jellyfin dashboard uses
+DEFAULT_TIMEOUT = 5
+DEFAULT_PUSH_INTERVAL_MS = 1500
+DEFAULT_RECONNECT_DELAY = 5
+
+
+def playing_item(session):
+    """
+    What a /Sessions entry is playing, as a dict with path, name, item_id,
+    item_type, user, session_id and client, or None (idle, paused or no
+    file path).
+    """
+    now_playing = session.get("NowPlayingItem")
+    if not now_playing:
+        return None
+
+    # Only process if actually playing (not paused)
+    if (session.get("PlayState") or {}).get("IsPaused", False):
+        logger.debug(f"Session {session.get('Id')} is paused, skipping")
+        return None
+
+    # The path is in: NowPlayingItem.Path or NowPlayingItem.MediaSources[0].Path
+    file_path = now_playing.get("Path")
+    if not file_path:
+        media_sources = now_playing.get("MediaSources") or []
+        if media_sources:
+            file_path = media_sources[0].get("Path")
+    if not file_path:
+        logger.warning(f"No file path found for item {now_playing.get('Name')}")
+        return None
+
+    return {
+        "path": file_path,
+        "name": now_playing.get("Name", "Unknown"),
+        "item_id": now_playing.get("Id"),
+        "item_type": now_playing.get("Type"),
+        "user": session.get("UserName", "Unknown"),
+        "session_id": session.get("Id"),
+        "client": session.get("Client", "Unknown"),
+    }
+
+
+class _Call:
+    """One upstream request that concurrent callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class JellyfinSessionClient:
+    """Pooled, cached and coalesced access to Jellyfin's /Sessions endpoint."""
+
+    def __init__(self, base_url, api_key, ttl=DEFAULT_TTL, active_within=DEFAULT_ACTIVE_WITHIN,
+                 timeout=DEFAULT_TIMEOUT, pool_size=4):
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.active_within = active_within
+        self.timeout = timeout
+        self.upstream_calls = 0
+
+        self.http = requests.Session()
+        self.http.headers.update({"X-Emby-Token": api_key, "Accept": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._cached = None
+        self._cached_at = 0.0
+        self._inflight = None
+
+    def _fetch(self):
+        params = {}
+        if self.active_within:
+            params["activeWithinSeconds"] = int(self.active_within)
+        self.upstream_calls += 1
+        try:
+            response = self.http.get(f"{self.base_url}/Sessions", params=params, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Failed to query Jellyfin API: {e}")
+            return None
+
+    def sessions(self, max_age=None):
+        """
+        Active sessions, at most max_age (default: the TTL) seconds old.
+
+        Returns None if Jellyfin could not be reached; failures are not
+        cached, so the next call retries.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            if self._cached is not None and time.monotonic() - self._cached_at <= max_age:
+                return self._cached
+            call = self._inflight
+            leader = call is None
+            if leader:
+                call = self._inflight = _Call()
+
+        if not leader:
+            call.done.wait(self.timeout + 1)
+            return call.result
+
+        result = None
+        try:
+            result = self._fetch()
+        finally:
+            with self._lock:
+                if result is not None:
+                    self._cached = result
+                    self._cached_at = time.monotonic()
+                self._inflight = None
+            call.result = result
+            call.done.set()
+        return result
+
+    def invalidate(self):
+        """Drop the cached response so the next call goes upstream."""
+        with self._lock:
+            self._cached = None
+
+    def close(self):
+        self.http.close()
+
+
+class JellyfinSessionListener:
+    """
+    Push-based playback detection over Jellyfin's /socket endpoint.
+
+        listener = JellyfinSessionListener(url, key, on_playing=queue_item)
+        listener.start()          # background thread, reconnects on its own
+        listener.playing()        # current index, no HTTP request
+
+    After connecting it sends SessionsStart, so the server pushes the
+    session list whenever it changes. on_playing(item) is called (on one
+    worker thread, never blocking the socket) when a session starts an
+    item it wasn't playing in the previous push, including after a pause.
+    """
+
+    def __init__(self, base_url, api_key, on_playing=None, interval_ms=DEFAULT_PUSH_INTERVAL_MS,
+                 device_id="srgan-watchdog", reconnect_delay=DEFAULT_RECONNECT_DELAY):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.on_playing = on_playing
+        self.interval_ms = interval_ms
+        self.device_id = device_id
+        self.reconnect_delay = reconnect_delay
+
+        self._lock = threading.Lock()
+        self._index = {}  # session id -> playing item
+        self._connected = threading.Event()
+        self._stopped = threading.Event()
+        self._keepalive = None  # Seconds between KeepAlive messages, set by the server
+        self._thread = None
+        self._ws = None
+        self._callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jellyfin-events")
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    def socket_url(self):
+        if self.base_url.startswith("https://"):
+            base = "wss://" + self.base_url[len("https://"):]
+        elif self.base_url.startswith("http://"):
+            base = "ws://" + self.base_url[len("http://"):]
+        else:
+            base = self.base_url
+        return f"{base}/socket?" + urlencode({"api_key": self.api_key, "deviceId": self.device_id})
+
+    def playing(self):
+        """Items currently playing, from the last push."""
+        with self._lock:
+            return list(self._index.values())
+
+    def start(self):
+        """Start listening in the background; False if websocket-client is missing."""
+        if websocket is None:
+            logger.warning("JELLYFIN_WEBSOCKET=1 but websocket-client is not installed "
+                           "(pip install websocket-client); using webhook + /Sessions polling")
+            return False
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="jellyfin-socket", daemon=True)
+        self._thread.start()
+        return True
+
+    def wait_connected(self, timeout=None):
+        return self._connected.wait(timeout)
+
+    def stop(self):
+        self._stopped.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._callbacks.shutdown(wait=False)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._ws = websocket.create_connection(self.socket_url(), timeout=DEFAULT_TIMEOUT)
+                logger.info(f"✓ Subscribed to Jellyfin session events ({self.base_url})")
+                self._connected.set()
+                self._listen(self._ws)
+            except (websocket.WebSocketException, OSError, ValueError) as e:
+                if not self._stopped.is_set():
+                    logger.warning(f"Jellyfin WebSocket disconnected: {e}")
+            finally:
+                # The index can't be trusted while disconnected
+                self._connected.clear()
+                with self._lock:
+                    self._index = {}
+                if self._ws is not None:
+                    try:
+                        self._ws.close()
+                    except Exception:
+                        pass
+                    self._ws = None
+            self._stopped.wait(self.reconnect_delay)
+
+    def _send(self, ws, message_type, data=None):
+        message = {"MessageType": message_type}
+        if data is not None:
+            message["Data"] = data
+        ws.send(json.dumps(message))
+
+    def _listen(self, ws):
+        self._keepalive = None
+        self._send(ws, "SessionsStart", f"0,{self.interval_ms}")
+        last_sent = time.monotonic()
+        ws.settimeout(1.0)
+        while not self._stopped.is_set():
+            if self._keepalive and time.monotonic() - last_sent >= self._keepalive:
+                self._send(ws, "KeepAlive")
+                last_sent = time.monotonic()
+            try:
+                raw = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                continue
+            if not raw:
+                raise websocket.WebSocketConnectionClosedException("Connection closed by server")
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                logger.debug(f"Ignoring non-JSON socket message: {raw[:80]!r}")
+                continue
+            if message.get("MessageType") == "ForceKeepAlive":
+                # Data is the server's idle timeout; ping at half of it
+                self._keepalive = max(1.0, float(message.get("Data") or 60) / 2)
+                self._send(ws, "KeepAlive")
+                last_sent = time.monotonic()
+            else:
+                self.handle_message(message)
+
+    def handle_message(self, message):
+        """Apply one pushed message to the index."""
+        if message.get("MessageType") != "Sessions":
+            return
+        index = {}
+        for session in message.get("Data") or []:
+            item = playing_item(session)
+            if item is not None:
+                index[item["session_id"]] = item
+        with self._lock:
+            previous, self._index = self._index, index
+
+        for session_id, item in index.items():
+            before = previous.get(session_id)
+            if before is not None and (before["item_id"], before["path"]) == (item["item_id"], item["path"]):
+                continue
+            logger.info(f"Playback started: {item['name']} ({item['user']} on {item['client']})")
+            if self.on_playing is not None:
+                self._callbacks.submit(self._notify, item)
+
+    def _notify(self, item):
+        try:
+            self.on_playing(item)
+        except Exception:
+            logger.exception(f"Error handling playback of {item['path']}")
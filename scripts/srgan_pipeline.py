@@ -4,13 +4,30 @@ SRGAN Pipeline - Main video upscaling pipeline
 """
 
 import argparse
-import json
+import contextlib
+import inspect
+import multiprocessing
+import multiprocessing.connection
 import os
 import re
+import socket
 import subprocess
 import sys
+import threading
 import time
 
+from srgan_probe import probe_media
+from srgan_progress import ProgressReporter, prune_progress
+from srgan_queue import (
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_MAX_ATTEMPTS,
+    JobQueue,
+    LeaseHeartbeat,
+    QueueNotifier,
+    WorkerHeartbeat,
+    queue_db_path,
+)
+
 
 def _ensure_parent_dir(path):
     parent = os.path.dirname(os.path.abspath(path))
@@ -18,49 +35,52 @@ def _ensure_parent_dir(path):
         os.makedirs(parent, exist_ok=True)
 
 
+class _ModelCache:
+    """
+    Keeps the loaded SRGAN model warm across queue items.
+
+    The model modules call get() instead of loading weights themselves.
+    A cached model is reused until the weights path (SRGAN_MODEL_PATH) or
+    the file's mtime changes; key covers anything else the loaded model
+    depends on, such as device, scale and precision.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_path, key, loader):
+        path = os.path.abspath(model_path)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+
+        with self._lock:
+            entry = self._entries.get((path, key))
+            if entry is not None and entry[0] == mtime:
+                print(f"✓ Reusing warm model ({os.path.basename(path)})", file=sys.stderr)
+                return entry[1]
+            if entry is not None:
+                print(f"Model file changed on disk, reloading: {path}", file=sys.stderr)
+
+            # Only one set of weights is kept resident
+            self._entries = {
+                cache_key: value for cache_key, value in self._entries.items()
+                if cache_key[0] == path
+            }
+            model = loader()
+            self._entries[(path, key)] = (mtime, model)
+            return model
+
+
 def _get_video_info(input_path):
     """
-    Get video information using ffprobe.
-    Returns dict with resolution, HDR info, etc.
+    Get video information using ffprobe (cached, see srgan_probe.py).
+    Returns dict with resolution, HDR info, frame rate, duration, etc.
     """
     try:
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=width,height,color_space,color_transfer,color_primaries",
-            "-of", "json",
-            input_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        data = json.loads(result.stdout)
-        
-        if not data.get("streams"):
-            return None
-        
-        stream = data["streams"][0]
-        width = int(stream.get("width", 0))
-        height = int(stream.get("height", 0))
-        
-        # Detect HDR
-        color_transfer = stream.get("color_transfer", "")
-        color_space = stream.get("color_space", "")
-        color_primaries = stream.get("color_primaries", "")
-        
-        is_hdr = (
-            "smpte2084" in color_transfer.lower() or  # HDR10
-            "arib-std-b67" in color_transfer.lower() or  # HLG
-            "bt2020" in color_space.lower() or
-            "bt2020" in color_primaries.lower()
-        )
-        
-        return {
-            "width": width,
-            "height": height,
-            "is_hdr": is_hdr,
-            "color_transfer": color_transfer,
-            "color_space": color_space,
-        }
+        return probe_media(input_path)
     except Exception as e:
         print(f"Warning: Could not get video info: {e}", file=sys.stderr)
         return None
@@ -302,35 +322,23 @@ def _verify_upscaled_output(output_path, expected_height=None, input_path=None):
         verification["error"] = f"Could not get file size: {e}"
         return False, verification
     
-    # Verify with ffprobe
+    # Verify with ffprobe (the output is new, so skip the probe cache)
     try:
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=width,height,codec_name,duration:format=duration",
-            "-of", "json",
-            output_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=30)
-        data = json.loads(result.stdout)
+        info = probe_media(output_path, use_cache=False, timeout=30)
         
-        if not data.get("streams"):
+        if not info:
             verification["error"] = "No video stream found in output"
             return False, verification
         
-        stream = data["streams"][0]
-        width = int(stream.get("width", 0))
-        height = int(stream.get("height", 0))
-        codec = stream.get("codec_name", "unknown")
+        width = info["width"]
+        height = info["height"]
         
         verification["resolution"] = f"{width}x{height}"
-        verification["codec"] = codec
+        verification["codec"] = info["codec_name"] or "unknown"
         
         # Get duration
-        duration = stream.get("duration") or data.get("format", {}).get("duration")
-        if duration:
-            verification["duration"] = float(duration)
+        if info["duration"]:
+            verification["duration"] = info["duration"]
         
         # Check resolution matches expected
         if expected_height and height > 0:
@@ -338,11 +346,6 @@ def _verify_upscaled_output(output_path, expected_height=None, input_path=None):
                 verification["error"] = f"Resolution mismatch: expected {expected_height}p, got {height}p"
                 return False, verification
         
-        # If we have input path, compare durations
-        if input_path and verification["duration"]:
-            input_info = _get_video_info(input_path)
-            # Duration check would go here if needed
-        
         verification["valid"] = True
         return True, verification
         
@@ -354,10 +357,20 @@ def _verify_upscaled_output(output_path, expected_height=None, input_path=None):
         return False, verification
 
 
-def _try_model(input_path, output_path, width, height, scale):
+def _try_model(input_path, output_path, width, height, scale, model_cache=None,
+               checkpoint_dir=None, on_checkpoint=None, progress=None, cancel=None):
     """
     Try to upscale using AI model with intelligent output naming and verification.
+
+    checkpoint_dir / on_checkpoint are passed to srgan_segments so an
+    interrupted job resumes from its last completed segment. progress is
+    the job's srgan_progress.ProgressReporter. Setting cancel (a
+    threading.Event, e.g. LeaseHeartbeat.cancel) stops the upscale; the job's
+    progress is marked cancelled and the resulting error is raised rather
+    than reported as a failed job.
     """
+    if progress is None:
+        progress = ProgressReporter(input_path, output_path)
     # Try FFmpeg-based implementation first (more reliable)
     try:
         import your_model_file_ffmpeg as model_module
@@ -376,9 +389,23 @@ def _try_model(input_path, output_path, width, height, scale):
         print(f"ERROR: Model 'upscale' function not found", file=sys.stderr)
         return False
 
+    # Split long videos into frame-exact, checkpointed segments, upscaled
+    # in parallel with SRGAN_SEGMENTS > 1
+    segments = int(os.environ.get("SRGAN_SEGMENTS", "0") or "0")
+    checkpoint_seconds = float(os.environ.get("SRGAN_CHECKPOINT_SECONDS", "0") or "0")
+    if (segments > 1 or checkpoint_seconds > 0) and model_module.__name__ == "your_model_file_ffmpeg":
+        import srgan_segments
+        if segments > 1:
+            print(f"Segment-parallel mode: up to {segments} segments", file=sys.stderr)
+        upscale = srgan_segments.upscale
+
     try:
         # Get input video information for intelligent naming
         video_info = _get_video_info(input_path)
+        progress.start(
+            total_frames=video_info.get("frame_count") if video_info else None,
+            fps=video_info.get("fps") if video_info else None,
+        )
         
         # Calculate target resolution
         if width and height:
@@ -425,12 +452,27 @@ def _try_model(input_path, output_path, width, height, scale):
         import time
         start_time = time.time()
         
+        upscale_kwargs = {}
+        upscale_params = inspect.signature(upscale).parameters
+        if model_cache is not None and "model_cache" in upscale_params:
+            upscale_kwargs["model_cache"] = model_cache
+        if video_info and "media_info" in upscale_params:
+            upscale_kwargs["media_info"] = video_info
+        if "checkpoint_dir" in upscale_params:
+            upscale_kwargs["checkpoint_dir"] = checkpoint_dir
+            upscale_kwargs["on_checkpoint"] = on_checkpoint
+        if "on_progress" in upscale_params:
+            upscale_kwargs["on_progress"] = progress.update
+        if cancel is not None and "cancel" in upscale_params:
+            upscale_kwargs["cancel"] = cancel
+        
         upscale(
             input_path=input_path,
             output_path=intelligent_output_path,
             width=width,
             height=height,
             scale=scale,
+            **upscale_kwargs,
         )
         
         elapsed_time = time.time() - start_time
@@ -440,6 +482,7 @@ def _try_model(input_path, output_path, width, height, scale):
         
         # Verify the output
         print("Verifying upscaled output...", file=sys.stderr)
+        progress.stage("verifying", "Verifying upscaled output...")
         success, verification = _verify_upscaled_output(
             intelligent_output_path, 
             expected_height=target_height,
@@ -449,6 +492,7 @@ def _try_model(input_path, output_path, width, height, scale):
         if not success:
             print(f"✗ VERIFICATION FAILED: {verification.get('error')}", file=sys.stderr)
             print(f"  Output path: {intelligent_output_path}", file=sys.stderr)
+            progress.fail(f"Verification failed: {verification.get('error')}")
             return False
         
         # Log verification results
@@ -466,77 +510,292 @@ def _try_model(input_path, output_path, width, height, scale):
         size_ratio = output_size / input_size
         print(f"  Size ratio: {size_ratio:.2f}x (input: {input_size/1_000_000:.1f} MB → output: {output_size/1_000_000:.1f} MB)", file=sys.stderr)
         
+        progress.complete(intelligent_output_path)
         return True
         
     except NotImplementedError as e:
         print(f"ERROR: Model not implemented: {e}", file=sys.stderr)
+        progress.fail(f"Model not implemented: {e}")
         return False
     except Exception as e:
+        if cancel is not None and cancel.is_set():
+            # Not a failure of this job: the caller decides what happens to
+            # it, but /progress must stop listing it as active
+            progress.cancel(f"AI upscaling cancelled: {e}")
+            raise
         print(f"ERROR: AI upscaling failed: {e}", file=sys.stderr)
+        progress.fail(f"AI upscaling failed: {e}")
         import traceback
         traceback.print_exc(file=sys.stderr)
         return False
 
 
-def _acquire_lock(lock_path, timeout_seconds=5):
+def _dequeue_job(job_queue, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Lease the next job from the durable queue to worker_id.
+
+    Returns (job_id, input, output, hls_dir, streaming, checkpoint) or None.
+    """
+    try:
+        job = job_queue.claim(worker_id, lease_seconds, max_attempts)
+    except Exception as e:
+        print(f"Warning: Could not read job queue: {e}", file=sys.stderr)
+        return None
+    if job is None:
+        return None
+
+    # Extended job info: (input, output, hls_dir, streaming, checkpoint)
+    hls_dir = job.payload.get("hls_dir")
+    streaming = job.payload.get("streaming", False)
+    return (job.id, job.input, job.output, hls_dir, streaming, job.checkpoint)
+
+
+def _process_job(input_path, output_path, width, height, scale, model_cache=None,
+                 checkpoint_dir=None, on_checkpoint=None, job_id=None, cancel=None):
+    """
+    Validate and run one upscaling job. Returns the verified output path
+    (renamed with resolution/HDR tags) on success, False otherwise.
+    Setting cancel stops the job (see _try_model).
+    """
+    # CRITICAL: Validate input is not HLS stream
+    input_lower = input_path.lower()
+    if input_lower.endswith('.m3u8') or input_lower.endswith('.m3u') or '/hls/' in input_lower:
+        print(f"ERROR: HLS stream inputs are not supported: {input_path}", file=sys.stderr)
+        print(f"Only raw video files (MKV, MP4, AVI, etc.) can be upscaled", file=sys.stderr)
+        return False
+
+    # Reject HLS segment files (more specific check)
+    # HLS segments have patterns like segment_NNN.ts, seg_NNN.ts, or are in /hls/ directories
+    if input_lower.endswith('.ts'):
+        basename = os.path.basename(input_lower)
+        normalized_path = input_lower.replace('\\', '/')
+        # Check if it's actually an HLS segment (not just any .ts file)
+        if ('segment_' in basename or 
+            'seg_' in basename or 
+            'chunk_' in basename or
+            '/hls/' in normalized_path or
+            '/segments/' in normalized_path):
+            print(f"ERROR: HLS segment files cannot be upscaled: {input_path}", file=sys.stderr)
+            return False
+
+    if not os.path.exists(input_path):
+        print(f"ERROR: Input file does not exist: {input_path}", file=sys.stderr)
+        return False
+
+    print("=" * 80, file=sys.stderr)
+    print(f"AI Upscaling Job", file=sys.stderr)
+    print("=" * 80, file=sys.stderr)
+    print(f"Input:  {input_path}", file=sys.stderr)
+    print(f"Output: {output_path}", file=sys.stderr)
+    print("", file=sys.stderr)
+
+    # AI model upscaling is MANDATORY
+    enable_model = os.environ.get("SRGAN_ENABLE", "1") == "1"  # Default to enabled
+
+    if not enable_model:
+        print("ERROR: AI upscaling is disabled (SRGAN_ENABLE=0)", file=sys.stderr)
+        print("AI upscaling must be enabled. Set SRGAN_ENABLE=1", file=sys.stderr)
+        print("FFmpeg-only upscaling is not supported in this mode.", file=sys.stderr)
+        return False
+
+    # Try AI model upscaling
+    print("Starting AI upscaling with SRGAN model...", file=sys.stderr)
+    # Published for the watchdog's /progress endpoint
+    prune_progress()
+    progress = ProgressReporter(input_path, output_path, job_id=job_id)
+    used_model = _try_model(
+        input_path, output_path, width, height, scale,
+        model_cache=model_cache,
+        checkpoint_dir=checkpoint_dir,
+        on_checkpoint=on_checkpoint,
+        progress=progress,
+        cancel=cancel,
+    )
+
+    if not used_model:
+        if progress.data["status"] != "failed":
+            progress.fail("AI model upscaling failed")
+        print("", file=sys.stderr)
+        print("=" * 80, file=sys.stderr)
+        print("ERROR: AI model upscaling failed!", file=sys.stderr)
+        print("=" * 80, file=sys.stderr)
+        print("Possible reasons:", file=sys.stderr)
+        print("  1. Model file not found (check SRGAN_MODEL_PATH)", file=sys.stderr)
+        print("  2. Model file is corrupted", file=sys.stderr)
+        print("  3. GPU memory exhausted", file=sys.stderr)
+        print("  4. CUDA/PyTorch error", file=sys.stderr)
+        print("", file=sys.stderr)
+        print("Check logs above for specific error messages.", file=sys.stderr)
+        print("", file=sys.stderr)
+        print("To debug:", file=sys.stderr)
+        print("  docker logs srgan-upscaler", file=sys.stderr)
+        print("  docker exec srgan-upscaler ls -lh /app/models/", file=sys.stderr)
+        print("  docker exec srgan-upscaler nvidia-smi", file=sys.stderr)
+        print("=" * 80, file=sys.stderr)
+        return False
+
+    print("", file=sys.stderr)
+    print("=" * 80, file=sys.stderr)
+    print("✓✓✓ AI UPSCALING SUCCESSFULLY COMPLETED ✓✓✓", file=sys.stderr)
+    print("=" * 80, file=sys.stderr)
+    print("", file=sys.stderr)
+    print("Summary:", file=sys.stderr)
+    print(f"  • Input processed: {os.path.basename(input_path)}", file=sys.stderr)
+    print(f"  • AI model used: SRGAN", file=sys.stderr)
+    print(f"  • Output verified: Yes (valid video file)", file=sys.stderr)
+    print(f"  • Ready for playback: Yes", file=sys.stderr)
+    print("", file=sys.stderr)
+    print("The upscaled file is now available in your media library!", file=sys.stderr)
+    print("=" * 80, file=sys.stderr)
+    print("", file=sys.stderr)
+    return progress.data["output"] or output_path
+
+
+def _worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _worker_loop(args, initial_job=None):
+    """
+    Consume the job queue until SRGAN_WAIT_SECONDS expires (forever by default).
+
+    Each claimed job is leased to this worker and the lease is renewed by a
+    heartbeat while it runs, so a crashed worker's job goes back to the
+    queue for another worker instead of being lost. A worker that loses
+    the lease (e.g. it stalled past SRGAN_JOB_LEASE_SECONDS) stops the job
+    and leaves it to whoever claims it next, without acking or failing it.
+    """
+    worker_id = _worker_id()
+    wait_seconds = int(os.environ.get("SRGAN_WAIT_SECONDS", "-1") or "-1")
+    poll_seconds = float(os.environ.get("SRGAN_QUEUE_POLL_SECONDS", "0.2") or "0.2")
+    idle_poll_seconds = float(os.environ.get("SRGAN_QUEUE_IDLE_POLL_SECONDS", "30") or "30")
+    lease_seconds = float(os.environ.get("SRGAN_JOB_LEASE_SECONDS", str(DEFAULT_LEASE_SECONDS)))
+    max_attempts = int(os.environ.get("SRGAN_JOB_MAX_ATTEMPTS", str(DEFAULT_MAX_ATTEMPTS)))
+    queue_file = os.environ.get("SRGAN_QUEUE_FILE", "/app/cache/queue.jsonl")
+    _ensure_parent_dir(queue_file)
+    
+    # Durable job store; jobs appended to queue_file are imported into it
+    job_queue = JobQueue(queue_db_path(queue_file), legacy_file=queue_file)
+    
+    # Sleep until inotify or the watchdog's doorbell says there is work;
+    # polling is only a slow fallback (or the only option without either)
+    notifier = QueueNotifier(job_queue, name=worker_id)
+    if notifier.active:
+        poll_seconds = max(poll_seconds, idle_poll_seconds)
+        print(f"[{worker_id}] Queue wakeup: event-driven (fallback poll every {poll_seconds:g}s)", file=sys.stderr)
+    else:
+        print(f"[{worker_id}] Queue wakeup: polling every {poll_seconds:g}s", file=sys.stderr)
+    
+    # Tell the watchdog a worker is up, so it doesn't start the container again
+    heartbeat = WorkerHeartbeat(queue_file, name=worker_id)
+    
+    # Long-lived worker: load the model once and keep it warm between jobs
+    warm_model = os.environ.get("SRGAN_WARM_MODEL", "1") == "1"
+    model_cache = _ModelCache() if warm_model else None
+
     start = time.time()
+
     while True:
-        try:
-            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
-            os.close(fd)
-            return True
-        except FileExistsError:
-            if time.time() - start >= timeout_seconds:
-                return False
-            time.sleep(0.1)
+        if initial_job:
+            job = initial_job
+            initial_job = None
+        else:
+            job = _dequeue_job(job_queue, worker_id, lease_seconds, max_attempts)
 
+        if not job:
+            timeout = poll_seconds
+            if wait_seconds > 0:
+                remaining = wait_seconds - (time.time() - start)
+                if remaining <= 0:
+                    print("Timed out waiting for input/output paths.", file=sys.stderr)
+                    notifier.close()
+                    heartbeat.close()
+                    sys.exit(2)
+                timeout = min(timeout, remaining)
+            notifier.wait(timeout)
+            continue
 
-def _release_lock(lock_path):
-    try:
-        os.remove(lock_path)
-    except FileNotFoundError:
-        return
+        # Unpack job with streaming metadata
+        job_id, input_path, output_path, hls_dir, streaming, checkpoint = job
+        on_checkpoint = None
+        if job_id is not None:
+            print(f"[{worker_id}] Claimed job #{job_id}", file=sys.stderr)
+            if checkpoint:
+                print(f"[{worker_id}] Job #{job_id} has a checkpoint: {checkpoint}", file=sys.stderr)
+
+            def on_checkpoint(work_dir, done, total, job_id=job_id):
+                job_queue.save_checkpoint(job_id, worker_id, work_dir, done / total)
+        
+        heartbeat.set_job(job_id)
+        lease = (
+            LeaseHeartbeat(job_queue, job_id, worker_id, lease_seconds)
+            if job_id is not None else contextlib.nullcontext()
+        )
+        cancel = lease.cancel if job_id is not None else None
+        with lease:
+            try:
+                final_output = _process_job(
+                    input_path, output_path, args.width, args.height, args.scale,
+                    model_cache=model_cache,
+                    checkpoint_dir=checkpoint,
+                    on_checkpoint=on_checkpoint,
+                    job_id=job_id,
+                    cancel=cancel,
+                )
+            except Exception as e:
+                if not (cancel is not None and cancel.is_set()):
+                    print(f"ERROR: Job failed unexpectedly: {e}", file=sys.stderr)
+                final_output = False
+        
+        if job_id is not None:
+            if lease.lost:
+                # The job may be running on another worker by now: don't
+                # record an outcome or publish an output for it. The partial
+                # file is left alone, as the new owner may be writing it.
+                print(f"[{worker_id}] Warning: Dropped job #{job_id} after losing its lease", file=sys.stderr)
+            elif final_output:
+                # Record the final (renamed) file so the dedupe index finds it
+                job_queue.ack(job_id, worker=worker_id, output=final_output)
+            else:
+                job_queue.fail(job_id, "upscaling failed", worker=worker_id)
+        heartbeat.set_job(None)
 
 
-def _dequeue_job(queue_file):
-    lock_path = f"{queue_file}.lock"
-    if not os.path.exists(queue_file):
-        return None
-
-    if not _acquire_lock(lock_path):
-        return None
+def _run_workers(args, count, initial_job):
+    """
+    Run count worker processes against the shared queue and restart any
+    that crash. Returns once every worker has exited on its own.
+    """
+    context = multiprocessing.get_context("spawn")
+    processes = {}
 
-    try:
-        with open(queue_file, "r", encoding="utf-8") as handle:
-            lines = [line.strip() for line in handle if line.strip()]
-        if not lines:
-            return None
-
-        job = None
-        remaining = []
-        for line in lines:
-            if job is None:
-                try:
-                    payload = json.loads(line)
-                    input_path = payload.get("input")
-                    output_path = payload.get("output")
-                    if input_path and output_path:
-                        # Extended job info: (input, output, hls_dir, streaming)
-                        hls_dir = payload.get("hls_dir")
-                        streaming = payload.get("streaming", False)
-                        job = (input_path, output_path, hls_dir, streaming)
-                        continue
-                except json.JSONDecodeError:
-                    pass
-            remaining.append(line)
-
-        with open(queue_file, "w", encoding="utf-8") as handle:
-            for line in remaining:
-                handle.write(f"{line}\n")
-
-        return job
-    finally:
-        _release_lock(lock_path)
+    def _start(index, job=None):
+        process = context.Process(
+            target=_worker_loop, args=(args, job), name=f"srgan-worker-{index}"
+        )
+        process.start()
+        processes[process.sentinel] = (index, process)
+
+    # Spawned workers inherit the environment: divide the CPU between them
+    # (srgan_inference.cpu_thread_allotment) instead of each using every core
+    os.environ["SRGAN_CPU_SHARE"] = str(count)
+    print(f"Starting {count} pipeline workers", file=sys.stderr)
+    for index in range(count):
+        _start(index, initial_job if index == 0 else None)
+
+    exit_code = 0
+    while processes:
+        for sentinel in multiprocessing.connection.wait(list(processes)):
+            index, process = processes.pop(sentinel)
+            process.join()
+            if process.exitcode in (0, 2):
+                # Finished, or SRGAN_WAIT_SECONDS expired
+                exit_code = max(exit_code, process.exitcode)
+                continue
+            print(f"WARNING: Worker {index} exited with code {process.exitcode}, restarting", file=sys.stderr)
+            _start(index)
+    return exit_code
 
 
 def main():
@@ -554,13 +813,12 @@ def main():
     parser.add_argument(
         "--scale", type=float, default=2.0, help="Upscale factor (model only)"
     )
+    parser.add_argument(
+        "--workers", type=int, default=int(os.environ.get("SRGAN_WORKERS", "1") or "1"),
+        help="Number of concurrent queue workers (default: SRGAN_WORKERS or 1)"
+    )
     args = parser.parse_args()
 
-    wait_seconds = int(os.environ.get("SRGAN_WAIT_SECONDS", "-1") or "-1")
-    poll_seconds = float(os.environ.get("SRGAN_QUEUE_POLL_SECONDS", "0.2") or "0.2")
-    queue_file = os.environ.get("SRGAN_QUEUE_FILE", "/app/cache/queue.jsonl")
-    _ensure_parent_dir(queue_file)
-
     initial_input = args.input or os.environ.get("JELLYFIN_INPUT_PATH") or os.environ.get(
         "INPUT_PATH"
     )
@@ -569,110 +827,15 @@ def main():
         or os.environ.get("JELLYFIN_OUTPUT_PATH")
         or os.environ.get("OUTPUT_PATH")
     )
-    used_initial = False
-    start = time.time()
-
-    while True:
-        job = None
-        if not used_initial and initial_input and initial_output:
-            # Initial job doesn't have streaming metadata
-            job = (initial_input, initial_output, None, False)
-            used_initial = True
-        else:
-            job = _dequeue_job(queue_file)
-
-        if not job:
-            if wait_seconds > 0 and time.time() - start >= wait_seconds:
-                print("Timed out waiting for input/output paths.", file=sys.stderr)
-                sys.exit(2)
-            time.sleep(poll_seconds)
-            continue
-
-        # Unpack job with streaming metadata
-        input_path, output_path, hls_dir, streaming = job
-        
-        # CRITICAL: Validate input is not HLS stream
-        input_lower = input_path.lower()
-        if input_lower.endswith('.m3u8') or input_lower.endswith('.m3u') or '/hls/' in input_lower:
-            print(f"ERROR: HLS stream inputs are not supported: {input_path}", file=sys.stderr)
-            print(f"Only raw video files (MKV, MP4, AVI, etc.) can be upscaled", file=sys.stderr)
-            continue
-        
-        # Reject HLS segment files (more specific check)
-        # HLS segments have patterns like segment_NNN.ts, seg_NNN.ts, or are in /hls/ directories
-        if input_lower.endswith('.ts'):
-            basename = os.path.basename(input_lower)
-            normalized_path = input_lower.replace('\\', '/')
-            # Check if it's actually an HLS segment (not just any .ts file)
-            if ('segment_' in basename or 
-                'seg_' in basename or 
-                'chunk_' in basename or
-                '/hls/' in normalized_path or
-                '/segments/' in normalized_path):
-                print(f"ERROR: HLS segment files cannot be upscaled: {input_path}", file=sys.stderr)
-                continue
-        
-        if not os.path.exists(input_path):
-            print(f"ERROR: Input file does not exist: {input_path}", file=sys.stderr)
-            continue
-        
-        print("=" * 80, file=sys.stderr)
-        print(f"AI Upscaling Job", file=sys.stderr)
-        print("=" * 80, file=sys.stderr)
-        print(f"Input:  {input_path}", file=sys.stderr)
-        print(f"Output: {output_path}", file=sys.stderr)
-        print("", file=sys.stderr)
-
-        # AI model upscaling is MANDATORY
-        enable_model = os.environ.get("SRGAN_ENABLE", "1") == "1"  # Default to enabled
-        
-        if not enable_model:
-            print("ERROR: AI upscaling is disabled (SRGAN_ENABLE=0)", file=sys.stderr)
-            print("AI upscaling must be enabled. Set SRGAN_ENABLE=1", file=sys.stderr)
-            print("FFmpeg-only upscaling is not supported in this mode.", file=sys.stderr)
-            continue
-        
-        # Try AI model upscaling
-        print("Starting AI upscaling with SRGAN model...", file=sys.stderr)
-        used_model = _try_model(
-            input_path, output_path, args.width, args.height, args.scale
-        )
-        
-        if not used_model:
-            print("", file=sys.stderr)
-            print("=" * 80, file=sys.stderr)
-            print("ERROR: AI model upscaling failed!", file=sys.stderr)
-            print("=" * 80, file=sys.stderr)
-            print("Possible reasons:", file=sys.stderr)
-            print("  1. Model file not found (check SRGAN_MODEL_PATH)", file=sys.stderr)
-            print("  2. Model file is corrupted", file=sys.stderr)
-            print("  3. GPU memory exhausted", file=sys.stderr)
-            print("  4. CUDA/PyTorch error", file=sys.stderr)
-            print("", file=sys.stderr)
-            print("Check logs above for specific error messages.", file=sys.stderr)
-            print("", file=sys.stderr)
-            print("To debug:", file=sys.stderr)
-            print("  docker logs srgan-upscaler", file=sys.stderr)
-            print("  docker exec srgan-upscaler ls -lh /app/models/", file=sys.stderr)
-            print("  docker exec srgan-upscaler nvidia-smi", file=sys.stderr)
-            print("=" * 80, file=sys.stderr)
-            continue
-        
-        print("", file=sys.stderr)
-        print("=" * 80, file=sys.stderr)
-        print("✓✓✓ AI UPSCALING SUCCESSFULLY COMPLETED ✓✓✓", file=sys.stderr)
-        print("=" * 80, file=sys.stderr)
-        print("", file=sys.stderr)
-        print("Summary:", file=sys.stderr)
-        print(f"  • Input processed: {os.path.basename(input_path)}", file=sys.stderr)
-        print(f"  • AI model used: SRGAN", file=sys.stderr)
-        print(f"  • Output verified: Yes (valid video file)", file=sys.stderr)
-        print(f"  • Ready for playback: Yes", file=sys.stderr)
-        print("", file=sys.stderr)
-        print("The upscaled file is now available in your media library!", file=sys.stderr)
-        print("=" * 80, file=sys.stderr)
-        print("", file=sys.stderr)
+    initial_job = None
+    if initial_input and initial_output:
+        # Initial job doesn't have streaming metadata or a queue entry
+        initial_job = (None, initial_input, initial_output, None, False, None)
 
+    if args.workers <= 1:
+        _worker_loop(args, initial_job)
+    else:
+        sys.exit(_run_workers(args, args.workers, initial_job))
 
 if __name__ == "__main__":
     main()
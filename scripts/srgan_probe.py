@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Media metadata probe with an on-disk cache
+
+One ffprobe call per file fetches everything an upscaling job needs:
+dimensions, frame rate, codec, color metadata, duration, frame count and
+the stream map. Results are cached as small JSON files keyed by path and
+invalidated when the file's size or mtime changes, so re-queued or
+re-verified files on slow (NFS) libraries aren't demuxed again.
+
+Cache location: SRGAN_PROBE_CACHE_DIR (default /app/cache/probe,
+empty disables the disk cache).
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+DEFAULT_CACHE_DIR = "/app/cache/probe"
+MEMORY_CACHE_SIZE = 256
+# Bumped when _summarize() gains fields, so older cache files are re-probed
+CACHE_VERSION = 2
+
+# In-process copy of recent results: (abspath, size, mtime_ns) -> info
+_memory_cache = {}
+
+
+def _parse_rate(rate):
+    """Parse an ffprobe rate like 24000/1001 into frames per second"""
+    try:
+        if "/" in rate:
+            num, den = rate.split("/", 1)
+            return float(num) / float(den) if float(den) > 0 else 0.0
+        return float(rate)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _is_hdr(stream):
+    color_transfer = (stream.get("color_transfer") or "").lower()
+    color_space = (stream.get("color_space") or "").lower()
+    color_primaries = (stream.get("color_primaries") or "").lower()
+    return (
+        "smpte2084" in color_transfer or  # HDR10
+        "arib-std-b67" in color_transfer or  # HLG
+        "bt2020" in color_space or
+        "bt2020" in color_primaries
+    )
+
+
+def _summarize(data):
+    """Reduce raw ffprobe JSON to the fields the pipeline uses"""
+    streams = data.get("streams") or []
+    fmt = data.get("format") or {}
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if video is None:
+        return None
+
+    fps = _parse_rate(video.get("r_frame_rate") or "") or _parse_rate(video.get("avg_frame_rate") or "")
+    duration = video.get("duration") or fmt.get("duration")
+    duration = float(duration) if duration not in (None, "", "N/A") else None
+    nb_frames = video.get("nb_frames")
+    frame_count = int(nb_frames) if str(nb_frames or "").isdigit() else None
+    if frame_count is None and duration and fps:
+        frame_count = int(round(duration * fps))
+
+    return {
+        "width": int(video.get("width", 0) or 0),
+        "height": int(video.get("height", 0) or 0),
+        "fps": fps,
+        "r_frame_rate": video.get("r_frame_rate", ""),
+        "codec_name": video.get("codec_name", ""),
+        "pix_fmt": video.get("pix_fmt", ""),
+        "color_space": video.get("color_space", ""),
+        "color_transfer": video.get("color_transfer", ""),
+        "color_primaries": video.get("color_primaries", ""),
+        "color_range": video.get("color_range", ""),
+        "is_hdr": _is_hdr(video),
+        "duration": duration,
+        "frame_count": frame_count,
+        "format_name": fmt.get("format_name", ""),
+        "streams": [
+            {
+                "index": s.get("index"),
+                "codec_type": s.get("codec_type"),
+                "codec_name": s.get("codec_name"),
+                "language": (s.get("tags") or {}).get("language"),
+            }
+            for s in streams
+        ],
+    }
+
+
+def _run_ffprobe(path, timeout):
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_streams",
+        "-show_format",
+        "-of", "json",
+        path,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=timeout)
+    return json.loads(result.stdout)
+
+
+def _cache_file(cache_dir, path):
+    digest = hashlib.sha1(path.encode("utf-8", "surrogateescape")).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.json")
+
+
+def _read_cache(cache_dir, path, size, mtime_ns):
+    try:
+        with open(_cache_file(cache_dir, path), "r", encoding="utf-8") as handle:
+            entry = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    if (entry.get("version") != CACHE_VERSION or entry.get("path") != path
+            or entry.get("size") != size or entry.get("mtime_ns") != mtime_ns):
+        return None
+    return entry.get("info")
+
+
+def _write_cache(cache_dir, path, size, mtime_ns, info):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump({"version": CACHE_VERSION, "path": path, "size": size, "mtime_ns": mtime_ns,
+                       "info": info}, handle)
+        os.replace(tmp_path, _cache_file(cache_dir, path))
+    except OSError:
+        pass  # The cache is an optimisation only
+
+
+def probe_media(path, use_cache=True, timeout=30):
+    """
+    Probe path once and return a metadata dict, or None if it has no video.
+
+    Raises subprocess.CalledProcessError / TimeoutExpired / OSError when
+    ffprobe fails, so callers can report why.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    cache_dir = os.environ.get("SRGAN_PROBE_CACHE_DIR", DEFAULT_CACHE_DIR) if use_cache else ""
+
+    if use_cache:
+        if key in _memory_cache:
+            return _memory_cache[key]
+        if cache_dir:
+            info = _read_cache(cache_dir, path, stat.st_size, stat.st_mtime_ns)
+            if info is not None:
+                _memory_cache[key] = info
+                return info
+
+    info = _summarize(_run_ffprobe(path, timeout))
+    if use_cache and info is not None:
+        if len(_memory_cache) >= MEMORY_CACHE_SIZE:
+            _memory_cache.clear()
+        _memory_cache[key] = info
+        if cache_dir:
+            _write_cache(cache_dir, path, stat.st_size, stat.st_mtime_ns, info)
+    return info
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Probe media files (cached)")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--no-cache", action="store_true", help="Always run ffprobe")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        try:
+            info = probe_media(path, use_cache=not args.no_cache)
+        except Exception as e:
+            print(f"{path}: probe failed: {e}", file=sys.stderr)
+            continue
+        print(json.dumps({"path": path, "info": info}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
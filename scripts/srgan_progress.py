@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Per-job progress files shared by the pipeline and the watchdog
+
+The pipeline publishes each job's state as a small JSON file in a
+directory both sides can see (next to the job queue by default):
+
+    SRGAN_QUEUE_FILE=/app/cache/queue.jsonl  ->  /app/cache/progress/
+
+Files are named after the input's file name (the key the playback
+overlay knows), written atomically and throttled to one write per
+SRGAN_PROGRESS_INTERVAL seconds, so reading one job is a single small
+file read: no database query, no ffprobe.
+
+Fields: job_id, input, output, filename, status (queued, processing,
+complete, failed, cancelled), stage, message, frames_done, total_frames, progress
+(percent), fps, source_fps, processing_rate (speed relative to real
+time), stage_fps (decode/infer/encode rates, when the backend reports
+them), eta_seconds, started_at, updated_at and stale (no update for
+STALE_SECONDS while processing; the worker probably died).
+
+Usage:
+    python3 srgan_progress.py              # active jobs
+    python3 srgan_progress.py movie.mkv    # one job
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+DEFAULT_QUEUE_FILE = "/app/cache/queue.jsonl"
+DEFAULT_INTERVAL = 1.0
+STALE_SECONDS = 120
+ACTIVE_STATES = ("queued", "processing")
+
+
+def progress_dir(queue_file=None):
+    """Progress directory for a queue file (SRGAN_PROGRESS_DIR overrides)."""
+    explicit = os.environ.get("SRGAN_PROGRESS_DIR")
+    if explicit:
+        return explicit
+    queue_file = queue_file or os.environ.get("SRGAN_QUEUE_FILE", DEFAULT_QUEUE_FILE)
+    return os.path.join(os.path.dirname(os.path.abspath(queue_file)), "progress")
+
+
+def _progress_file(directory, name):
+    key = os.path.basename(name)
+    digest = hashlib.sha1(key.encode("utf-8", "surrogateescape")).hexdigest()
+    return os.path.join(directory, f"{digest}.json")
+
+
+def _ensure_dir(directory):
+    # Written by the pipeline (root in the container) and the watchdog (a
+    # host user): make the directory world-writable, like the queue database
+    if os.path.isdir(directory):
+        return
+    os.makedirs(directory, exist_ok=True)
+    try:
+        os.chmod(directory, 0o777)
+    except OSError:
+        pass
+
+
+def _write(directory, name, data):
+    try:
+        _ensure_dir(directory)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(data, handle)
+        os.chmod(tmp_path, 0o666)
+        os.replace(tmp_path, _progress_file(directory, name))
+        return True
+    except OSError as e:
+        print(f"Warning: Could not write progress for {name}: {e}", file=sys.stderr)
+        return False
+
+
+def _with_staleness(data, now):
+    data["stale"] = (
+        data.get("status") == "processing"
+        and now - (data.get("updated_at") or 0) > STALE_SECONDS
+    )
+    return data
+
+
+class ProgressReporter:
+    """
+    Publishes one job's progress.
+
+        reporter = ProgressReporter(input_path, output_path, job_id=7)
+        reporter.start(total_frames=2400, fps=23.976)
+        reporter.update(frames_done)   # as often as you like, throttled
+        reporter.complete(final_output)
+    """
+
+    def __init__(self, input_path, output_path=None, job_id=None, directory=None, interval=None):
+        self.directory = directory or progress_dir()
+        if interval is None:
+            interval = float(os.environ.get("SRGAN_PROGRESS_INTERVAL", str(DEFAULT_INTERVAL)))
+        self.interval = interval
+        now = time.time()
+        self.data = {
+            "job_id": job_id,
+            "input": input_path,
+            "output": output_path,
+            "filename": os.path.basename(input_path),
+            "status": "queued",
+            "stage": "queued",
+            "message": "Waiting for the upscaler",
+            "frames_done": 0,
+            "total_frames": None,
+            "progress": 0.0,
+            "fps": None,
+            "source_fps": None,
+            "processing_rate": None,
+            "stage_fps": None,
+            "eta_seconds": None,
+            "started_at": None,
+            "updated_at": now,
+        }
+        self._last_write = 0.0
+        self._sample = None  # (time, frames) of the last rate sample
+
+    def _publish(self, force=False):
+        now = time.time()
+        if self.directory is None or (not force and now - self._last_write < self.interval):
+            return
+        self._last_write = now
+        self.data["updated_at"] = now
+        if not _write(self.directory, self.data["filename"], self.data):
+            self.directory = None  # Unwritable: warn once, then stop trying
+
+    def queued(self):
+        self._publish(force=True)
+
+    def start(self, total_frames=None, fps=None):
+        self.data.update(
+            status="processing",
+            source_fps=fps or None,
+            total_frames=total_frames or None,
+            started_at=self.data["started_at"] or time.time(),
+        )
+        self.stage("upscaling", "Upscaling in progress...")
+
+    def stage(self, stage, message=None):
+        self.data["stage"] = stage
+        if message is not None:
+            self.data["message"] = message
+        self._publish(force=True)
+
+    def update(self, frames_done, stage_fps=None):
+        now = time.time()
+        if self._sample is None:
+            self._sample = (now, frames_done)
+        elif now - self._sample[0] >= self.interval:
+            # Smoothed rate over the last intervals; resumed or duplicate
+            # frames don't skew it since only deltas are used
+            instant = (frames_done - self._sample[1]) / (now - self._sample[0])
+            fps = self.data["fps"]
+            self.data["fps"] = round(instant if fps is None else 0.7 * fps + 0.3 * instant, 2)
+            self._sample = (now, frames_done)
+
+        self.data["frames_done"] = frames_done
+        if stage_fps is not None:
+            self.data["stage_fps"] = stage_fps
+        total = self.data["total_frames"]
+        fps = self.data["fps"]
+        if total:
+            self.data["progress"] = round(min(100.0, 100.0 * frames_done / total), 1)
+            if fps:
+                self.data["eta_seconds"] = round(max(0, total - frames_done) / fps, 1)
+        if fps and self.data["source_fps"]:
+            self.data["processing_rate"] = round(fps / self.data["source_fps"], 3)
+        self._publish()
+
+    def complete(self, output_path=None):
+        if output_path:
+            self.data["output"] = output_path
+        self.data.update(status="complete", stage="complete", progress=100.0, eta_seconds=0,
+                         message="Upscaling complete")
+        self._publish(force=True)
+
+    def fail(self, error):
+        self.data.update(status="failed", stage="failed", eta_seconds=None, message=str(error))
+        self._publish(force=True)
+
+    def cancel(self, reason):
+        self.data.update(status="cancelled", stage="cancelled", eta_seconds=None, message=str(reason))
+        self._publish(force=True)
+
+
+def read_progress(name, directory=None):
+    """Progress dict for the job whose input file is called name, or None."""
+    try:
+        with open(_progress_file(directory or progress_dir(), name), "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    return _with_staleness(data, time.time())
+
+
+def list_progress(directory=None, active_only=True):
+    """Progress of every job (only queued/processing ones by default), newest first."""
+    directory = directory or progress_dir()
+    now = time.time()
+    jobs = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return jobs
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        if active_only and data.get("status") not in ACTIVE_STATES:
+            continue
+        jobs.append(_with_staleness(data, now))
+    jobs.sort(key=lambda job: job.get("updated_at") or 0, reverse=True)
+    return jobs
+
+
+def prune_progress(directory=None, max_age=86400):
+    """Remove progress files that haven't changed for max_age seconds."""
+    directory = directory or progress_dir()
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def main():
+    if len(sys.argv) > 1:
+        data = read_progress(sys.argv[1])
+        if data is None:
+            print(f"No progress for {sys.argv[1]}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(data, indent=2))
+        return
+    for job in list_progress():
+        eta = f", ETA {job['eta_seconds']:.0f}s" if job.get("eta_seconds") else ""
+        stale = " (stale)" if job["stale"] else ""
+        print(f"{job['filename']}: {job['status']}/{job['stage']} {job['progress']:.1f}%{eta}{stale}")
+
+
+if __name__ == "__main__":
+    main()
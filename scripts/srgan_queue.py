@@ -0,0 +1,823 @@
+#!/usr/bin/env python3
+"""
+SRGAN Job Queue - durable SQLite job store shared by watchdog and pipeline
+
+Replaces rewriting queue.jsonl on every dequeue. Jobs live in a SQLite
+database in WAL mode next to the legacy queue file:
+
+    SRGAN_QUEUE_FILE=/app/cache/queue.jsonl  ->  /app/cache/queue.db
+
+- enqueue() is a single INSERT
+- claim() marks the oldest queued job as running in one short transaction,
+  so concurrent producers and consumers never see the same job twice
+- ack() / fail() record the outcome
+- a claimed job is leased to one worker; LeaseHeartbeat keeps the lease
+  alive while the job runs, and jobs whose lease expired (worker crashed
+  or was killed) are re-queued by the next claim()
+- save_checkpoint() records a running job's segment directory and
+  progress, so a re-queued job resumes where it stopped
+- a media index keyed by input path, size and mtime tracks each file's
+  latest job (queued, running, done with the final output, or failed);
+  enqueue_unique() / lookup_media() let the watchdog skip files that are
+  already queued or upscaled, and claim() skips duplicate jobs, so no file
+  is upscaled twice.
+  Failed entries expire after SRGAN_DEDUPE_RETRY_SECONDS so they can be
+  retried
+
+Several pipeline workers on one host (processes, or containers sharing
+the cache directory) can consume the same queue. WAL mode coordinates
+through a shared-memory index, so the cache directory must be on a local
+filesystem: the queue can't live on NFS/SMB or be shared between hosts.
+
+Idle consumers block in QueueNotifier.wait() instead of polling: inotify
+on the queue directory, plus a Unix datagram "doorbell" socket per worker
+that producers ring with ring_doorbell() after enqueueing.
+
+Running workers also refresh a heartbeat file (WorkerHeartbeat, one per
+worker under <queue dir>/workers/), so producers can tell with
+live_workers() whether anyone is consuming the queue without asking
+Docker.
+
+queue.jsonl is still accepted as an inbox: lines appended to it (by older
+watchdogs or the shell helpers) are imported into the database and the
+file is emptied.
+
+Usage:
+    python3 srgan_queue.py status
+    python3 srgan_queue.py list
+    python3 srgan_queue.py import [queue.jsonl]
+    python3 srgan_queue.py clear
+"""
+
+import argparse
+import collections
+import ctypes
+import fcntl
+import glob
+import json
+import os
+import select
+import socket
+import sqlite3
+import struct
+import sys
+import threading
+import time
+
+DEFAULT_QUEUE_FILE = "/app/cache/queue.jsonl"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    input TEXT NOT NULL,
+    output TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    error TEXT,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    checkpoint TEXT,
+    progress REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state_id ON jobs (state, id);
+CREATE TABLE IF NOT EXISTS media (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    state TEXT NOT NULL,
+    job_id INTEGER,
+    output TEXT,
+    updated_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS media_expires ON media (expires_at);
+"""
+
+# Columns added after the first release of the schema
+_MIGRATIONS = {
+    "worker": "ALTER TABLE jobs ADD COLUMN worker TEXT",
+    "lease_expires": "ALTER TABLE jobs ADD COLUMN lease_expires REAL",
+    "attempts": "ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0",
+    "checkpoint": "ALTER TABLE jobs ADD COLUMN checkpoint TEXT",
+    "progress": "ALTER TABLE jobs ADD COLUMN progress REAL",
+}
+
+DEFAULT_LEASE_SECONDS = 60
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_DEDUPE_RETRY_SECONDS = 3600
+
+Job = collections.namedtuple(
+    "Job", ["id", "input", "output", "payload", "checkpoint"], defaults=(None,)
+)
+
+
+def media_key(path):
+    """(normalized path, size, mtime_ns) identifying one version of a media file."""
+    key = os.path.normpath(os.path.abspath(path))
+    try:
+        stat = os.stat(key)
+    except OSError:
+        return key, None, None
+    return key, stat.st_size, stat.st_mtime_ns
+
+
+def queue_db_path(queue_file=None):
+    """Database path for a queue file (SRGAN_QUEUE_DB overrides)."""
+    explicit = os.environ.get("SRGAN_QUEUE_DB")
+    if explicit:
+        return explicit
+    queue_file = queue_file or os.environ.get("SRGAN_QUEUE_FILE", DEFAULT_QUEUE_FILE)
+    return f"{os.path.splitext(queue_file)[0]}.db"
+
+
+class JobQueue:
+    """SQLite-backed job queue. Safe to use from several threads and processes."""
+
+    def __init__(self, db_path, legacy_file=None):
+        self.db_path = db_path
+        self.legacy_file = legacy_file
+        parent = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(parent, exist_ok=True)
+        self._create_db_file()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, statement in _MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(statement)
+
+    def _create_db_file(self):
+        # The watchdog runs as a host user and the pipeline as root in the
+        # container; create the file world-writable so both can open it.
+        # SQLite gives the -wal/-shm files the same permissions.
+        if os.path.exists(self.db_path):
+            return
+        try:
+            fd = os.open(self.db_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except FileExistsError:
+            return
+        try:
+            os.fchmod(fd, 0o666)
+        finally:
+            os.close(fd)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return _Connection(conn)
+
+    def enqueue(self, job):
+        """Append a job dict (must have input and output). Returns the job id."""
+        return self._enqueue(job, unique=False)[0]
+
+    def enqueue_unique(self, job):
+        """
+        Like enqueue(), unless the input already has a live media entry
+        (queued, running, done or recently failed). Returns (job_id, entry):
+        entry is None when a new job was created, otherwise it is the
+        existing entry (see lookup_media) and nothing was queued. The check
+        and the insert are one transaction, so concurrent producers queue
+        a file only once.
+        """
+        return self._enqueue(job, unique=True)
+
+    def _enqueue(self, job, unique):
+        input_path = job.get("input")
+        output_path = job.get("output")
+        if not input_path or not output_path:
+            raise ValueError("Job requires 'input' and 'output'")
+        with self._connect() as conn:
+            stat = self._stat_media(conn, input_path)
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired entries sit at the front of the expires_at index
+                conn.execute("DELETE FROM media WHERE expires_at < ?", (now,))
+                entry = self._lookup_media(conn, input_path, stat)
+                if unique and entry is not None:
+                    conn.execute("COMMIT")
+                    return entry["job_id"], entry
+                cursor = conn.execute(
+                    "INSERT INTO jobs (input, output, payload, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (input_path, output_path, json.dumps(job), now, now),
+                )
+                job_id = cursor.lastrowid
+                if entry is None:
+                    self._index_media(conn, stat[0], "queued", job_id)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return job_id, None
+
+    def claim(self, worker="worker", lease_seconds=DEFAULT_LEASE_SECONDS,
+              max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Atomically lease the oldest queued job to worker. Returns Job or None.
+
+        Running jobs whose lease has expired are put back in the queue first,
+        or marked failed once they have been attempted max_attempts times.
+        """
+        self.import_legacy()
+        with self._connect() as conn:
+            while True:
+                # Stat the next input before taking the write lock: media
+                # on a network mount can take a while to answer
+                peek = conn.execute(
+                    "SELECT input FROM jobs WHERE state = 'queued' ORDER BY id LIMIT 1"
+                ).fetchone()
+                stat = self._stat_media(conn, peek[0]) if peek else None
+                now = time.time()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(
+                        "UPDATE jobs SET state = 'failed', worker = NULL, updated_at = ?, "
+                        "error = 'lease expired ' || attempts || ' times' "
+                        "WHERE state = 'running' AND lease_expires < ? AND attempts >= ?",
+                        (now, now, max_attempts),
+                    )
+                    conn.execute(
+                        "UPDATE jobs SET state = 'queued', worker = NULL, updated_at = ? "
+                        "WHERE state = 'running' AND lease_expires < ?",
+                        (now, now),
+                    )
+                    row = conn.execute(
+                        "SELECT id, input, output, payload, checkpoint FROM jobs "
+                        "WHERE state = 'queued' ORDER BY id LIMIT 1"
+                    ).fetchone()
+                    if row is None:
+                        conn.execute("COMMIT")
+                        return None
+                    if peek is None or row[1] != peek[0]:
+                        # Another job came first (re-queued, or the peeked one
+                        # was claimed meanwhile): stat that one instead
+                        conn.execute("COMMIT")
+                        continue
+                    entry = self._lookup_media(conn, row[1], stat)
+                    if entry is not None and entry["job_id"] != row[0] and entry["state"] in ("running", "done"):
+                        # Already upscaled, or another job is upscaling it right now
+                        reason = f"duplicate of job #{entry['job_id']} ({entry['state']})"
+                        print(f"Skipping job #{row[0]}: {row[1]} is a {reason}", file=sys.stderr)
+                        conn.execute(
+                            "UPDATE jobs SET state = 'done', error = ?, updated_at = ? WHERE id = ?",
+                            (reason, now, row[0]),
+                        )
+                        conn.execute("COMMIT")
+                        continue
+                    conn.execute(
+                        "UPDATE jobs SET state = 'running', worker = ?, lease_expires = ?, "
+                        "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (worker, now + lease_seconds, now, row[0]),
+                    )
+                    self._index_media(conn, stat[0], "running", row[0])
+                    conn.execute("COMMIT")
+                    break
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        return Job(row[0], row[1], row[2], json.loads(row[3]), row[4])
+
+    def heartbeat(self, job_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend worker's lease on a running job. Returns False if the lease was lost."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? "
+                "WHERE id = ? AND state = 'running' AND worker = ?",
+                (time.time() + lease_seconds, job_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def save_checkpoint(self, job_id, worker, checkpoint, progress):
+        """
+        Remember where a running job's partial output lives and how far it
+        got (0-1). Kept across lease expiry, so the next claim resumes it.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET checkpoint = ?, progress = ?, updated_at = ? "
+                "WHERE id = ? AND state = 'running' AND worker = ?",
+                (checkpoint, progress, time.time(), job_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def ack(self, job_id, worker=None, output=None):
+        """Mark a claimed job as done; output is the final file if it was renamed."""
+        self._finish(job_id, "done", None, worker, output)
+
+    def fail(self, job_id, error=None, worker=None):
+        """Mark a claimed job as failed."""
+        self._finish(job_id, "failed", error, worker)
+
+    def _finish(self, job_id, state, error, worker, output=None):
+        # With a worker given, only the current lease holder can finish the job
+        now = time.time()
+        query = ("UPDATE jobs SET state = ?, error = ?, lease_expires = NULL, updated_at = ? "
+                 "WHERE id = ?")
+        params = [state, error, now, job_id]
+        if worker is not None:
+            query += " AND worker = ? AND state = 'running'"
+            params.append(worker)
+        expires_at = None
+        if state == "failed":
+            retry = float(os.environ.get("SRGAN_DEDUPE_RETRY_SECONDS", str(DEFAULT_DEDUPE_RETRY_SECONDS)))
+            expires_at = now + retry
+        with self._connect() as conn:
+            if conn.execute(query, params).rowcount == 1:
+                conn.execute(
+                    "UPDATE media SET state = ?, output = COALESCE(?, output), "
+                    "updated_at = ?, expires_at = ? WHERE job_id = ?",
+                    (state, output, now, expires_at, job_id),
+                )
+
+    def _index_media(self, conn, identity, state, job_id):
+        key, size, mtime_ns = identity
+        output = conn.execute("SELECT output FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO media (path, size, mtime_ns, state, job_id, output, updated_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, NULL)",
+            (key, size, mtime_ns, state, job_id, output[0] if output else None, time.time()),
+        )
+
+    def _stat_media(self, conn, path):
+        """
+        The filesystem half of a media lookup, done outside write
+        transactions: (media_key(path), {indexed output: exists}).
+        """
+        identity = media_key(path)
+        row = conn.execute("SELECT output FROM media WHERE path = ?", (identity[0],)).fetchone()
+        outputs = {row[0]: os.path.exists(row[0])} if row and row[0] else {}
+        return identity, outputs
+
+    def _lookup_media(self, conn, path, stat=None):
+        (key, size, mtime_ns), outputs = stat or self._stat_media(conn, path)
+        row = conn.execute(
+            "SELECT m.size, m.mtime_ns, m.state, m.job_id, m.output, m.updated_at, m.expires_at, j.state "
+            "FROM media m LEFT JOIN jobs j ON j.id = m.job_id WHERE m.path = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        entry_size, entry_mtime, state, job_id, output, updated_at, expires_at, job_state = row
+        if (entry_size, entry_mtime) != (size, mtime_ns):
+            return None  # The file was replaced since
+        if expires_at is not None and expires_at < time.time():
+            return None
+        if state in ("queued", "running") and job_state != state:
+            return None  # Job cleared, or re-queued/failed after its worker died
+        if state == "done":
+            # Stat inline only if the entry changed since _stat_media()
+            exists = outputs[output] if output in outputs else bool(output) and os.path.exists(output)
+            if not exists:
+                return None  # Output deleted: upscale again
+        return {"path": key, "state": state, "job_id": job_id, "output": output,
+                "updated_at": updated_at}
+
+    def lookup_media(self, path):
+        """
+        Latest job for this version of the file, as a dict with state
+        (queued, running, done, failed), job_id, output and updated_at, or
+        None if it was never queued, changed since, or the entry is no
+        longer valid (output deleted, failure older than the retry window).
+        """
+        with self._connect() as conn:
+            return self._lookup_media(conn, path)
+
+    def counts(self):
+        """Number of jobs per state."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+    def list_jobs(self, states=("queued", "running"), limit=100):
+        placeholders = ",".join("?" for _ in states)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, state, input, output, created_at, worker, progress FROM jobs "
+                f"WHERE state IN ({placeholders}) ORDER BY id LIMIT ?",
+                (*states, limit),
+            ).fetchall()
+        return [
+            {"id": r[0], "state": r[1], "input": r[2], "output": r[3], "created_at": r[4],
+             "worker": r[5], "progress": r[6]}
+            for r in rows
+        ]
+
+    def clear(self):
+        """Drop every queued job. Returns how many were removed."""
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM jobs WHERE state = 'queued'").rowcount
+
+    def import_legacy(self):
+        """Import jobs appended to the legacy queue.jsonl, if any."""
+        if not self.legacy_file:
+            return 0
+        return self.import_jsonl(self.legacy_file)
+
+    def import_jsonl(self, path):
+        """
+        Move the jobs in a JSONL queue file into the database.
+
+        The file is renamed before reading so appends that happen meanwhile
+        land in a fresh file and are picked up next time. A leftover
+        .importing file from an interrupted import is processed first.
+        """
+        # Only one consumer imports at a time; the others find the jobs in the db
+        with open(f"{path}.lock", "a") as lock_handle:
+            try:
+                fcntl.flock(lock_handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            return self._import_jsonl_locked(path)
+
+    def _import_jsonl_locked(self, path):
+        importing = f"{path}.importing"
+        if not os.path.exists(importing):
+            try:
+                if os.path.getsize(path) == 0:
+                    return 0
+                os.replace(path, importing)
+            except FileNotFoundError:
+                return 0
+            # Recreate the inbox so appenders and tooling keep finding it
+            _touch(path)
+
+        jobs = []
+        with open(importing, "r", encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    payload = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Warning: Skipping invalid queue line: {line[:200]}", file=sys.stderr)
+                    continue
+                if not isinstance(payload, dict) or not payload.get("input") or not payload.get("output"):
+                    print(f"Warning: Skipping queue line without input/output: {line[:200]}", file=sys.stderr)
+                    continue
+                jobs.append(payload)
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO jobs (input, output, payload, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(job["input"], job["output"], json.dumps(job), now, now) for job in jobs],
+            )
+            conn.execute("COMMIT")
+        os.remove(importing)
+        return len(jobs)
+
+
+class LeaseHeartbeat:
+    """
+    Keeps a claimed job's lease alive from a background thread.
+
+        with LeaseHeartbeat(job_queue, job.id, worker_id) as lease:
+            run_the_job(cancel=lease.cancel)
+
+    If the lease is lost (it expired and another worker may have claimed
+    the job), lost becomes True and the cancel event is set so the job
+    can be stopped.
+    """
+
+    def __init__(self, job_queue, job_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.job_queue = job_queue
+        self.job_id = job_id
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self.cancel = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+
+    def _run(self):
+        interval = max(1.0, self.lease_seconds / 3)
+        while not self._stop.wait(interval):
+            try:
+                if not self.job_queue.heartbeat(self.job_id, self.worker, self.lease_seconds):
+                    if not self.lost:
+                        print(f"Warning: Lost lease on job #{self.job_id}", file=sys.stderr)
+                    self.lost = True
+                    self.cancel.set()
+            except Exception as e:
+                print(f"Warning: Lease heartbeat failed for job #{self.job_id}: {e}", file=sys.stderr)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+class _Connection:
+    """Context manager that always closes the sqlite3 connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.close()
+        return False
+
+
+def _touch(path):
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_WRONLY, 0o666)
+        os.close(fd)
+    except OSError:
+        pass
+
+
+# inotify(7) constants
+_IN_MODIFY = 0x00000002
+_IN_MOVED_TO = 0x00000080
+_IN_EVENT_HEADER = struct.Struct("iIII")
+
+
+def doorbell_dir(queue_file=None):
+    """Directory holding one doorbell socket per idle worker."""
+    queue_file = queue_file or os.environ.get("SRGAN_QUEUE_FILE", DEFAULT_QUEUE_FILE)
+    return os.environ.get(
+        "SRGAN_QUEUE_DOORBELL_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(queue_file)), "doorbell"),
+    )
+
+
+def ring_doorbell(queue_file=None):
+    """
+    Wake every worker waiting on the queue. Never blocks or raises:
+    workers without a doorbell still find the job via inotify or polling.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    try:
+        for path in glob.glob(os.path.join(doorbell_dir(queue_file), "*.sock")):
+            try:
+                sock.sendto(b"1", path)
+            except ConnectionRefusedError:
+                # Worker exited without cleaning up
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            except OSError:
+                pass
+    finally:
+        sock.close()
+
+
+DEFAULT_HEARTBEAT_SECONDS = 10
+
+
+def heartbeat_dir(queue_file=None):
+    """Directory holding one heartbeat file per running worker."""
+    queue_file = queue_file or os.environ.get("SRGAN_QUEUE_FILE", DEFAULT_QUEUE_FILE)
+    return os.environ.get(
+        "SRGAN_HEARTBEAT_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(queue_file)), "workers"),
+    )
+
+
+class WorkerHeartbeat:
+    """
+    Advertises a running worker by rewriting <heartbeat dir>/<name>.json
+    every interval seconds from a background thread; the file is removed
+    on close(). A worker that dies without closing simply goes stale.
+    """
+
+    def __init__(self, queue_file=None, name=None, interval=None):
+        if interval is None:
+            interval = float(os.environ.get("SRGAN_HEARTBEAT_SECONDS", str(DEFAULT_HEARTBEAT_SECONDS)))
+        self.interval = interval
+        self.name = name or str(os.getpid())
+        directory = heartbeat_dir(queue_file)
+        self.path = os.path.join(directory, f"{self.name}.json")
+        self.job_id = None
+        self._stop = threading.Event()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            os.chmod(directory, 0o777)
+        except OSError:
+            pass
+        self.beat()
+        self._thread = threading.Thread(target=self._run, name="worker-heartbeat", daemon=True)
+        self._thread.start()
+
+    def beat(self):
+        data = {"worker": self.name, "pid": os.getpid(), "job_id": self.job_id,
+                "interval": self.interval, "updated_at": time.time()}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(data, handle)
+            os.chmod(tmp_path, 0o666)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass  # Producers then just start the worker again; harmless
+
+    def set_job(self, job_id):
+        self.job_id = job_id
+        self.beat()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.beat()
+
+    def close(self):
+        self._stop.set()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def live_workers(queue_file=None, max_age=None):
+    """
+    Heartbeats of workers that beat within max_age seconds (default: three
+    of their own intervals), as a list of dicts.
+    """
+    directory = heartbeat_dir(queue_file)
+    now = time.time()
+    workers = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        limit = max_age if max_age is not None else 3 * (data.get("interval") or DEFAULT_HEARTBEAT_SECONDS)
+        if now - (data.get("updated_at") or 0) <= limit:
+            workers.append(data)
+    return workers
+
+
+class QueueNotifier:
+    """
+    Blocks an idle consumer until the queue may have new work.
+
+    Wakes on inotify events for the queue database and legacy queue file,
+    or on a datagram to this worker's doorbell socket. If neither is
+    available (non-Linux, unwritable directory) wait() just sleeps, so the
+    caller degrades to polling.
+    """
+
+    def __init__(self, job_queue, name=None):
+        self._fds = []
+        self._inotify_fd = None
+        self._doorbell = None
+        self.doorbell_path = None
+
+        db_name = os.path.basename(job_queue.db_path)
+        self._names = {db_name.encode(), f"{db_name}-wal".encode()}
+        if job_queue.legacy_file:
+            self._names.add(os.path.basename(job_queue.legacy_file).encode())
+
+        self._start_inotify(os.path.dirname(os.path.abspath(job_queue.db_path)))
+        self._start_doorbell(job_queue.legacy_file, name or str(os.getpid()))
+
+    @property
+    def active(self):
+        return bool(self._fds)
+
+    def _start_inotify(self, directory):
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return
+            if libc.inotify_add_watch(fd, directory.encode(), _IN_MODIFY | _IN_MOVED_TO) < 0:
+                os.close(fd)
+                return
+        except (OSError, AttributeError):
+            return
+        self._inotify_fd = fd
+        self._fds.append(fd)
+
+    def _start_doorbell(self, queue_file, name):
+        directory = doorbell_dir(queue_file)
+        path = os.path.join(directory, f"{name}.sock")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            try:
+                os.chmod(directory, 0o777)
+            except OSError:
+                pass
+            if os.path.exists(path):
+                os.remove(path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(path)
+            # The watchdog rings as a host user
+            os.chmod(path, 0o666)
+        except OSError as e:
+            print(f"Warning: Queue doorbell unavailable ({e})", file=sys.stderr)
+            return
+        sock.setblocking(False)
+        self._doorbell = sock
+        self.doorbell_path = path
+        self._fds.append(sock.fileno())
+
+    def _drain_inotify(self):
+        relevant = False
+        while True:
+            try:
+                data = os.read(self._inotify_fd, 65536)
+            except (BlockingIOError, InterruptedError):
+                return relevant
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = _IN_EVENT_HEADER.unpack_from(data, offset)
+                start = offset + _IN_EVENT_HEADER.size
+                name = data[start:start + length].rstrip(b"\0")
+                relevant = relevant or name in self._names
+                offset = start + length
+
+    def _drain_doorbell(self):
+        rang = False
+        while True:
+            try:
+                self._doorbell.recv(64)
+                rang = True
+            except (BlockingIOError, InterruptedError):
+                return rang
+
+    def wait(self, timeout):
+        """Return when the queue may have changed or after timeout seconds."""
+        if not self._fds:
+            time.sleep(timeout)
+            return
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select(self._fds, [], [], remaining)
+            woke = False
+            if self._inotify_fd in readable:
+                woke = self._drain_inotify() or woke
+            if self._doorbell is not None and self._doorbell.fileno() in readable:
+                woke = self._drain_doorbell() or woke
+            if woke:
+                return
+
+    def close(self):
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+        if self._doorbell is not None:
+            self._doorbell.close()
+            self._doorbell = None
+            try:
+                os.remove(self.doorbell_path)
+            except OSError:
+                pass
+        self._fds = []
+
+
+def open_queue(queue_file=None):
+    """Open the job queue configured by SRGAN_QUEUE_FILE / SRGAN_QUEUE_DB."""
+    queue_file = queue_file or os.environ.get("SRGAN_QUEUE_FILE", DEFAULT_QUEUE_FILE)
+    return JobQueue(queue_db_path(queue_file), legacy_file=queue_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and manage the SRGAN job queue.")
+    parser.add_argument("command", choices=["status", "list", "import", "clear"])
+    parser.add_argument("path", nargs="?", help="JSONL file to import (default: SRGAN_QUEUE_FILE)")
+    args = parser.parse_args()
+
+    job_queue = open_queue()
+    print(f"Queue database: {job_queue.db_path}")
+
+    if args.command == "status":
+        counts = job_queue.counts()
+        for state in ("queued", "running", "done", "failed"):
+            print(f"  {state:8s} {counts.get(state, 0)}")
+    elif args.command == "list":
+        for job in job_queue.list_jobs():
+            worker = f" ({job['worker']})" if job["worker"] else ""
+            progress = f" {job['progress']:.0%}" if job["progress"] is not None else ""
+            print(f"  #{job['id']} [{job['state']}{progress}]{worker} {job['input']} -> {job['output']}")
+    elif args.command == "import":
+        imported = job_queue.import_jsonl(args.path or job_queue.legacy_file)
+        print(f"✓ Imported {imported} job(s)")
+    elif args.command == "clear":
+        job_queue.import_legacy()
+        removed = job_queue.clear()
+        print(f"✓ Removed {removed} queued job(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Segmented, resumable SRGAN upscaling
+
+Splits the video into frame ranges, upscales each range with its own
+decoder/encoder pair from your_model_file_ffmpeg, then stitches the
+upscaled segments back together with the concat demuxer. Audio and
+subtitle streams are copied once from the source at the end.
+
+Segments are planned from the source's frame timestamps (one demux-only
+pass, nothing is decoded or copied). Each segment decodes the source
+itself, seeking to the keyframe before its first frame and dropping the
+frames before it, so a boundary can be any frame: open GOPs (leading
+frames that reference the previous GOP) decode correctly and every frame
+is upscaled exactly once. Each segment is placed at its source start time
+when joining, so timestamp rounding and variable frame rates don't make
+the video drift against the audio.
+
+- Checkpoints (opt-in): with SRGAN_CHECKPOINT_SECONDS > 0, segments are
+  at most that long and a manifest records which frame ranges are
+  finished, so an interrupted job (container restart, crash, failure)
+  resumes at the first missing segment instead of frame 0.
+- Parallelism: with SRGAN_SEGMENTS=K (K > 1) up to K segments are
+  upscaled at once on threads sharing the worker's warm model, each
+  with 1/K of its CPU threads.
+
+Disk use: while a job runs, its work directory holds the upscaled
+segments finished so far, i.e. up to the size of the output. It is
+.srgan_job_<hash> next to the output (in the media library) unless
+SRGAN_SEGMENT_DIR points elsewhere, and it is removed when the job
+finishes; a failed job's directory is kept so the retry can resume.
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+from srgan_probe import probe_media
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 2
+
+
+_NO_PTS = -0x8000000000000000  # AV_NOPTS_VALUE in framecrc output
+
+
+def _frame_times(input_path):
+    """
+    Presentation times (seconds, ascending) of every frame of the first
+    video stream, and the time the last one ends. Read from the demuxer
+    only, on the same timeline ffmpeg's -ss seeks on.
+    """
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-i", input_path,
+        "-map", "0:v:0",
+        "-c", "copy",
+        "-f", "framecrc", "-",
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg frame listing failed:\n{result.stderr}")
+
+    time_base = 0.001
+    packets = []
+    for line in result.stdout.splitlines():
+        if line.startswith("#tb 0:"):
+            num, den = line.split(":", 1)[1].strip().split("/")
+            time_base = int(num) / int(den)
+        elif line and not line.startswith("#"):
+            # stream, dts, pts, duration, size, hash[, flags]
+            fields = line.split(",")
+            pts, duration = int(fields[2]), int(fields[3])
+            if pts != _NO_PTS:
+                packets.append((pts, duration))
+    packets.sort()
+    times = [pts * time_base for pts, _ in packets]
+    end = (packets[-1][0] + packets[-1][1]) * time_base if packets else 0.0
+    return times, end
+
+
+def _plan_segments(times, end, pieces, fps):
+    """
+    Split the frames at times into pieces ranges of (nearly) equal frame
+    count. Each segment records its first frame's index and seek time,
+    its length on the source timeline, and the frame rate that makes its
+    frames fill exactly that length: the nominal fps for constant frame
+    rate sources, the segment's average rate for variable ones.
+    """
+    count = len(times)
+    if count == 0:
+        return []
+    pieces = min(pieces, count)
+    bounds = [round(index * count / pieces) for index in range(pieces)] + [count]
+    segments = []
+    for index in range(pieces):
+        first, stop = bounds[index], bounds[index + 1]
+        frames = stop - first
+        start = times[first]
+        duration = (times[stop] if stop < count else max(end, times[-1])) - start
+        rate = fps
+        if duration > 0 and not (fps and abs(frames / fps - duration) < 1.0 / fps):
+            rate = frames / duration
+        segments.append({
+            "index": index,
+            "output": f"upscaled_{index:04d}.mkv",
+            "start_frame": first,
+            "frames": frames,
+            # Halfway back to the previous frame, so rounding can't drop
+            # this frame or pull in that one
+            "start_time": None if first == 0 else (times[first - 1] + start) / 2,
+            "duration": duration if duration > 0 else None,
+            "fps": rate,
+            "done": False,
+        })
+    return segments
+
+
+def _upscale_segment(input_path, output_path, entry, width, height, scale, media_info, model_cache=None,
+                     on_progress=None, cancel=None, cpu_share=1):
+    import your_model_file_ffmpeg
+    # Write under a temporary name so a crash never leaves a truncated
+    # segment that looks complete
+    partial_path = f"{os.path.splitext(output_path)[0]}.partial.mkv"
+    segment_info = dict(media_info, fps=entry["fps"] or media_info.get("fps"), frame_count=entry["frames"])
+    your_model_file_ffmpeg.upscale(
+        input_path, partial_path, width=width, height=height, scale=scale,
+        model_cache=model_cache, video_only=True, media_info=segment_info,
+        on_progress=on_progress, start_time=entry["start_time"], max_frames=entry["frames"],
+        cancel=cancel, cpu_share=cpu_share,
+    )
+    os.replace(partial_path, output_path)
+    return output_path
+
+
+def _concat(segments, source_path, output_path, work_dir):
+    """
+    Join upscaled segments and copy audio/subtitles from the source.
+    segments is a list of (path, duration): each segment starts where the
+    previous one's source duration ends, not where its frames happen to.
+    """
+    list_path = os.path.join(work_dir, "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as handle:
+        for path, duration in segments:
+            escaped = path.replace("'", "'\\''")
+            handle.write(f"file '{escaped}'\n")
+            if duration:
+                handle.write(f"duration {duration:.6f}\n")
+
+    cmd = [
+        "ffmpeg", "-v", "error", "-y",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-i", source_path,
+        "-map", "0:v:0",  # Upscaled video
+        "-map", "1:a?",   # Audio from source
+        "-map", "1:s?",   # Subtitles from source
+        "-c", "copy",
+        output_path,
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg concat failed:\n{result.stderr}")
+
+
+def checkpoint_dir_for(input_path, output_path, width=None, height=None, scale=2.0):
+    """
+    Work directory for one job's segments and manifest.
+
+    Derived from the job's parameters, so a restarted worker finds the
+    previous attempt's segments even if the queue entry was lost. It lives
+    in SRGAN_SEGMENT_DIR, or next to the output (see the module docstring
+    for how much space it takes).
+    """
+    key = "|".join(str(part) for part in (
+        os.path.abspath(input_path), os.path.abspath(output_path), width, height, scale,
+    ))
+    digest = hashlib.sha1(key.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+    work_root = os.environ.get("SRGAN_SEGMENT_DIR") or os.path.dirname(os.path.abspath(output_path))
+    return os.path.join(work_root, f".srgan_job_{digest}")
+
+
+def _source_identity(input_path, width, height, scale):
+    stat = os.stat(input_path)
+    return {
+        "input": os.path.abspath(input_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "width": width,
+        "height": height,
+        "scale": scale,
+    }
+
+
+def _load_manifest(work_dir, identity):
+    """The saved manifest if it belongs to this exact source and settings"""
+    try:
+        with open(os.path.join(work_dir, MANIFEST_NAME), "r", encoding="utf-8") as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("source") != identity:
+        return None
+    return manifest
+
+
+def _save_manifest(work_dir, manifest):
+    path = os.path.join(work_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=2)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+def _build_manifest(input_path, work_dir, pieces, fps, identity):
+    """Plan the segments' frame ranges and save them as a fresh manifest"""
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    times, end = _frame_times(input_path)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "source": identity,
+        "segments": _plan_segments(times, end, pieces, fps),
+    }
+    _save_manifest(work_dir, manifest)
+    return manifest
+
+
+def upscale(input_path, output_path, width=None, height=None, scale=2.0, segments=None,
+            media_info=None, model_cache=None, checkpoint_dir=None, on_checkpoint=None,
+            on_progress=None, cancel=None):
+    """
+    Upscale input_path into output_path in frame-exact segments.
+
+    Videos longer than SRGAN_CHECKPOINT_SECONDS are checkpointed. Each
+    segment's output is kept in checkpoint_dir (default
+    checkpoint_dir_for()) with a manifest of the completed frame ranges.
+    A rerun of the same job only upscales the missing segments. After
+    each segment, on_checkpoint(checkpoint_dir, done, total) is called so
+    the queue can record progress, and on_progress(frames, stage_fps) with
+    the job's total frames upscaled so far, counting segments finished by
+    an earlier attempt (stage rates are only reported for sequential
+    segments). With segments > 1 (SRGAN_SEGMENTS), that many segments
+    run in parallel with one shared model; the first failure cancels the
+    others. Setting cancel (a threading.Event) stops every segment, as in
+    your_model_file_ffmpeg.upscale().
+
+    Falls back to a single your_model_file_ffmpeg.upscale() call when the
+    video is too short to split. Segments share the source's dimensions,
+    so the source probe (media_info) is reused for every segment with
+    only the frame rate and count replaced.
+    """
+    import your_model_file_ffmpeg
+
+    if segments is None:
+        segments = int(os.environ.get("SRGAN_SEGMENTS", "0") or "0")
+    checkpoint_seconds = float(os.environ.get("SRGAN_CHECKPOINT_SECONDS", "0") or "0")
+
+    output_ext = os.path.splitext(output_path)[1].lower()
+    if output_ext not in [".mkv", ".mp4"]:
+        raise ValueError(f"Unsupported output format: {output_ext}. Only .mkv and .mp4 supported.")
+
+    if media_info is None:
+        media_info = probe_media(input_path)
+    duration = media_info.get("duration") if media_info else None
+    pieces = max(1, segments)
+    if checkpoint_seconds > 0 and duration:
+        pieces = max(pieces, math.ceil(duration / checkpoint_seconds))
+    if pieces <= 1 or not duration:
+        return your_model_file_ffmpeg.upscale(input_path, output_path, width, height, scale,
+                                              model_cache=model_cache, media_info=media_info,
+                                              on_progress=on_progress, cancel=cancel)
+
+    work_dir = checkpoint_dir or checkpoint_dir_for(input_path, output_path, width, height, scale)
+    identity = _source_identity(input_path, width, height, scale)
+    manifest = _load_manifest(work_dir, identity)
+    if manifest is None:
+        manifest = _build_manifest(input_path, work_dir, pieces, media_info.get("fps"), identity)
+        print(f"Split into {len(manifest['segments'])} segment(s)", file=sys.stderr)
+        if len(manifest["segments"]) <= 1:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return your_model_file_ffmpeg.upscale(input_path, output_path, width, height, scale,
+                                                  model_cache=model_cache, media_info=media_info,
+                                                  on_progress=on_progress, cancel=cancel)
+
+    entries = manifest["segments"]
+    total = len(entries)
+    pending = [
+        entry for entry in entries
+        if not (entry["done"] and os.path.exists(os.path.join(work_dir, entry["output"])))
+    ]
+    if len(pending) < total:
+        print(f"Resuming from checkpoint: {total - len(pending)}/{total} segment(s) already upscaled, "
+              f"continuing at frame {pending[0]['start_frame'] if pending else entries[-1]['start_frame']}",
+              file=sys.stderr)
+
+    def _completed(entry):
+        entry["done"] = True
+        _save_manifest(work_dir, manifest)
+        done = sum(1 for item in entries if item["done"])
+        print(f"✓ Segment {entry['index'] + 1}/{total} upscaled "
+              f"(frames {entry['start_frame']}-{entry['start_frame'] + entry['frames'] - 1}, "
+              f"{done}/{total} done)", file=sys.stderr)
+        if on_checkpoint is not None:
+            try:
+                on_checkpoint(work_dir, done, total)
+            except Exception as e:
+                print(f"Warning: Could not record checkpoint: {e}", file=sys.stderr)
+
+    def _output(entry):
+        return os.path.join(work_dir, entry["output"])
+
+    def _done_frames():
+        return sum(entry["frames"] for entry in entries if entry["done"])
+
+    try:
+        parallel = min(segments, len(pending))
+        if parallel > 1:
+            # Threads, not processes: every segment shares the one warm
+            # model (a single load, a single copy in VRAM) and only the
+            # ffmpeg decoder/encoder pairs run side by side
+            if model_cache is None:
+                from srgan_pipeline import _ModelCache
+                model_cache = _ModelCache()
+            stop = threading.Event()  # Set on the first failure or on cancel
+            frames_before = _done_frames()
+            written = {}  # Segment index -> frames written so far
+            written_lock = threading.Lock()
+
+            def _segment_progress(entry):
+                def _on_progress(frames, stage_fps=None):
+                    with written_lock:
+                        written[entry["index"]] = frames
+                return _on_progress
+
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=parallel, thread_name_prefix="srgan-segment"
+            ) as executor:
+                futures = {
+                    executor.submit(_upscale_segment, input_path, _output(entry), entry, width, height,
+                                    scale, media_info, model_cache, _segment_progress(entry), stop, parallel): entry
+                    for entry in pending
+                }
+                running = set(futures)
+                try:
+                    while running:
+                        finished, running = concurrent.futures.wait(
+                            running, timeout=1.0, return_when=concurrent.futures.FIRST_COMPLETED
+                        )
+                        for future in finished:
+                            future.result()
+                            _completed(futures[future])
+                        if cancel is not None and cancel.is_set():
+                            raise your_model_file_ffmpeg.UpscaleCancelled("Segmented upscaling cancelled")
+                        if on_progress is not None:
+                            with written_lock:
+                                in_flight = sum(written.values())
+                            on_progress(frames_before + in_flight)
+                except BaseException:
+                    # Stop the other segments now instead of letting them
+                    # run to the end: queued ones never start, running ones
+                    # kill their ffmpeg processes after the current batch
+                    stop.set()
+                    for future in running:
+                        future.cancel()
+                    raise
+        else:
+            # One segment at a time, reusing the warm model
+            for entry in pending:
+                segment_progress = None
+                if on_progress is not None:
+                    frames_before = _done_frames()
+                    segment_progress = (
+                        lambda frames, stage_fps=None, base=frames_before: on_progress(base + frames, stage_fps)
+                    )
+                _upscale_segment(input_path, _output(entry), entry, width, height, scale, media_info,
+                                 model_cache, segment_progress, cancel)
+                _completed(entry)
+
+        print("Joining segments...", file=sys.stderr)
+        _concat([(_output(entry), entry["duration"]) for entry in entries], input_path, output_path, work_dir)
+    except BaseException:
+        done = sum(1 for entry in entries if entry["done"])
+        print(f"Checkpoint kept at {work_dir} ({done}/{total} segments done)", file=sys.stderr)
+        raise
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"✓ Segmented upscaling complete: {output_path}", file=sys.stderr)
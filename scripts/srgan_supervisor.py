@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Starts the upscaler container only when no pipeline worker is running
+
+The watchdog used to run `docker compose up -d srgan-upscaler` inside the
+webhook handler for every queued item. UpscalerSupervisor.ensure_running()
+returns immediately instead:
+
+- "running":  a worker heartbeat is fresh (srgan_queue.live_workers), the
+              doorbell already woke it, nothing to do
+- "starting": a start is in flight or was issued within the debounce
+              window (SRGAN_START_DEBOUNCE_SECONDS), the container is
+              still booting
+- "started":  no worker and no recent start, the start command was
+              launched on a background thread
+
+The outcome of the last start is kept for /status (status()).
+"""
+
+import logging
+import subprocess
+import threading
+import time
+
+from srgan_queue import live_workers
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_START_COMMAND = ("docker", "compose", "up", "-d", "srgan-upscaler")
+DEFAULT_DEBOUNCE_SECONDS = 30
+DEFAULT_START_TIMEOUT = 120
+
+
+class UpscalerSupervisor:
+    """Debounced, asynchronous start of the upscaler when it is down."""
+
+    def __init__(self, queue_file, command=DEFAULT_START_COMMAND,
+                 debounce=DEFAULT_DEBOUNCE_SECONDS, timeout=DEFAULT_START_TIMEOUT):
+        self.queue_file = queue_file
+        self.command = list(command)
+        self.debounce = debounce
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._starting = False
+        self._last_start = None
+        self._last_result = None
+
+    def workers(self):
+        return live_workers(self.queue_file)
+
+    def ensure_running(self):
+        """Start the upscaler in the background unless it is up or starting."""
+        if self.workers():
+            return "running"
+        with self._lock:
+            if self._starting:
+                return "starting"
+            if self._last_start is not None and time.monotonic() - self._last_start < self.debounce:
+                return "starting"
+            self._starting = True
+            self._last_start = time.monotonic()
+        threading.Thread(target=self._start, name="upscaler-start", daemon=True).start()
+        return "started"
+
+    def _start(self):
+        logger.info("No live pipeline worker, starting srgan-upscaler container...")
+        try:
+            result = subprocess.run(self.command, capture_output=True, text=True, timeout=self.timeout)
+            if result.returncode == 0:
+                logger.info("✓ Container started successfully")
+                outcome = {"ok": True}
+            else:
+                logger.error(f"Docker compose error: {result.stderr}")
+                outcome = {"ok": False, "error": result.stderr.strip()}
+        except subprocess.TimeoutExpired:
+            logger.error("Docker compose command timed out")
+            outcome = {"ok": False, "error": "timeout"}
+        except FileNotFoundError:
+            logger.error(f"ERROR: '{self.command[0]}' command not found")
+            outcome = {"ok": False, "error": f"{self.command[0]} not found"}
+        outcome["at"] = time.time()
+        with self._lock:
+            self._last_result = outcome
+            self._starting = False
+            if not outcome["ok"]:
+                # Don't debounce the retry after a failed start
+                self._last_start = None
+
+    def status(self):
+        workers = self.workers()
+        with self._lock:
+            return {
+                "workers": workers,
+                "running": bool(workers),
+                "starting": self._starting,
+                "last_start": self._last_result,
+            }
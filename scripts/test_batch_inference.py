@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test batched inference and its out-of-memory fallback
+(your_model_file_ffmpeg._BatchInferencer)
+"""
+
+import os
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from your_model_file_ffmpeg import _BatchInferencer
+
+
+class _SmallMemoryModel(torch.nn.Module):
+    """Doubles its input, but runs out of memory above max_batch frames"""
+
+    def __init__(self, max_batch, error=None):
+        super().__init__()
+        self.max_batch = max_batch
+        self.error = error or RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB")
+        self.batches = []
+
+    def forward(self, x):
+        self.batches.append(x.shape[0])
+        if x.shape[0] > self.max_batch:
+            raise self.error
+        return x * 2
+
+
+def test_oom_halves_the_batch_and_keeps_the_smaller_size():
+    model = _SmallMemoryModel(max_batch=2)
+    inferencer = _BatchInferencer(model, batch_size=8, device="cpu", use_fp16=False)
+    frames = torch.rand(8, 3, 4, 4)
+
+    assert torch.equal(inferencer(frames), frames * 2)
+    assert inferencer.batch_size == 2
+    # 8 -> 4 -> 2, then the rest of the frames at the size that fit
+    assert model.batches == [8, 4, 2, 2, 2, 2]
+
+    model.batches.clear()
+    inferencer(frames[:4])
+    assert model.batches == [2, 2]
+
+
+def test_other_errors_are_not_retried():
+    model = _SmallMemoryModel(max_batch=0, error=ValueError("bad input"))
+    inferencer = _BatchInferencer(model, batch_size=4, device="cpu", use_fp16=False)
+    try:
+        inferencer(torch.rand(4, 3, 4, 4))
+        raise AssertionError("the error should propagate")
+    except ValueError:
+        pass
+    assert model.batches == [4]
+    assert inferencer.batch_size == 4
+
+
+def test_oom_on_a_single_frame_propagates():
+    model = _SmallMemoryModel(max_batch=0, error=MemoryError())
+    inferencer = _BatchInferencer(model, batch_size=2, device="cpu", use_fp16=False)
+    try:
+        inferencer(torch.rand(2, 3, 4, 4))
+        raise AssertionError("a single frame that doesn't fit should fail the job")
+    except MemoryError:
+        pass
+    assert model.batches == [2, 1]
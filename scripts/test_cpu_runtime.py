@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test the CPU threading and memory-format settings for the generator
+(srgan_inference.cpu_thread_allotment, configure_runtime, to_channels_last)
+"""
+
+import copy
+import os
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import srgan_inference
+
+_NAMES = ("SRGAN_CPU_THREADS", "SRGAN_CPU_SHARE", "SRGAN_INTEROP_THREADS")
+
+
+def _with_env(test):
+    """Run test with a clean threading environment and restore it afterwards"""
+    def wrapper():
+        saved = {name: os.environ.pop(name, None) for name in _NAMES}
+        threads = torch.get_num_threads()
+        cgroup_limit = srgan_inference._cgroup_cpu_limit
+        try:
+            test()
+        finally:
+            srgan_inference._cgroup_cpu_limit = cgroup_limit
+            torch.set_num_threads(threads)
+            for name, value in saved.items():
+                os.environ.pop(name, None)
+                if value is not None:
+                    os.environ[name] = value
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+
+@_with_env
+def test_threads_are_divided_between_processes():
+    os.environ["SRGAN_CPU_THREADS"] = "8"
+    assert srgan_inference.cpu_thread_allotment() == 8
+    os.environ["SRGAN_CPU_SHARE"] = "3"
+    assert srgan_inference.cpu_thread_allotment() == 2
+    # More processes than threads still leaves each one thread
+    os.environ["SRGAN_CPU_SHARE"] = "16"
+    assert srgan_inference.cpu_thread_allotment() == 1
+
+
+@_with_env
+def test_allotment_respects_affinity_and_cgroup_quota():
+    cores = len(os.sched_getaffinity(0))
+    srgan_inference._cgroup_cpu_limit = lambda: None
+    assert srgan_inference.cpu_thread_allotment() == cores
+    # A container quota below the visible cores wins
+    srgan_inference._cgroup_cpu_limit = lambda: 1
+    assert srgan_inference.cpu_thread_allotment() == 1
+
+
+@_with_env
+def test_configure_runtime_applies_the_allotment():
+    os.environ["SRGAN_CPU_THREADS"] = "2"
+    settings = srgan_inference.configure_runtime("cpu")
+    assert torch.get_num_threads() == 2
+    assert settings["intra_op_threads"] == 2 and settings["cpu_share"] == 1
+
+
+@_with_env
+def test_parallel_segments_split_the_allotment():
+    os.environ["SRGAN_CPU_THREADS"] = "8"
+    os.environ["SRGAN_CPU_SHARE"] = "2"
+    settings = srgan_inference.configure_runtime("cpu", cpu_share=2)
+    assert torch.get_num_threads() == 2
+    assert settings["cpu_share"] == 4
+    srgan_inference.configure_runtime("cpu", cpu_share=16)
+    assert torch.get_num_threads() == 1
+
+
+def test_channels_last_only_converts_eager_modules():
+    model = torch.nn.Sequential(torch.nn.Conv2d(3, 8, 3), torch.nn.ReLU())
+    original = copy.deepcopy(model)
+    converted = srgan_inference.to_channels_last(model)
+    assert converted[0].weight.is_contiguous(memory_format=torch.channels_last)
+    assert not original[0].weight.is_contiguous(memory_format=torch.channels_last)
+    frames = torch.rand(1, 3, 8, 8)
+    with torch.no_grad():
+        assert torch.allclose(converted(frames), original(frames), atol=1e-6)
+
+    scripted = torch.jit.script(torch.nn.Conv2d(3, 8, 3))
+    assert srgan_inference.to_channels_last(scripted) is scripted
+    other = object()  # e.g. an ONNX Runtime session wrapper
+    assert srgan_inference.to_channels_last(other) is other
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test the separable Gaussian denoiser (srgan_inference.GaussianDenoiser)
+against the per-channel 2D filter it replaced
+"""
+
+import os
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from srgan_inference import GaussianDenoiser
+
+
+def _reference_denoise(tensor, strength):
+    """The original _denoise_tensor: a full 2D kernel, one channel at a time"""
+    if strength <= 0:
+        return tensor
+    kernel_size = max(3, int(strength * 7) | 1)
+    sigma = strength * 2.0
+    x = torch.arange(kernel_size, dtype=torch.float32) - (kernel_size - 1) / 2
+    gauss_1d = torch.exp(-x ** 2 / (2 * sigma ** 2))
+    gauss_1d = gauss_1d / gauss_1d.sum()
+    kernel_2d = (gauss_1d.view(-1, 1) @ gauss_1d.view(1, -1)).view(1, 1, kernel_size, kernel_size)
+    pad = kernel_size // 2
+    denoised = torch.cat([
+        torch.nn.functional.conv2d(
+            torch.nn.functional.pad(tensor[:, c:c + 1], (pad, pad, pad, pad), mode="reflect"), kernel_2d
+        )
+        for c in range(tensor.shape[1])
+    ], dim=1)
+    alpha = min(1.0, strength)
+    return tensor * (1 - alpha) + denoised * alpha
+
+
+def test_matches_the_original_filter():
+    torch.manual_seed(0)
+    frames = torch.rand(2, 3, 17, 23)
+    for strength in (0.1, 0.5, 0.8, 1.0, 1.5):
+        original = frames.clone()
+        denoised = GaussianDenoiser(strength)(frames)
+        assert torch.equal(frames, original), "the input must not be modified"
+        assert (denoised - _reference_denoise(frames, strength)).abs().max() < 1e-5, strength
+
+
+def test_folded_normalization_matches():
+    # Raw 0-255 frames with the /255 folded into the filter, as _FrameConverter does
+    torch.manual_seed(0)
+    frames = torch.randint(0, 256, (1, 3, 16, 16)).float()
+    denoised = GaussianDenoiser(0.5)(frames, scale=1.0 / 255.0)
+    assert (denoised - _reference_denoise(frames / 255.0, 0.5)).abs().max() < 1e-5
+
+
+def test_zero_strength_only_scales():
+    frames = torch.rand(1, 3, 8, 8)
+    denoiser = GaussianDenoiser(0.0)
+    assert denoiser(frames) is frames
+    assert torch.allclose(denoiser(frames * 255.0, scale=1.0 / 255.0), frames)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Test the decode/encode threads and frame buffers of the FFmpeg backend
+(your_model_file_ffmpeg._FrameReaderThread, _FrameWriterThread,
+_StderrCollector, _FramePool and _FrameConverter) with in-memory pipes
+instead of ffmpeg
+"""
+
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from your_model_file_ffmpeg import (
+    _FrameConverter,
+    _FramePool,
+    _FrameReaderThread,
+    _FrameWriterThread,
+    _StderrCollector,
+)
+
+SHAPE = (2, 2, 3)
+FRAME_BYTES = 12
+
+
+class _FailingReader(io.RawIOBase):
+    """Yields one frame, then fails like a decoder pipe that went away"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        self.calls += 1
+        if self.calls > 1:
+            raise OSError("Input/output error")
+        buffer[:FRAME_BYTES] = bytes(range(FRAME_BYTES))
+        return FRAME_BYTES
+
+
+class _BrokenPipe(io.RawIOBase):
+    def __init__(self, fail_after):
+        self.fail_after = fail_after
+        self.written = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if len(self.written) >= self.fail_after:
+            raise BrokenPipeError("Broken pipe")
+        self.written.append(bytes(data))
+        return len(data)
+
+
+def test_reader_stops_at_end_of_video():
+    # Two whole frames, then a truncated one, which is dropped
+    data = bytes(range(FRAME_BYTES)) * 2 + b"\x01\x02"
+    pool = _FramePool(SHAPE, 4)
+    reader = _FrameReaderThread(io.BytesIO(data), pool, queue_size=2)
+    try:
+        frames = []
+        while (index := reader.read()) is not None:
+            frames.append(pool.arrays[index].tobytes())
+            pool.release(index)
+        assert frames == [bytes(range(FRAME_BYTES))] * 2
+        assert reader.clock.frames == 2
+    finally:
+        reader.close()
+
+
+def test_reader_error_reaches_the_consumer():
+    pool = _FramePool(SHAPE, 4)
+    reader = _FrameReaderThread(_FailingReader(), pool, queue_size=2)
+    try:
+        index = reader.read()
+        assert pool.arrays[index].tobytes() == bytes(range(FRAME_BYTES))
+        try:
+            reader.read()
+            raise AssertionError("a failed decoder pipe must not look like the end of the video")
+        except RuntimeError as e:
+            assert "Input/output error" in str(e)
+    finally:
+        reader.close()
+
+
+def test_writer_error_is_raised_without_blocking_the_producer():
+    pool = _FramePool(SHAPE, 2)
+    stream = _BrokenPipe(fail_after=1)
+    writer = _FrameWriterThread(stream, pool, queue_size=1)
+    index = pool.acquire()
+
+    # Far more frames than the queue holds: after the pipe breaks the
+    # writer keeps draining, so write() fails instead of hanging
+    raised = None
+    for _ in range(50):
+        try:
+            writer.write(index)
+        except BrokenPipeError as e:
+            raised = e
+            break
+    assert raised is not None
+    assert len(stream.written) == 1
+    try:
+        writer.close()
+        raise AssertionError("close() should report the broken pipe")
+    except BrokenPipeError:
+        pass
+    # Every reference the writer took was dropped again
+    assert pool.refs[index] == 1
+
+
+def test_stderr_collector_drains_a_chatty_process():
+    # Much more than a pipe buffer holds: without a reader the child blocks
+    script = "import sys\nfor i in range(20000): print('frame', i, 'x' * 40, file=sys.stderr)"
+    proc = subprocess.Popen([sys.executable, "-c", script], stderr=subprocess.PIPE)
+    collector = _StderrCollector(proc.stderr, max_lines=3)
+    finished = threading.Event()
+    threading.Thread(target=lambda: (proc.wait(), finished.set()), daemon=True).start()
+    try:
+        assert finished.wait(30), "the child blocked on a full stderr pipe"
+    finally:
+        proc.kill()
+        proc.wait()
+    lines = collector.text().splitlines()
+    assert len(lines) == 3
+    assert lines[-1].startswith("frame 19999 ")
+
+
+def test_reader_fills_pool_buffers_and_waits_for_free_ones():
+    frames = [bytes([value]) * FRAME_BYTES for value in range(6)]
+    pool = _FramePool(SHAPE, 2)
+    buffers = {array.ctypes.data for array in pool.arrays}
+    reader = _FrameReaderThread(io.BytesIO(b"".join(frames)), pool, queue_size=4)
+    try:
+        first = reader.read()
+        second = reader.read()
+        # Both buffers are held, so the decoder can't run further ahead
+        time.sleep(0.2)
+        assert reader.queue.empty() and pool.free == []
+
+        received = [pool.arrays[first].tobytes(), pool.arrays[second].tobytes()]
+        pool.release(first)
+        pool.release(second)
+        while (index := reader.read()) is not None:
+            # Frames land in the preallocated buffers, not new arrays
+            assert pool.arrays[index].ctypes.data in buffers
+            received.append(pool.arrays[index].tobytes())
+            pool.release(index)
+        assert received == frames
+    finally:
+        reader.close()
+
+
+def test_converter_round_trip_reuses_its_buffers():
+    torch.manual_seed(0)
+    source = _FramePool(SHAPE, 2)
+    target = _FramePool(SHAPE, 2)
+    for tensor in source.tensors:
+        tensor.copy_(torch.randint(0, 256, SHAPE, dtype=torch.uint8))
+    converter = _FrameConverter(2, 2, 2, "cpu")
+
+    batch = converter.load(source, [0, 1])
+    assert batch.shape == (2, 3, 2, 2)
+    assert batch.data_ptr() == converter.batch.data_ptr()
+    indexes = converter.store(batch.clone(), target)
+    for source_index, target_index in zip([0, 1], indexes):
+        assert torch.equal(target.tensors[target_index], source.tensors[source_index])
+
+    # The next batch is converted into the same float buffer
+    assert converter.load(source, [1]).data_ptr() == converter.batch.data_ptr()
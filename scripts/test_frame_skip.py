@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test duplicate frame detection in the FFmpeg backend
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from your_model_file_ffmpeg import _DuplicateFrameDetector
+
+
+def test_identical_frames_are_skipped():
+    detector = _DuplicateFrameDetector(threshold=0)
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    assert not detector.is_duplicate(frame)
+    assert detector.is_duplicate(frame.copy())
+    assert not detector.is_duplicate(frame + 1)
+    assert (detector.frames, detector.skipped) == (3, 1)
+
+
+def test_small_changed_region_is_not_skipped():
+    # A 100x100 patch changed by 100 levels on a 1080p frame: a mean
+    # difference of about 0.48, but a subtitle or a cursor, not a repeat
+    detector = _DuplicateFrameDetector(threshold=8)
+    frame = np.full((1080, 1920, 3), 16, dtype=np.uint8)
+    assert not detector.is_duplicate(frame)
+    changed = frame.copy()
+    changed[900:1000, 900:1000] += 100
+    assert not detector.is_duplicate(changed)
+
+    # Decoder noise within the threshold everywhere still counts as a repeat
+    noisy = changed.copy()
+    noisy[::2, ::2] += 3
+    assert detector.is_duplicate(noisy)
+    assert detector.skipped == 1
+
+
+def test_default_threshold_is_exact():
+    detector = _DuplicateFrameDetector()
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    detector.is_duplicate(frame)
+    nudged = frame.copy()
+    nudged[0, 0, 0] = 1
+    assert not detector.is_duplicate(nudged)
+
+
+def test_slow_fade_does_not_drift():
+    detector = _DuplicateFrameDetector(threshold=1.0)
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    results = [detector.is_duplicate(frame + step) for step in range(4)]
+    # Each step is within the threshold of the previous frame, but step 2 is
+    # too far from the last upscaled frame (step 0) to reuse its output
+    assert results == [False, True, False, True]
+
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Test the Jellyfin session client and WebSocket listener (srgan_jellyfin.py)
+against local stand-ins for the /Sessions and /socket endpoints
+"""
+
+import base64
+import hashlib
+import json
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import srgan_jellyfin
+from srgan_jellyfin import JellyfinSessionClient, JellyfinSessionListener
+
+SESSIONS = [{"Id": "abc", "NowPlayingItem": {"Path": "/media/movie.mkv"}}]
+
+
+class _FakeJellyfin(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append((self.path, self.headers.get("X-Emby-Token")))
+        time.sleep(0.2)  # Slow enough for concurrent callers to overlap
+        body = json.dumps(SESSIONS).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve():
+    _FakeJellyfin.requests_seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeJellyfin)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_concurrent_callers_share_one_request():
+    server, url = _serve()
+    try:
+        client = JellyfinSessionClient(url, "secret", ttl=60, active_within=600)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(client.sessions())) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == [SESSIONS] * 10
+        assert len(_FakeJellyfin.requests_seen) == 1, _FakeJellyfin.requests_seen
+        path, token = _FakeJellyfin.requests_seen[0]
+        assert path == "/Sessions?activeWithinSeconds=600" and token == "secret"
+
+        # Served from the cache until it expires
+        assert client.sessions() == SESSIONS
+        assert len(_FakeJellyfin.requests_seen) == 1
+        client.invalidate()
+        client.sessions()
+        assert len(_FakeJellyfin.requests_seen) == 2
+        client.close()
+    finally:
+        server.shutdown()
+
+
+def test_failures_are_not_cached():
+    client = JellyfinSessionClient("http://127.0.0.1:9", "secret", ttl=60, timeout=1)
+    assert client.sessions() is None
+    assert client.sessions() is None
+    assert client.upstream_calls == 2
+    client.close()
+
+
+def test_watchdog_builds_one_client_under_burst():
+    watchdog_api = pytest.importorskip("watchdog_api")
+
+    built = []
+
+    class _SlowClient:
+        def __init__(self, *args, **kwargs):
+            built.append(self)
+            time.sleep(0.1)  # Wide window for racing first requests
+
+        def sessions(self):
+            return SESSIONS
+
+    saved = (watchdog_api.JellyfinSessionClient, watchdog_api._session_client,
+             watchdog_api.JELLYFIN_API_KEY)
+    watchdog_api.JellyfinSessionClient = _SlowClient
+    watchdog_api._session_client = None
+    watchdog_api.JELLYFIN_API_KEY = "secret"
+    try:
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(watchdog_api.get_jellyfin_sessions()))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == [SESSIONS] * 20
+        assert len(built) == 1, built
+    finally:
+        (watchdog_api.JellyfinSessionClient, watchdog_api._session_client,
+         watchdog_api.JELLYFIN_API_KEY) = saved
+
+
+class _FakeJellyfinSocket:
+    """Minimal WebSocket server: one client, unfragmented text frames."""
+
+    def __init__(self):
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{self.server.getsockname()[1]}"
+        self.received = queue.Queue()
+        self.request_line = None
+        self.conn = None
+        self.accepted = threading.Event()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        self.conn, _ = self.server.accept()
+        request = b""
+        while b"\r\n\r\n" not in request:
+            request += self.conn.recv(4096)
+        lines = request.decode().split("\r\n")
+        self.request_line = lines[0]
+        key = next(line.split(":", 1)[1].strip() for line in lines if line.lower().startswith("sec-websocket-key"))
+        accept = base64.b64encode(hashlib.sha1((key + "258EAFA5-E914-47DA-95CA-C5AB0DC85B11").encode()).digest())
+        self.conn.sendall(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        self.accepted.set()
+        try:
+            while True:
+                header = self._read(2)
+                length = header[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack(">H", self._read(2))[0]
+                elif length == 127:
+                    length = struct.unpack(">Q", self._read(8))[0]
+                mask = self._read(4)
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self._read(length)))
+                if header[0] & 0x0F == 0x1:
+                    self.received.put(json.loads(payload))
+        except OSError:
+            return  # Closed by either side
+
+    def _read(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionResetError("Client closed the connection")
+            data += chunk
+        return data
+
+    def push(self, message_type, data):
+        payload = json.dumps({"MessageType": message_type, "Data": data}).encode()
+        header = bytes([0x81]) + (bytes([len(payload)]) if len(payload) < 126 else
+                                  bytes([126]) + struct.pack(">H", len(payload)))
+        self.conn.sendall(header + payload)
+
+    def expect(self, message_type, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                message = self.received.get(timeout=deadline - time.time())
+            except queue.Empty:
+                break
+            if message["MessageType"] == message_type:
+                return message
+        raise AssertionError(f"Client never sent {message_type}")
+
+    def close(self):
+        for sock in (self.conn, self.server):
+            try:
+                sock.close()
+            except (OSError, AttributeError):
+                pass
+
+
+def _session(item_id, paused=False):
+    return {
+        "Id": "session-1",
+        "UserName": "alice",
+        "Client": "Web",
+        "PlayState": {"IsPaused": paused},
+        "NowPlayingItem": {"Id": item_id, "Name": f"Movie {item_id}", "Path": f"/media/{item_id}.mkv"},
+    }
+
+
+def test_listener_queues_from_pushed_events():
+    if srgan_jellyfin.websocket is None:
+        pytest.skip("websocket-client not installed")
+
+    server = _FakeJellyfinSocket()
+    started = queue.Queue()
+    listener = JellyfinSessionListener(server.url, "secret", on_playing=started.put, reconnect_delay=60)
+    try:
+        assert listener.start()
+        assert server.accepted.wait(5) and listener.wait_connected(5)
+        assert server.request_line.startswith("GET /socket?api_key=secret&deviceId=")
+        assert server.expect("SessionsStart")["Data"] == "0,1500"
+
+        server.push("ForceKeepAlive", 2)
+        server.expect("KeepAlive")
+
+        # New playback is reported once, repeats of the same state are not
+        server.push("Sessions", [_session("a")])
+        assert started.get(timeout=5)["path"] == "/media/a.mkv"
+        server.push("Sessions", [_session("a")])
+        server.push("Sessions", [_session("a", paused=True)])
+        deadline = time.time() + 5
+        while listener.playing() and time.time() < deadline:
+            time.sleep(0.05)
+        assert listener.playing() == [] and started.empty()
+
+        # Resuming or switching items is reported again
+        server.push("Sessions", [_session("b")])
+        item = started.get(timeout=5)
+        assert item["item_id"] == "b" and item["user"] == "alice"
+        assert [i["path"] for i in listener.playing()] == ["/media/b.mkv"]
+
+        # Dropping the connection clears the index
+        server.close()
+        deadline = time.time() + 5
+        while listener.connected and time.time() < deadline:
+            time.sleep(0.05)
+        assert not listener.connected and listener.playing() == []
+    finally:
+        listener.stop()
+        server.close()
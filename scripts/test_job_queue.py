@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Test the SQLite job queue (srgan_queue.py)
+"""
+
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import srgan_queue
+from srgan_queue import JobQueue
+
+
+def _claim_all(db_path, results):
+    job_queue = JobQueue(db_path)
+    while True:
+        job = job_queue.claim()
+        if job is None:
+            return
+        results.put(job.id)
+        job_queue.ack(job.id)
+
+
+def test_fifo_claim_and_ack():
+    with tempfile.TemporaryDirectory() as tmp:
+        job_queue = JobQueue(os.path.join(tmp, "queue.db"))
+        first = job_queue.enqueue({"input": "/media/a.mkv", "output": "/media/a_upscaled.mkv"})
+        second = job_queue.enqueue({"input": "/media/b.mkv", "output": "/media/b_upscaled.mkv"})
+
+        job = job_queue.claim()
+        assert job.id == first
+        assert job.payload["input"] == "/media/a.mkv"
+        job_queue.ack(job.id)
+
+        job = job_queue.claim()
+        assert job.id == second
+        job_queue.fail(job.id, "boom")
+
+        assert job_queue.claim() is None
+        assert job_queue.counts() == {"done": 1, "failed": 1}
+
+
+def test_legacy_jsonl_import():
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, "queue.jsonl")
+        with open(legacy, "w", encoding="utf-8") as handle:
+            handle.write(json.dumps({"input": "/media/a.mkv", "output": "/media/a_up.mkv"}) + "\n")
+            handle.write("not json\n")
+            handle.write(json.dumps({"input": "/media/b.mkv"}) + "\n")
+            handle.write(json.dumps({"input": "/media/c.mkv", "output": "/media/c_up.mkv"}) + "\n")
+
+        job_queue = JobQueue(os.path.join(tmp, "queue.db"), legacy_file=legacy)
+        assert job_queue.claim().input == "/media/a.mkv"
+        assert job_queue.claim().input == "/media/c.mkv"
+        assert job_queue.claim() is None
+        assert os.path.getsize(legacy) == 0
+
+
+def test_concurrent_consumers_claim_each_job_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "queue.db")
+        job_queue = JobQueue(db_path)
+        ids = [
+            job_queue.enqueue({"input": f"/media/{i}.mkv", "output": f"/media/{i}_up.mkv"})
+            for i in range(200)
+        ]
+
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_claim_all, args=(db_path, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(60)
+
+        claimed = [results.get(timeout=5) for _ in range(len(ids))]
+        assert sorted(claimed) == ids
+        assert results.empty()
+
+
+def test_expired_lease_is_reclaimed():
+    with tempfile.TemporaryDirectory() as tmp:
+        job_queue = JobQueue(os.path.join(tmp, "queue.db"))
+        job_id = job_queue.enqueue({"input": "/media/a.mkv", "output": "/media/a_up.mkv"})
+
+        assert job_queue.claim("worker-a", lease_seconds=0.2).id == job_id
+        assert job_queue.claim("worker-b", lease_seconds=0.2) is None
+        time.sleep(0.3)
+
+        # worker-a's lease expired, so worker-b takes over and worker-a can't finish it
+        assert job_queue.claim("worker-b", lease_seconds=60).id == job_id
+        assert not job_queue.heartbeat(job_id, "worker-a", 60)
+        job_queue.ack(job_id, worker="worker-a")
+        assert job_queue.counts() == {"running": 1}
+        job_queue.ack(job_id, worker="worker-b")
+        assert job_queue.counts() == {"done": 1}
+
+
+def test_checkpoint_survives_reclaim():
+    with tempfile.TemporaryDirectory() as tmp:
+        job_queue = JobQueue(os.path.join(tmp, "queue.db"))
+        job_id = job_queue.enqueue({"input": "/media/a.mkv", "output": "/media/a_up.mkv"})
+
+        assert job_queue.claim("worker-a", lease_seconds=0.2).checkpoint is None
+        assert job_queue.save_checkpoint(job_id, "worker-a", "/media/.srgan_job_x", 0.4)
+        assert not job_queue.save_checkpoint(job_id, "worker-b", "/elsewhere", 0.9)
+        time.sleep(0.3)
+
+        # The next worker gets the previous attempt's checkpoint back
+        job = job_queue.claim("worker-b", lease_seconds=60)
+        assert job.checkpoint == "/media/.srgan_job_x"
+        assert job_queue.list_jobs()[0]["progress"] == 0.4
+
+
+def test_media_index_prevents_double_upscale():
+    with tempfile.TemporaryDirectory() as tmp:
+        job_queue = JobQueue(os.path.join(tmp, "queue.db"))
+        movie = os.path.join(tmp, "Movie (2020).mkv")
+        renamed = os.path.join(tmp, "Movie (2020) [2160p].mkv")
+        with open(movie, "wb") as handle:
+            handle.write(b"x" * 100)
+        job = {"input": movie, "output": os.path.join(tmp, "Movie (2020)_upscaled.mkv")}
+
+        assert job_queue.lookup_media(movie) is None
+        first = job_queue.enqueue(job)
+        duplicate = job_queue.enqueue(dict(job))
+        assert job_queue.lookup_media(movie)["job_id"] == first
+
+        # The duplicate is skipped while the first one runs
+        assert job_queue.claim("worker-a").id == first
+        assert job_queue.lookup_media(movie)["state"] == "running"
+        assert job_queue.claim("worker-b") is None
+        assert job_queue.counts() == {"running": 1, "done": 1}
+
+        # Done, under the pipeline's renamed output
+        with open(renamed, "wb") as handle:
+            handle.write(b"y")
+        job_queue.ack(first, worker="worker-a", output=renamed)
+        entry = job_queue.lookup_media(movie)
+        assert entry["state"] == "done" and entry["output"] == renamed
+        assert entry["job_id"] != duplicate
+        job_queue.enqueue(dict(job))
+        assert job_queue.claim("worker-b") is None
+
+        # Deleting the output, or replacing the input, allows a new upscale
+        os.remove(renamed)
+        assert job_queue.lookup_media(movie) is None
+        with open(renamed, "wb") as handle:
+            handle.write(b"y")
+        assert job_queue.lookup_media(movie)["state"] == "done"
+        os.utime(movie, ns=(0, 0))
+        assert job_queue.lookup_media(movie) is None
+
+
+def test_failed_media_can_be_retried_later():
+    with tempfile.TemporaryDirectory() as tmp:
+        job_queue = JobQueue(os.path.join(tmp, "queue.db"))
+        movie = os.path.join(tmp, "a.mkv")
+        open(movie, "wb").close()
+        job_id = job_queue.enqueue({"input": movie, "output": movie + ".up.mkv"})
+        job_queue.claim("worker-a")
+
+        os.environ["SRGAN_DEDUPE_RETRY_SECONDS"] = "0.2"
+        try:
+            job_queue.fail(job_id, "boom", worker="worker-a")
+        finally:
+            os.environ.pop("SRGAN_DEDUPE_RETRY_SECONDS")
+        assert job_queue.lookup_media(movie)["state"] == "failed"
+        time.sleep(0.3)
+        assert job_queue.lookup_media(movie) is None
+
+
+def test_media_stats_run_outside_write_transactions():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "queue.db")
+        job_queue = JobQueue(db_path)
+        movie = os.path.join(tmp, "a.mkv")
+        open(movie, "wb").close()
+
+        # A stat on a slow mount must not hold the database write lock:
+        # another connection can start a write while it runs
+        locked = []
+        media_key = srgan_queue.media_key
+
+        def checking_media_key(path):
+            other = sqlite3.connect(db_path, timeout=0, isolation_level=None)
+            try:
+                other.execute("BEGIN IMMEDIATE")
+                other.execute("ROLLBACK")
+            except sqlite3.OperationalError:
+                locked.append(path)
+            finally:
+                other.close()
+            return media_key(path)
+
+        srgan_queue.media_key = checking_media_key
+        try:
+            first = job_queue.enqueue_unique({"input": movie, "output": movie + ".up.mkv"})[0]
+            job_queue.enqueue({"input": movie, "output": movie + ".up.mkv"})
+            assert job_queue.claim("worker-a").id == first
+            assert job_queue.claim("worker-b") is None  # The duplicate is skipped
+        finally:
+            srgan_queue.media_key = media_key
+        assert locked == [], locked
+        assert job_queue.lookup_media(movie)["state"] == "running"
+
+
+def test_lost_lease_sets_cancel():
+    with tempfile.TemporaryDirectory() as tmp:
+        job_queue = JobQueue(os.path.join(tmp, "queue.db"))
+        job_id = job_queue.enqueue({"input": "/media/a.mkv", "output": "/media/a_up.mkv"})
+        job_queue.claim("worker-a", lease_seconds=0.2)
+
+        with srgan_queue.LeaseHeartbeat(job_queue, job_id, "worker-a", lease_seconds=0.2) as lease:
+            time.sleep(0.3)
+            assert job_queue.claim("worker-b", lease_seconds=60).id == job_id
+            # The next renewal (once a second at the shortest) notices
+            assert lease.cancel.wait(5)
+        assert lease.lost
+
+
+def test_worker_drops_job_after_losing_its_lease():
+    import srgan_pipeline
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue_file = os.path.join(tmp, "queue.jsonl")
+        settings = {
+            "SRGAN_QUEUE_FILE": queue_file,
+            "SRGAN_PROGRESS_DIR": os.path.join(tmp, "progress"),
+            "SRGAN_JOB_LEASE_SECONDS": "0.3",
+            "SRGAN_WAIT_SECONDS": "1",
+            "SRGAN_WARM_MODEL": "0",
+        }
+        saved_env = {name: os.environ.get(name) for name in settings}
+        os.environ.update(settings)
+        job_queue = srgan_queue.open_queue(queue_file)
+        job_id = job_queue.enqueue({"input": "/media/a.mkv", "output": "/media/a_up.mkv"})
+
+        calls = []
+
+        def stalled_process_job(*args, cancel=None, **kwargs):
+            # Stall past the lease; another worker takes the job over
+            time.sleep(0.5)
+            assert job_queue.claim("worker-b", lease_seconds=60).id == job_id
+            calls.append(cancel.wait(5))
+            raise RuntimeError("Upscaling cancelled")
+
+        process_job = srgan_pipeline._process_job
+        srgan_pipeline._process_job = stalled_process_job
+        try:
+            args = types.SimpleNamespace(width=None, height=None, scale=2.0)
+            try:
+                srgan_pipeline._worker_loop(args)
+                raise AssertionError("the worker should have timed out waiting")
+            except SystemExit as e:
+                assert e.code == 2
+        finally:
+            srgan_pipeline._process_job = process_job
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+        # Cancelled, and neither acked nor failed: worker-b still owns it
+        assert calls == [True]
+        assert job_queue.counts() == {"running": 1}
+        job_queue.ack(job_id, worker="worker-b")
+        assert job_queue.counts() == {"done": 1}
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Test how the generator is loaded: the cached TorchScript export
+(srgan_inference.load_compiled_model) and its SRGAN_COMPILED_MODEL modes,
+the SRGAN_BACKEND choice in your_model_file_ffmpeg._prepare_model and the
+SRGAN_QUANTIZE modes
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import srgan_inference
+import your_model_file_ffmpeg
+from your_model_file_ffmpeg import _BatchInferencer, _SRGANGenerator
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None  # The ONNX Runtime backend is optional
+
+
+def _small_generator():
+    torch.manual_seed(0)
+    return _SRGANGenerator(scale=2, num_blocks=1, channels=8).eval()
+
+
+class _Env:
+    """Set environment variables for a with block, restoring them afterwards"""
+
+    def __init__(self, **values):
+        self.values = values
+        self.saved = {}
+
+    def __enter__(self):
+        for name, value in self.values.items():
+            self.saved[name] = os.environ.get(name)
+            os.environ[name] = value
+        return self
+
+    def __exit__(self, *exc):
+        for name, value in self.saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        return False
+
+
+def _weights(tmp, model):
+    path = os.path.join(tmp, "generator.pth")
+    torch.save(model.state_dict(), path)
+    return path
+
+
+def test_compiled_model_modes():
+    with tempfile.TemporaryDirectory() as tmp:
+        eager = _small_generator()
+        weights = _weights(tmp, eager)
+        builds = []
+
+        def build():
+            builds.append(1)
+            return _small_generator()
+
+        # auto: only an existing export is used, none is built
+        with _Env(SRGAN_COMPILED_MODEL="auto"):
+            assert srgan_inference.load_compiled_model(weights, 2, "cpu", build=build) is None
+        assert builds == []
+
+        # build: exported once, then reused
+        with _Env(SRGAN_COMPILED_MODEL="build"):
+            compiled = srgan_inference.load_compiled_model(weights, 2, "cpu", build=build)
+            assert srgan_inference.load_compiled_model(weights, 2, "cpu", build=build) is not None
+        assert builds == [1]
+        assert isinstance(compiled, torch.jit.ScriptModule)
+        path = srgan_inference.compiled_model_path(weights, 2, "cpu")
+        assert os.path.exists(path) and ".x2.cpu.torch" in path
+        frames = torch.rand(1, 3, 12, 16)
+        with torch.no_grad():
+            assert torch.allclose(compiled(frames), eager(frames), atol=1e-4)
+
+        # 0: always the eager model, even with an export on disk
+        with _Env(SRGAN_COMPILED_MODEL="0"):
+            assert srgan_inference.load_compiled_model(weights, 2, "cpu", build=build) is None
+
+        # New weights make the export stale
+        os.utime(path, (0, 0))
+        with _Env(SRGAN_COMPILED_MODEL="auto"):
+            assert srgan_inference.load_compiled_model(weights, 2, "cpu", build=build) is None
+
+
+def test_failed_export_falls_back_to_eager():
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = _weights(tmp, _small_generator())
+
+        def build():
+            raise RuntimeError("trace failed")
+
+        with _Env(SRGAN_COMPILED_MODEL="build"):
+            assert srgan_inference.load_compiled_model(weights, 2, "cpu", build=build) is None
+        assert not os.path.exists(srgan_inference.compiled_model_path(weights, 2, "cpu"))
+
+
+class _Loaders:
+    """Replace _prepare_model's loaders with stand-ins that record their calls"""
+
+    def __init__(self, onnx_model=None):
+        self.onnx_model = onnx_model
+        self.calls = []
+
+    def load_onnx_model(self, model_path, scale, device, build=None, quantized=False):
+        self.calls.append(("onnx", device, quantized, build is not None))
+        return self.onnx_model
+
+    def load_model(self, model_path, device, scale):
+        self.calls.append(("torch", device))
+        return torch.nn.Conv2d(3, 3, 3)
+
+    def __enter__(self):
+        self.saved = your_model_file_ffmpeg.load_onnx_model, your_model_file_ffmpeg._load_model
+        your_model_file_ffmpeg.load_onnx_model = self.load_onnx_model
+        your_model_file_ffmpeg._load_model = self.load_model
+        return self
+
+    def __exit__(self, *exc):
+        your_model_file_ffmpeg.load_onnx_model, your_model_file_ffmpeg._load_model = self.saved
+        return False
+
+
+def test_backend_selection():
+    onnx_model = object()
+    with _Env(SRGAN_BACKEND="onnxruntime"), _Loaders(onnx_model) as loaders:
+        assert your_model_file_ffmpeg._prepare_model("/models/g.pth", "cpu", 2, False) is onnx_model
+        assert loaders.calls == [("onnx", "cpu", False, True)]
+
+    # Unusable ONNX Runtime (missing, CUDA device, failed export): torch
+    with _Env(SRGAN_BACKEND="onnxruntime", SRGAN_CHANNELS_LAST="1"), _Loaders(None) as loaders:
+        model = your_model_file_ffmpeg._prepare_model("/models/g.pth", "cpu", 2, False)
+        assert loaders.calls == [("onnx", "cpu", False, True), ("torch", "cpu")]
+        assert model.weight.is_contiguous(memory_format=torch.channels_last)
+
+    with _Env(SRGAN_BACKEND="tensorrt"), _Loaders(onnx_model) as loaders:
+        your_model_file_ffmpeg._prepare_model("/models/g.pth", "cpu", 2, False)
+        assert loaders.calls == [("torch", "cpu")]
+
+    assert srgan_inference.load_onnx_model("/models/g.pth", 2, "cuda") is None
+
+
+def test_onnxruntime_matches_torch():
+    if onnxruntime is None:
+        pytest.skip("onnxruntime not installed")
+    with tempfile.TemporaryDirectory() as tmp:
+        eager = _small_generator()
+        weights = _weights(tmp, eager)
+        model = srgan_inference.load_onnx_model(weights, 2, "cpu", build=_small_generator)
+        assert isinstance(model, srgan_inference.OnnxRuntimeGenerator)
+        assert os.path.exists(srgan_inference.onnx_model_path(weights, 2))
+
+        # Dynamic axes: any batch and frame size
+        frames = torch.rand(2, 3, 10, 14)
+        with torch.no_grad():
+            assert torch.allclose(model(frames), eager(frames), atol=1e-4)
+
+
+def test_quantize_mode():
+    for value, device, mode in [
+        ("off", "cpu", "off"), ("", "cpu", "off"), ("fp32", "cpu", "off"),
+        ("INT8", "cpu", "int8"), ("bf16", "cpu", "bf16"),
+        ("int4", "cpu", "off"),        # Unknown
+        ("int8", "cuda:0", "off"),     # CUDA uses SRGAN_FP16 instead
+    ]:
+        with _Env(SRGAN_QUANTIZE=value):
+            assert srgan_inference.cpu_quantize_mode(device) == mode, (value, device)
+
+
+def test_int8_uses_the_calibrated_model_only():
+    quantized = object()
+    with _Env(SRGAN_BACKEND="torch"), _Loaders(quantized) as loaders:
+        assert your_model_file_ffmpeg._prepare_model("/models/g.pth", "cpu", 2, False, "int8") is quantized
+        assert loaders.calls == [("onnx", "cpu", True, False)]
+
+    # Not calibrated yet: fp32 on the configured backend
+    with _Env(SRGAN_BACKEND="torch"), _Loaders(None) as loaders:
+        your_model_file_ffmpeg._prepare_model("/models/g.pth", "cpu", 2, False, "int8")
+        assert loaders.calls == [("onnx", "cpu", True, False), ("torch", "cpu")]
+
+
+def test_int8_model_is_not_built_while_loading():
+    if onnxruntime is None:
+        pytest.skip("onnxruntime not installed")
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = _weights(tmp, _small_generator())
+        # Calibration needs sample frames, so a missing int8 model is never built here
+        assert srgan_inference.load_onnx_model(weights, 2, "cpu", quantized=True) is None
+        assert not os.path.exists(srgan_inference.onnx_model_path(weights, 2, "int8"))
+
+
+def test_bf16_autocast_stays_close_to_fp32():
+    model = _small_generator()
+    frames = torch.rand(2, 3, 12, 12)
+    fp32 = _BatchInferencer(model, 2, "cpu", use_fp16=False)(frames)
+    bf16 = _BatchInferencer(model, 2, "cpu", use_fp16=False, use_bf16=True)(frames)
+    assert bf16.dtype == torch.float32
+    assert (bf16 - fp32).abs().max() < 0.01
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test the pipeline worker's warm model cache (srgan_pipeline._ModelCache)
+and the settings that key it (srgan_inference.model_cache_key)
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from srgan_pipeline import _ModelCache
+from srgan_inference import model_cache_key
+
+
+def test_cache_hits_and_misses():
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "model.pth")
+        other_weights = os.path.join(tmp, "other.pth")
+        for path in (weights, other_weights):
+            open(path, "wb").close()
+
+        loads = []
+
+        def loader(name):
+            def load():
+                loads.append(name)
+                return object()
+            return load
+
+        cache = _ModelCache()
+        first = cache.get(weights, ("cpu", 4), loader("cpu"))
+        assert cache.get(weights, ("cpu", 4), loader("cpu")) is first
+        assert loads == ["cpu"]
+
+        # Another key for the same weights is a separate entry...
+        half = cache.get(weights, ("cpu", 2), loader("cpu-2x"))
+        assert half is not first
+        assert cache.get(weights, ("cpu", 4), loader("cpu")) is first
+        assert loads == ["cpu", "cpu-2x"]
+
+        # ...other weights replace them all
+        cache.get(other_weights, ("cpu", 4), loader("other"))
+        cache.get(weights, ("cpu", 4), loader("cpu"))
+        assert loads == ["cpu", "cpu-2x", "other", "cpu"]
+
+        # Rewriting the weights file reloads
+        os.utime(weights, ns=(0, 0))
+        cache.get(weights, ("cpu", 4), loader("cpu"))
+        assert loads[-1] == "cpu" and len(loads) == 5
+
+
+def test_key_covers_model_settings():
+    names = ("SRGAN_BACKEND", "SRGAN_CHANNELS_LAST", "SRGAN_COMPILED_MODEL", "SRGAN_MODEL_FORMAT")
+    saved = {name: os.environ.pop(name, None) for name in names}
+    try:
+        base = model_cache_key("cpu", 4, False, "off")
+        assert model_cache_key("cpu", 4, False, "off") == base
+        assert model_cache_key("cpu", 4, False, "int8") != base
+
+        changed = {
+            "SRGAN_BACKEND": "onnxruntime",
+            "SRGAN_CHANNELS_LAST": "0",
+            "SRGAN_COMPILED_MODEL": "0",
+            "SRGAN_MODEL_FORMAT": "pth",
+        }
+        for name, value in changed.items():
+            os.environ[name] = value
+            try:
+                assert model_cache_key("cpu", 4, False, "off") != base, name
+            finally:
+                del os.environ[name]
+
+        # Spelling variants of one setting share an entry
+        os.environ["SRGAN_BACKEND"] = "ONNXRuntime"
+        upper = model_cache_key("cpu", 4, False, "off")
+        os.environ["SRGAN_BACKEND"] = "onnxruntime"
+        assert model_cache_key("cpu", 4, False, "off") == upper
+        del os.environ["SRGAN_BACKEND"]
+    finally:
+        for name, value in saved.items():
+            if value is not None:
+                os.environ[name] = value
+
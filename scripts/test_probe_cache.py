@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test the cached media probe (srgan_probe.py)
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import srgan_probe
+
+FAKE_PROBE = {
+    "streams": [
+        {"index": 0, "codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080,
+         "r_frame_rate": "24000/1001", "color_transfer": "smpte2084", "nb_frames": "240"},
+        {"index": 1, "codec_type": "audio", "codec_name": "aac", "tags": {"language": "eng"}},
+    ],
+    "format": {"duration": "10.01", "format_name": "matroska,webm"},
+}
+
+
+def test_probe_is_cached_until_file_changes():
+    calls = []
+
+    def fake_run(path, timeout):
+        calls.append(path)
+        return FAKE_PROBE
+
+    original = srgan_probe._run_ffprobe
+    srgan_probe._run_ffprobe = fake_run
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ["SRGAN_PROBE_CACHE_DIR"] = os.path.join(tmp, "probe")
+            media = os.path.join(tmp, "movie.mkv")
+            with open(media, "wb") as handle:
+                handle.write(b"x" * 10)
+
+            info = srgan_probe.probe_media(media)
+            assert (info["width"], info["height"], info["is_hdr"]) == (1920, 1080, True)
+            assert round(info["fps"], 3) == 23.976
+            assert info["frame_count"] == 240
+            assert info["streams"][1]["language"] == "eng"
+
+            # Disk cache survives a new process (simulated by clearing memory)
+            srgan_probe._memory_cache.clear()
+            assert srgan_probe.probe_media(media) == info
+            assert len(calls) == 1
+
+            with open(media, "ab") as handle:
+                handle.write(b"more")
+            srgan_probe.probe_media(media)
+            assert len(calls) == 2
+    finally:
+        srgan_probe._run_ffprobe = original
+        os.environ.pop("SRGAN_PROBE_CACHE_DIR", None)
+        srgan_probe._memory_cache.clear()
+
+
+def test_cache_from_older_versions_is_reprobed():
+    calls = []
+
+    def fake_run(path, timeout):
+        calls.append(path)
+        probe = json.loads(json.dumps(FAKE_PROBE))
+        probe["streams"][0]["color_range"] = "pc"
+        return probe
+
+    original = srgan_probe._run_ffprobe
+    srgan_probe._run_ffprobe = fake_run
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_dir = os.path.join(tmp, "probe")
+            os.environ["SRGAN_PROBE_CACHE_DIR"] = cache_dir
+            media = os.path.join(tmp, "movie.mkv")
+            with open(media, "wb") as handle:
+                handle.write(b"x" * 10)
+            stat = os.stat(media)
+
+            # Written before color_range was probed: no version field
+            os.makedirs(cache_dir)
+            with open(srgan_probe._cache_file(cache_dir, media), "w") as handle:
+                json.dump({"path": media, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                           "info": {"width": 1920, "height": 1080}}, handle)
+
+            assert srgan_probe.probe_media(media)["color_range"] == "pc"
+            assert len(calls) == 1
+    finally:
+        srgan_probe._run_ffprobe = original
+        os.environ.pop("SRGAN_PROBE_CACHE_DIR", None)
+        srgan_probe._memory_cache.clear()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test job progress publishing (srgan_progress.py) and the watchdog's
+/progress endpoints
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import srgan_progress
+from srgan_progress import ProgressReporter, list_progress, read_progress
+
+
+def test_reporter_publishes_progress():
+    with tempfile.TemporaryDirectory() as tmp:
+        reporter = ProgressReporter("/media/Movie (2020).mkv", "/media/out.mkv", job_id=3,
+                                    directory=tmp, interval=0)
+        reporter.queued()
+        assert read_progress("Movie (2020).mkv", tmp)["status"] == "queued"
+
+        reporter.start(total_frames=200, fps=25.0)
+        reporter.update(0)
+        reporter._sample = (reporter._sample[0] - 2.0, 0)  # 2 seconds ago
+        reporter.update(100)
+        data = read_progress("/other/dir/Movie (2020).mkv", tmp)
+        assert data["status"] == "processing" and data["stage"] == "upscaling"
+        assert data["progress"] == 50.0
+        assert 49 < data["fps"] < 51 and 1.9 < data["processing_rate"] < 2.1
+        assert 1.9 < data["eta_seconds"] < 2.1
+        assert not data["stale"]
+        assert [job["job_id"] for job in list_progress(tmp)] == [3]
+
+        reporter.complete("/media/Movie (2020) [1080p].mkv")
+        assert read_progress("Movie (2020).mkv", tmp)["progress"] == 100.0
+        assert list_progress(tmp) == []
+        assert len(list_progress(tmp, active_only=False)) == 1
+
+
+def test_progress_endpoints():
+    watchdog_api = pytest.importorskip("watchdog_api")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SRGAN_PROGRESS_DIR"] = tmp
+        try:
+            client = watchdog_api.app.test_client()
+            assert client.get("/progress/missing.mkv").status_code == 404
+
+            reporter = ProgressReporter("/media/tv/Show S01E01.mkv", job_id=9, interval=0)
+            reporter.start(total_frames=1000, fps=24.0)
+            reporter.update(250)
+
+            response = client.get("/progress/Show S01E01.mkv")
+            assert response.status_code == 200
+            assert response.get_json()["progress"] == 25.0
+            assert client.get("/progress").get_json()["count"] == 1
+        finally:
+            os.environ.pop("SRGAN_PROGRESS_DIR", None)
+
+
+def test_cancelled_job_is_no_longer_active():
+    import srgan_pipeline
+    import your_model_file_ffmpeg
+
+    cancel = threading.Event()
+
+    def cancelled_upscale(input_path, output_path, width=None, height=None, scale=2.0, cancel=None):
+        # The job's lease was lost mid-upscale
+        cancel.set()
+        raise your_model_file_ffmpeg.UpscaleCancelled("Upscaling cancelled")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "a.mkv")
+        with open(input_path, "wb") as handle:
+            handle.write(b"\0" * 16)
+        reporter = ProgressReporter(input_path, job_id=4, directory=tmp, interval=0)
+        upscale = your_model_file_ffmpeg.upscale
+        your_model_file_ffmpeg.upscale = cancelled_upscale
+        try:
+            with pytest.raises(your_model_file_ffmpeg.UpscaleCancelled):
+                srgan_pipeline._try_model(input_path, os.path.join(tmp, "a_up.mkv"), None, None, 2.0,
+                                          progress=reporter, cancel=cancel)
+        finally:
+            your_model_file_ffmpeg.upscale = upscale
+        assert read_progress("a.mkv", tmp)["status"] == "cancelled"
+        assert list_progress(tmp) == []
+
+
+def test_stale_job_is_flagged():
+    with tempfile.TemporaryDirectory() as tmp:
+        reporter = ProgressReporter("/media/a.mkv", directory=tmp, interval=0)
+        reporter.start(total_frames=10)
+        data = read_progress("a.mkv", tmp)
+        assert not data["stale"]
+        later = data["updated_at"] + srgan_progress.STALE_SECONDS + 1
+        assert srgan_progress._with_staleness(data, later)["stale"]
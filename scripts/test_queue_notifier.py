@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test the idle worker wakeups (srgan_queue.QueueNotifier and ring_doorbell)
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import srgan_queue
+from srgan_queue import JobQueue, QueueNotifier, ring_doorbell
+
+
+def _timed_wait(notifier, timeout):
+    start = time.monotonic()
+    notifier.wait(timeout)
+    return time.monotonic() - start
+
+
+def _later(delay, action):
+    timer = threading.Timer(delay, action)
+    timer.start()
+    return timer
+
+
+def test_enqueue_wakes_a_waiting_worker():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue_file = os.path.join(tmp, "queue.jsonl")
+        job_queue = JobQueue(srgan_queue.queue_db_path(queue_file), legacy_file=queue_file)
+        notifier = QueueNotifier(job_queue, name="worker-a")
+        try:
+            assert notifier.active
+            # Another process adding a job changes the database file
+            producer = JobQueue(job_queue.db_path)
+            _later(0.2, lambda: producer.enqueue({"input": "/media/a.mkv", "output": "/media/a_up.mkv"}))
+            assert _timed_wait(notifier, 10) < 5
+            assert job_queue.claim("worker-a") is not None
+        finally:
+            notifier.close()
+
+
+def test_doorbell_wakes_and_unrelated_files_do_not():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue_file = os.path.join(tmp, "queue.jsonl")
+        job_queue = JobQueue(srgan_queue.queue_db_path(queue_file), legacy_file=queue_file)
+        notifier = QueueNotifier(job_queue, name="worker-a")
+        try:
+            assert os.path.exists(notifier.doorbell_path)
+
+            def write_other_file():
+                with open(os.path.join(tmp, "unrelated.log"), "a") as handle:
+                    handle.write("noise\n")
+
+            _later(0.1, write_other_file)
+            assert _timed_wait(notifier, 0.6) >= 0.5
+
+            _later(0.1, lambda: ring_doorbell(queue_file))
+            assert _timed_wait(notifier, 10) < 5
+        finally:
+            notifier.close()
+        assert not os.path.exists(notifier.doorbell_path)
+
+
+def test_ring_doorbell_removes_dead_workers_sockets():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue_file = os.path.join(tmp, "queue.jsonl")
+        directory = srgan_queue.doorbell_dir(queue_file)
+        os.makedirs(directory)
+        # Bound, then closed without removing the file: a crashed worker
+        stale = os.path.join(directory, "crashed.sock")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(stale)
+        sock.close()
+
+        ring_doorbell(queue_file)
+        assert not os.path.exists(stale)
+
+
+def test_wait_sleeps_without_wakeup_sources():
+    with tempfile.TemporaryDirectory() as tmp:
+        job_queue = JobQueue(os.path.join(tmp, "queue.db"), legacy_file=os.path.join(tmp, "queue.jsonl"))
+        notifier = QueueNotifier(job_queue, name="worker-a")
+        notifier.close()
+        assert not notifier.active
+        assert _timed_wait(notifier, 0.3) >= 0.25
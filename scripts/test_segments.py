@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Test segment planning, the checkpoint manifest and resuming in
+srgan_segments.py (ffmpeg and the model are replaced by stand-ins)
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import srgan_segments
+from your_model_file_ffmpeg import UpscaleCancelled
+
+
+def _vfr_times():
+    # 60 frames at 30 fps, then 60 at 15 fps
+    times = [index / 30 for index in range(60)] + [2.0 + index / 15 for index in range(60)]
+    return times, 2.0 + 60 / 15
+
+
+def test_plan_is_frame_exact():
+    times, end = _vfr_times()
+    segments = srgan_segments._plan_segments(times, end, 3, 30.0)
+
+    assert [s["start_frame"] for s in segments] == [0, 40, 80]
+    assert [s["frames"] for s in segments] == [40, 40, 40]
+    # Seek halfway between the last frame of one segment and the first of the next
+    assert segments[0]["start_time"] is None
+    assert abs(segments[1]["start_time"] - (39 / 30 + 40 / 30) / 2) < 1e-9
+    # Durations follow the source timeline and add up to it
+    assert abs(sum(s["duration"] for s in segments) - end) < 1e-9
+    assert abs(segments[1]["duration"] - (times[80] - times[40])) < 1e-9
+    # Constant-rate stretches keep the nominal rate, the others are re-timed
+    assert segments[0]["fps"] == 30.0
+    assert abs(segments[2]["fps"] - 15.0) < 1e-9
+    assert abs(segments[1]["fps"] - 40 / segments[1]["duration"]) < 1e-9
+
+    assert len(srgan_segments._plan_segments(times[:2], 0.1, 5, 30.0)) == 2
+    assert srgan_segments._plan_segments([], 0.0, 3, 30.0) == []
+
+
+def test_manifest_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "movie.mkv")
+        with open(source, "wb") as handle:
+            handle.write(b"x" * 100)
+        identity = srgan_segments._source_identity(source, None, None, 2.0)
+        times, end = _vfr_times()
+        manifest = {
+            "version": srgan_segments.MANIFEST_VERSION,
+            "source": identity,
+            "segments": srgan_segments._plan_segments(times, end, 3, 30.0),
+        }
+        srgan_segments._save_manifest(tmp, manifest)
+        assert srgan_segments._load_manifest(tmp, identity) == manifest
+
+        # Other settings, a changed source or an unreadable file start over
+        assert srgan_segments._load_manifest(tmp, dict(identity, scale=4.0)) is None
+        with open(source, "ab") as handle:
+            handle.write(b"y")
+        assert srgan_segments._load_manifest(
+            tmp, srgan_segments._source_identity(source, None, None, 2.0)) is None
+        with open(os.path.join(tmp, srgan_segments.MANIFEST_NAME), "w") as handle:
+            handle.write("{truncated")
+        assert srgan_segments._load_manifest(tmp, identity) is None
+
+
+def test_resume_from_first_missing_segment():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "movie.mkv")
+        with open(source, "wb") as handle:
+            handle.write(b"x" * 100)
+        output = os.path.join(tmp, "movie_upscaled.mkv")
+        work_dir = os.path.join(tmp, "work")
+        times = [index / 24 for index in range(96)]
+        media_info = {"width": 64, "height": 48, "fps": 24.0, "duration": 4.0}
+
+        upscaled = []
+        joined = []
+        fail_at = [2]
+
+        def fake_upscale_segment(input_path, output_path, entry, *args):
+            assert input_path == source  # Segments decode the source itself
+            if entry["index"] == fail_at[0]:
+                raise RuntimeError("worker killed")
+            upscaled.append((entry["index"], entry["start_frame"], entry["start_time"]))
+            with open(output_path, "wb") as handle:
+                handle.write(b"segment")
+            return output_path
+
+        saved = (srgan_segments._frame_times, srgan_segments._upscale_segment, srgan_segments._concat,
+                 os.environ.get("SRGAN_CHECKPOINT_SECONDS"))
+        srgan_segments._frame_times = lambda path: (times, 4.0)
+        srgan_segments._upscale_segment = fake_upscale_segment
+        srgan_segments._concat = lambda segments, *args: joined.append(segments)
+        os.environ["SRGAN_CHECKPOINT_SECONDS"] = "1"
+        try:
+            try:
+                srgan_segments.upscale(source, output, scale=2.0, segments=0, media_info=media_info,
+                                       checkpoint_dir=work_dir)
+                raise AssertionError("the failed segment should have stopped the job")
+            except RuntimeError:
+                pass
+            with open(os.path.join(work_dir, srgan_segments.MANIFEST_NAME)) as handle:
+                manifest = json.load(handle)
+            assert [s["done"] for s in manifest["segments"]] == [True, True, False, False]
+            assert [index for index, _, _ in upscaled] == [0, 1]
+
+            # The rerun starts at the first missing segment, frame 48
+            upscaled.clear()
+            fail_at[0] = None
+            srgan_segments.upscale(source, output, scale=2.0, segments=0, media_info=media_info,
+                                   checkpoint_dir=work_dir)
+            assert [index for index, _, _ in upscaled] == [2, 3]
+            assert upscaled[0][1] == 48 and abs(upscaled[0][2] - (47 + 48) / 2 / 24) < 1e-9
+            assert len(joined) == 1 and len(joined[0]) == 4
+            assert abs(sum(duration for _, duration in joined[0]) - 4.0) < 1e-9
+            assert not os.path.exists(work_dir)
+        finally:
+            (srgan_segments._frame_times, srgan_segments._upscale_segment, srgan_segments._concat,
+             checkpoint_seconds) = saved
+            if checkpoint_seconds is None:
+                os.environ.pop("SRGAN_CHECKPOINT_SECONDS", None)
+            else:
+                os.environ["SRGAN_CHECKPOINT_SECONDS"] = checkpoint_seconds
+
+
+def test_parallel_segments_share_the_model_and_stop_on_failure():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "movie.mkv")
+        with open(source, "wb") as handle:
+            handle.write(b"x" * 100)
+        output = os.path.join(tmp, "movie_upscaled.mkv")
+        times = [index / 24 for index in range(96)]
+        media_info = {"width": 64, "height": 48, "fps": 24.0, "duration": 4.0}
+
+        caches = []
+        shares = []
+        started = []
+        cancelled = []
+        first_running = threading.Event()
+
+        def fake_upscale_segment(input_path, output_path, entry, width, height, scale, media_info,
+                                 model_cache=None, on_progress=None, cancel=None, cpu_share=1):
+            caches.append(model_cache)
+            shares.append(cpu_share)
+            started.append(entry["index"])
+            if entry["index"] == 0:
+                first_running.set()
+                # Runs until the failure elsewhere cancels it
+                assert cancel.wait(10), "the failure did not cancel the running segment"
+                cancelled.append(entry["index"])
+                raise UpscaleCancelled("cancelled")
+            first_running.wait(10)
+            raise RuntimeError("segment failed")
+
+        saved = srgan_segments._frame_times, srgan_segments._upscale_segment
+        srgan_segments._frame_times = lambda path: (times, 4.0)
+        srgan_segments._upscale_segment = fake_upscale_segment
+        try:
+            try:
+                srgan_segments.upscale(source, output, scale=2.0, segments=2, media_info=media_info)
+                raise AssertionError("the failed segment should have stopped the job")
+            except RuntimeError as e:
+                assert str(e) == "segment failed"
+        finally:
+            srgan_segments._frame_times, srgan_segments._upscale_segment = saved
+
+        # Two of the four segments ran, on one shared model; the others never started
+        assert sorted(started) == [0, 1]
+        assert cancelled == [0]
+        assert caches[0] is not None and caches[0] is caches[1]
+        # ...and each with half of the worker's inference threads
+        assert shares == [2, 2]
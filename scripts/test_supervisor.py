@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test worker heartbeats (srgan_queue.WorkerHeartbeat) and the watchdog's
+debounced, asynchronous upscaler start (srgan_supervisor.py)
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from srgan_queue import WorkerHeartbeat, live_workers
+from srgan_supervisor import UpscalerSupervisor
+
+
+def _start_command(log_path, seconds=0.5):
+    """Stand-in for `docker compose up -d`: slow, and logs every call."""
+    return [sys.executable, "-c",
+            f"import time; open({log_path!r}, 'a').write('start\\n'); time.sleep({seconds})"]
+
+
+def _starts(log_path):
+    try:
+        with open(log_path) as handle:
+            return len(handle.readlines())
+    except OSError:
+        return 0
+
+
+def test_heartbeat_marks_worker_alive():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue_file = os.path.join(tmp, "queue.jsonl")
+        assert live_workers(queue_file) == []
+
+        heartbeat = WorkerHeartbeat(queue_file, name="host-1", interval=60)
+        heartbeat.set_job(5)
+        workers = live_workers(queue_file)
+        assert [(w["worker"], w["job_id"]) for w in workers] == [("host-1", 5)]
+
+        # A worker that stopped beating goes stale
+        assert live_workers(queue_file, max_age=-1) == []
+        heartbeat.close()
+        assert live_workers(queue_file) == []
+
+
+def test_concurrent_triggers_start_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue_file = os.path.join(tmp, "queue.jsonl")
+        log_path = os.path.join(tmp, "starts.log")
+        supervisor = UpscalerSupervisor(queue_file, command=_start_command(log_path), debounce=60)
+
+        results = []
+        began = time.time()
+        threads = [threading.Thread(target=lambda: results.append(supervisor.ensure_running()))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert time.time() - began < 0.4, "ensure_running() waited for the start command"
+        assert sorted(results) == ["started"] + ["starting"] * 19
+
+        deadline = time.time() + 10
+        while supervisor.status()["starting"] and time.time() < deadline:
+            time.sleep(0.05)
+        assert supervisor.status()["last_start"]["ok"]
+        assert _starts(log_path) == 1
+
+        # Still inside the debounce window: no second start
+        assert supervisor.ensure_running() == "starting"
+        assert _starts(log_path) == 1
+
+        # A live worker means nothing to start at all
+        heartbeat = WorkerHeartbeat(queue_file, name="host-1", interval=60)
+        try:
+            supervisor.debounce = 0
+            assert supervisor.ensure_running() == "running"
+        finally:
+            heartbeat.close()
+
+
+def test_failed_start_is_retried():
+    with tempfile.TemporaryDirectory() as tmp:
+        supervisor = UpscalerSupervisor(os.path.join(tmp, "queue.jsonl"),
+                                        command=["/nonexistent/docker"], debounce=60)
+        assert supervisor.ensure_running() == "started"
+        deadline = time.time() + 10
+        while supervisor.status()["last_start"] is None and time.time() < deadline:
+            time.sleep(0.05)
+        assert not supervisor.status()["last_start"]["ok"]
+        assert supervisor.ensure_running() == "started"
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test tiled inference with feathered seams (srgan_inference.tiled_forward)
+"""
+
+import os
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from srgan_inference import tiled_forward
+
+
+class _RecordingModel:
+    """2x upscaler; records the input shape of every call"""
+
+    def __init__(self, model):
+        self.model = model
+        self.shapes = []
+
+    def __call__(self, x):
+        self.shapes.append(tuple(x.shape))
+        return self.model(x)
+
+
+def _pointwise(x):
+    return torch.nn.functional.interpolate(x * 0.5 + 0.25, scale_factor=2, mode="nearest")
+
+
+def _blur(x):
+    # 3x3 neighbourhood: tiles see different pixels than the whole frame
+    # within one pixel of their edges
+    kernel = torch.full((x.shape[1], 1, 3, 3), 1 / 9)
+    blurred = torch.nn.functional.conv2d(torch.nn.functional.pad(x, (1, 1, 1, 1), mode="replicate"),
+                                         kernel, groups=x.shape[1])
+    return torch.nn.functional.interpolate(blurred, scale_factor=2, mode="nearest")
+
+
+def test_tiles_match_the_whole_frame():
+    torch.manual_seed(0)
+    frames = torch.rand(2, 3, 37, 50)  # Sizes that aren't a multiple of the tile
+    model = _RecordingModel(_pointwise)
+
+    tiled = tiled_forward(model, frames, tile_size=16, overlap=4, tile_batch=3)
+
+    assert tiled.shape == (2, 3, 74, 100)
+    assert torch.allclose(tiled, _pointwise(frames), atol=1e-6)
+    # Only tile-sized inputs reach the model, at most tile_batch tiles at a time
+    assert all(shape[2:] == (16, 16) for shape in model.shapes)
+    assert max(shape[0] for shape in model.shapes) == 2 * 3
+    # 3 tile rows x 4 tile columns
+    assert sum(shape[0] for shape in model.shapes) == 2 * 12
+
+
+def test_seams_are_blended():
+    torch.manual_seed(0)
+    frames = torch.nn.functional.interpolate(torch.rand(1, 3, 8, 8), size=(64, 64), mode="bilinear")
+    full = _blur(frames)
+
+    tiled = tiled_forward(_blur, frames, tile_size=24, overlap=8)
+    unblended = tiled_forward(_blur, frames, tile_size=24, overlap=0)
+
+    # The feathered overlap hides the tiles' edge effects better than
+    # butting the tiles together
+    assert not torch.isnan(tiled).any()
+    assert (tiled - full).abs().max() < (unblended - full).abs().max()
+    assert (tiled - full).abs().max() < 0.01
+
+
+def test_small_frames_skip_tiling():
+    frames = torch.rand(1, 3, 12, 10)
+    model = _RecordingModel(_pointwise)
+    assert torch.equal(tiled_forward(model, frames, tile_size=16), _pointwise(frames))
+    assert model.shapes == [(1, 3, 12, 10)]
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test the watchdog's production server: per-endpoint concurrency limits and
+a small run of the webhook load test (load_test_watchdog.py)
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_concurrency_limit_rejects_overflow():
+    Flask = pytest.importorskip("flask").Flask
+    watchdog_api = pytest.importorskip("watchdog_api")
+
+    app = Flask("limit-test")
+    entered = threading.Event()
+    release = threading.Event()
+
+    @app.route("/slow")
+    @watchdog_api._limit_concurrency(1)
+    def slow():
+        entered.set()
+        release.wait(10)
+        return "done"
+
+    busy_wait = watchdog_api.BUSY_WAIT_SECONDS
+    watchdog_api.BUSY_WAIT_SECONDS = 0.1
+    try:
+        first = []
+        thread = threading.Thread(target=lambda: first.append(app.test_client().get("/slow")))
+        thread.start()
+        assert entered.wait(5)
+
+        response = app.test_client().get("/slow")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+        release.set()
+        thread.join(10)
+        assert first[0].status_code == 200
+        assert app.test_client().get("/slow").status_code == 200
+    finally:
+        watchdog_api.BUSY_WAIT_SECONDS = busy_wait
+        release.set()
+
+
+def test_pooled_server_rejects_when_backlog_full():
+    Flask = pytest.importorskip("flask").Flask
+    requests = pytest.importorskip("requests")
+    watchdog_api = pytest.importorskip("watchdog_api")
+
+    app = Flask("backlog-test")
+    entered = threading.Event()
+    release = threading.Event()
+
+    @app.route("/slow")
+    def slow():
+        entered.set()
+        release.wait(10)
+        return "done"
+
+    server = watchdog_api._PooledWSGIServer("127.0.0.1", 0, app, threads=1, backlog=1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.port}/slow"
+    first = []
+    try:
+        thread = threading.Thread(target=lambda: first.append(requests.get(url, timeout=10)))
+        thread.start()
+        assert entered.wait(5)
+
+        # One connection may wait for the busy thread...
+        waiting = socket.create_connection(("127.0.0.1", server.port))
+        time.sleep(0.2)
+        # ...the next one is turned away instead of queueing
+        with socket.create_connection(("127.0.0.1", server.port), timeout=5) as rejected:
+            response = rejected.recv(4096)
+        assert response.startswith(b"HTTP/1.0 503"), response
+        assert b"Retry-After: 1" in response
+
+        waiting.close()
+        release.set()
+        thread.join(10)
+        assert first[0].status_code == 200
+        assert requests.get(url, timeout=10).status_code == 200
+    finally:
+        release.set()
+        server.shutdown()
+
+
+def test_slow_queue_write_reports_pending():
+    watchdog_api = pytest.importorskip("watchdog_api")
+
+    class _Supervisor:
+        starts = 0
+
+        def ensure_running(self):
+            self.starts += 1
+            return "running"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        media = os.path.join(tmp, "Movie (2020).mkv")
+        with open(media, "wb") as handle:
+            handle.write(b"\0" * 1024)
+        queue_file = os.path.join(tmp, "queue.jsonl")
+        release = threading.Event()
+
+        def slow_enqueue(queue_file, job):
+            release.wait(10)  # A stuck mount
+            return watchdog_api.open_queue(queue_file).enqueue_unique(job)
+
+        saved = (watchdog_api._enqueue_job, watchdog_api.FS_TIMEOUT, watchdog_api.supervisor,
+                 os.environ.get("SRGAN_QUEUE_FILE"))
+        watchdog_api._enqueue_job = slow_enqueue
+        watchdog_api.FS_TIMEOUT = 0.2
+        watchdog_api.supervisor = _Supervisor()
+        os.environ["SRGAN_QUEUE_FILE"] = queue_file
+        try:
+            ok, data = watchdog_api.queue_upscaling_job({"path": media, "name": "Movie"})
+            assert ok and data["status"] == "pending", data
+            assert watchdog_api.supervisor.starts == 0
+
+            # The write commits after the webhook returned: the job is
+            # still announced, exactly once
+            release.set()
+            deadline = time.time() + 10
+            while watchdog_api.supervisor.starts == 0 and time.time() < deadline:
+                time.sleep(0.05)
+            assert watchdog_api.supervisor.starts == 1
+            assert watchdog_api.open_queue(queue_file).counts().get("queued") == 1
+        finally:
+            release.set()
+            (watchdog_api._enqueue_job, watchdog_api.FS_TIMEOUT, watchdog_api.supervisor,
+             saved_queue_file) = saved
+            if saved_queue_file is None:
+                os.environ.pop("SRGAN_QUEUE_FILE", None)
+            else:
+                os.environ["SRGAN_QUEUE_FILE"] = saved_queue_file
+
+
+def test_webhook_burst():
+    run_load_test = pytest.importorskip("load_test_watchdog").run_load_test
+
+    stats = run_load_test(webhooks=150, concurrency=75, sessions=5, latency=0.05, server_kind="werkzeug")
+    assert stats["status_codes"] == {200: 150}, stats["status_codes"]
+    # One job per playing file, and the session cache/coalescing absorbs the burst
+    assert stats["jobs"] == 5, stats
+    assert stats["upstream_calls"] <= 5, stats
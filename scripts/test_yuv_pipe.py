@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Test the YUV 4:2:0 <-> RGB conversions used for yuv420p/nv12 pipes
+"""
+
+import os
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from srgan_inference import rgb_to_yuv420, yuv420_to_rgb
+from your_model_file_ffmpeg import _is_full_range
+
+
+def test_reference_levels():
+    # Limited range: black is Y=16, white is Y=235, neutral chroma is 128
+    rgb = torch.tensor([0.0, 1.0]).view(2, 1, 1, 1).expand(2, 3, 2, 2).contiguous()
+    y, u, v = rgb_to_yuv420(rgb.clone(), "bt709")
+    assert y[:, 0, 0].tolist() == [16.0, 235.0]
+    assert u.flatten().tolist() == [128.0, 128.0]
+    assert v.flatten().tolist() == [128.0, 128.0]
+
+
+def test_round_trip_is_close():
+    torch.manual_seed(0)
+    # Smooth content: 4:2:0 can't carry per-pixel chroma detail
+    rgb = torch.nn.functional.interpolate(torch.rand(2, 3, 4, 4), size=(16, 16), mode="bilinear")
+    for matrix in ("bt601", "bt709", "bt2020"):
+        y, u, v = rgb_to_yuv420(rgb.clone(), matrix)
+        back = yuv420_to_rgb(y.byte(), u.byte(), v.byte(), matrix)
+        assert (back - rgb).abs().mean() < 0.02, matrix
+
+
+def test_full_range_sources_use_rgb_pipes():
+    # The conversions above are limited-range only
+    assert not _is_full_range({"pix_fmt": "yuv420p", "color_range": "tv"})
+    assert not _is_full_range({"pix_fmt": "yuv420p", "color_range": ""})
+    assert _is_full_range({"pix_fmt": "yuv420p", "color_range": "pc"})
+    assert _is_full_range({"pix_fmt": "yuvj420p"})
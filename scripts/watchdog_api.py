@@ -12,14 +12,23 @@ This is more reliable as it uses Jellyfin's official API.
 """
 
 from flask import Flask, request, jsonify
+import concurrent.futures
+import functools
+import heapq
 import json
 import os
-import subprocess
 import logging
+import threading
 import time
-import requests
 from datetime import datetime
 
+from werkzeug.serving import BaseWSGIServer
+
+from srgan_jellyfin import JellyfinSessionClient, JellyfinSessionListener, playing_item
+from srgan_progress import ProgressReporter, list_progress, progress_dir, read_progress
+from srgan_queue import open_queue, ring_doorbell
+from srgan_supervisor import DEFAULT_DEBOUNCE_SECONDS, UpscalerSupervisor
+
 app = Flask(__name__)
 
 # Configure logging
@@ -33,9 +42,113 @@ logger = logging.getLogger(__name__)
 # Jellyfin API Configuration
 JELLYFIN_URL = os.environ.get("JELLYFIN_URL", "http://localhost:8096")
 JELLYFIN_API_KEY = os.environ.get("JELLYFIN_API_KEY", "")
+JELLYFIN_SESSIONS_TTL = float(os.environ.get("JELLYFIN_SESSIONS_TTL", "2"))
+JELLYFIN_ACTIVE_WITHIN = int(os.environ.get("JELLYFIN_ACTIVE_WITHIN", "960"))
+
+JELLYFIN_WEBSOCKET = os.environ.get("JELLYFIN_WEBSOCKET", "0") == "1"
+
+# One pooled, cached client for every endpoint (created on first use,
+# under the lock so a burst of first requests builds exactly one)
+_session_client = None
+_session_client_lock = threading.Lock()
+# Push-based session index (JELLYFIN_WEBSOCKET=1, started in __main__)
+_session_listener = None
+
+# Starts the upscaler container only when no worker heartbeat is fresh
+supervisor = UpscalerSupervisor(
+    os.environ.get("SRGAN_QUEUE_FILE", "./cache/queue.jsonl"),
+    debounce=float(os.environ.get("SRGAN_START_DEBOUNCE_SECONDS", str(DEFAULT_DEBOUNCE_SECONDS))),
+)
+
+# Serving: a fixed pool of request threads, and per-endpoint limits so a
+# burst of webhooks can't starve /progress (polled by the playback overlay)
+WATCHDOG_THREADS = int(os.environ.get("SRGAN_WATCHDOG_THREADS", "32"))
+WEBHOOK_CONCURRENCY = int(os.environ.get("SRGAN_WATCHDOG_WEBHOOK_CONCURRENCY", "16"))
+READ_CONCURRENCY = int(os.environ.get("SRGAN_WATCHDOG_READ_CONCURRENCY", "16"))
+DEBUG_CONCURRENCY = int(os.environ.get("SRGAN_WATCHDOG_DEBUG_CONCURRENCY", "4"))
+BUSY_WAIT_SECONDS = float(os.environ.get("SRGAN_WATCHDOG_BUSY_WAIT", "2"))
+# Accepted connections waiting for a request thread (werkzeug server);
+# beyond that new connections get 503 straight away
+WATCHDOG_BACKLOG = int(os.environ.get("SRGAN_WATCHDOG_BACKLOG", "256"))
+
+# Filesystem checks (media over NFS/SMB can hang) run on a small bounded
+# pool with a timeout, so a stuck mount ties up these threads, not all of them
+FS_TIMEOUT = float(os.environ.get("SRGAN_WATCHDOG_FS_TIMEOUT", "10"))
+_fs_pool = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.environ.get("SRGAN_WATCHDOG_FS_THREADS", "4")),
+    thread_name_prefix="watchdog-fs",
+)
+
+
+def _offload_fs(func, *args):
+    """
+    Run a filesystem check on the bounded pool. Raises
+    concurrent.futures.TimeoutError (not the builtin before Python 3.11)
+    after FS_TIMEOUT; only use it for reads, the call keeps running.
+    """
+    return _fs_pool.submit(func, *args).result(timeout=FS_TIMEOUT)
+
+
+def _enqueue_job(queue_file, job):
+    """Open the queue and insert job unless the media index knows the file."""
+    return open_queue(queue_file).enqueue_unique(job)
+
+
+def _announce_job(queue_file, job, job_id):
+    """Wake a worker for a newly queued job; returns the upscaler status."""
+    ring_doorbell(queue_file)
+
+    # Show the job as queued in the playback overlay until the pipeline picks it up
+    ProgressReporter(job["input"], job["output"], job_id=job_id,
+                     directory=progress_dir(queue_file)).queued()
+
+    # The doorbell wakes a running worker; otherwise start the container in
+    # the background so the webhook doesn't wait on docker
+    return supervisor.ensure_running()
+
+
+def _announce_late_job(queue_file, job, future):
+    """Done callback for a queue write that outlived the webhook."""
+    try:
+        job_id, entry = future.result()
+    except Exception as e:
+        logger.error(f"Failed to write job queue: {e}")
+        return
+    if entry is None:
+        logger.info(f"✓ AI upscaling job queued late (#{job_id}): {job['input']}")
+        _announce_job(queue_file, job, job_id)
+
+
+def _limit_concurrency(limit):
+    """
+    Allow at most limit concurrent requests to the decorated view. Extra
+    requests wait up to BUSY_WAIT_SECONDS, then get 503 with Retry-After.
+    """
+    slots = threading.BoundedSemaphore(limit)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not slots.acquire(timeout=BUSY_WAIT_SECONDS):
+                logger.warning(f"{request.path}: {limit} requests already in flight, rejecting")
+                return jsonify({
+                    "status": "busy",
+                    "message": "Too many concurrent requests, retry shortly"
+                }), 503, {"Retry-After": "1"}
+            try:
+                return view(*args, **kwargs)
+            finally:
+                slots.release()
+        return wrapper
+    return decorator
+
 
 # Cache to prevent duplicate processing
+# (item_id -> time); files already queued or upscaled are caught by the
+# persistent media index in the queue database, this only absorbs bursts
 processed_items = {}
+_processed_expiry = []  # Heap of (expires_at, item_id)
+_processed_lock = threading.Lock()
 CACHE_DURATION = 300  # 5 minutes
 
 
@@ -45,7 +158,11 @@ def get_jellyfin_sessions():
     
     Returns list of sessions with NowPlayingItem details.
     Requires JELLYFIN_API_KEY to be set.
+
+    Responses are cached for JELLYFIN_SESSIONS_TTL seconds and concurrent
+    callers share one upstream request (see srgan_jellyfin.py).
     """
+    global _session_client
     if not JELLYFIN_API_KEY:
         logger.error("JELLYFIN_API_KEY not set!")
         logger.error("Set it in environment: export JELLYFIN_API_KEY=your_api_key")
@@ -56,19 +173,19 @@ def get_jellyfin_sessions():
         logger.error("  3. Name: SRGAN Watchdog")
         logger.error("  4. Copy the key")
         return None
-    
-    url = f"{JELLYFIN_URL}/Sessions"
-    headers = {
-        "X-Emby-Token": JELLYFIN_API_KEY
-    }
-    
-    try:
-        response = requests.get(url, headers=headers, timeout=5)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to query Jellyfin API: {e}")
-        return None
+
+    client = _session_client
+    if client is None:
+        with _session_client_lock:
+            if _session_client is None:
+                _session_client = JellyfinSessionClient(
+                    JELLYFIN_URL,
+                    JELLYFIN_API_KEY,
+                    ttl=JELLYFIN_SESSIONS_TTL,
+                    active_within=JELLYFIN_ACTIVE_WITHIN,
+                )
+            client = _session_client
+    return client.sessions()
 
 
 def extract_playing_items():
@@ -81,53 +198,22 @@ def extract_playing_items():
     - item_id: Jellyfin item ID
     - user: Username
     - session_id: Session ID
+
+    With JELLYFIN_WEBSOCKET=1 and the socket connected, this is the index
+    built from pushed session events and costs no request to Jellyfin.
     """
+    if _session_listener is not None and _session_listener.connected:
+        return _session_listener.playing()
+
     sessions = get_jellyfin_sessions()
     if not sessions:
         return []
     
     playing_items = []
-    
     for session in sessions:
-        # Check if this session has a currently playing item
-        now_playing = session.get("NowPlayingItem")
-        if not now_playing:
-            continue
-        
-        # Get playstate
-        play_state = session.get("PlayState", {})
-        is_paused = play_state.get("IsPaused", False)
-        
-        # Only process if actually playing (not paused)
-        if is_paused:
-            logger.debug(f"Session {session.get('Id')} is paused, skipping")
+        item = playing_item(session)
+        if item is None:
             continue
-        
-        # Extract file path from NowPlayingItem
-        # The path is in: NowPlayingItem.Path or NowPlayingItem.MediaSources[0].Path
-        file_path = now_playing.get("Path")
-        
-        if not file_path:
-            # Try MediaSources
-            media_sources = now_playing.get("MediaSources", [])
-            if media_sources:
-                file_path = media_sources[0].get("Path")
-        
-        if not file_path:
-            logger.warning(f"No file path found for item {now_playing.get('Name')}")
-            continue
-        
-        # Extract metadata
-        item = {
-            "path": file_path,
-            "name": now_playing.get("Name", "Unknown"),
-            "item_id": now_playing.get("Id"),
-            "item_type": now_playing.get("Type"),
-            "user": session.get("UserName", "Unknown"),
-            "session_id": session.get("Id"),
-            "client": session.get("Client", "Unknown")
-        }
-        
         playing_items.append(item)
         logger.info(f"Found playing item: {item['name']} ({item['path']})")
     
@@ -136,22 +222,25 @@ def extract_playing_items():
 
 def is_recently_processed(item_id):
     """Check if item was recently processed (prevent duplicates)."""
-    if item_id in processed_items:
-        last_time = processed_items[item_id]
-        if time.time() - last_time < CACHE_DURATION:
-            return True
-    return False
+    with _processed_lock:
+        last_time = processed_items.get(item_id)
+    return last_time is not None and time.time() - last_time < CACHE_DURATION
 
 
 def mark_processed(item_id):
     """Mark item as processed with timestamp."""
-    processed_items[item_id] = time.time()
-    
-    # Clean old entries
-    current_time = time.time()
-    expired = [k for k, v in processed_items.items() if current_time - v > CACHE_DURATION]
-    for k in expired:
-        del processed_items[k]
+    now = time.time()
+    with _processed_lock:
+        processed_items[item_id] = now
+        heapq.heappush(_processed_expiry, (now + CACHE_DURATION, item_id))
+        
+        # Clean old entries from the front of the heap instead of scanning
+        # the whole dict; entries re-marked since then are left alone
+        while _processed_expiry and _processed_expiry[0][0] <= now:
+            _, old_id = heapq.heappop(_processed_expiry)
+            last_time = processed_items.get(old_id)
+            if last_time is not None and now - last_time >= CACHE_DURATION:
+                del processed_items[old_id]
 
 
 def queue_upscaling_job(item):
@@ -188,7 +277,12 @@ def queue_upscaling_job(item):
             return False, {"error": "HLS segments cannot be upscaled"}
     
     # Check if file exists
-    if not os.path.exists(input_file):
+    try:
+        input_exists = _offload_fs(os.path.exists, input_file)
+    except concurrent.futures.TimeoutError:
+        logger.error(f"ERROR: Timed out checking input file: {input_file}")
+        return False, {"error": "Filesystem check timed out"}
+    if not input_exists:
         logger.error(f"ERROR: Input file does not exist: {input_file}")
         return False, {"error": "File not found on host"}
     
@@ -210,7 +304,12 @@ def queue_upscaling_job(item):
     logger.info(f"Note: Filename will be intelligently renamed with resolution/HDR tags")
     
     # Check if already upscaled
-    if os.path.exists(output_path):
+    try:
+        output_exists = _offload_fs(os.path.exists, output_path)
+    except concurrent.futures.TimeoutError:
+        logger.error(f"ERROR: Timed out checking output file: {output_path}")
+        return False, {"error": "Filesystem check timed out"}
+    if output_exists:
         logger.info(f"✓ Output already exists: {output_path}")
         return True, {
             "status": "ready",
@@ -218,9 +317,7 @@ def queue_upscaling_job(item):
             "file": output_path
         }
     
-    # Queue the AI upscaling job
     queue_file = os.environ.get("SRGAN_QUEUE_FILE", "./cache/queue.jsonl")
-    os.makedirs(os.path.dirname(queue_file), exist_ok=True)
     
     job = {
         "input": input_file,
@@ -231,48 +328,90 @@ def queue_upscaling_job(item):
         "user": item.get("user")
     }
     
-    with open(queue_file, "a", encoding="utf-8") as handle:
-        handle.write(f"{json.dumps(job)}\n")
-    
-    logger.info(f"✓ AI upscaling job queued")
+    # Queue the AI upscaling job, unless the persistent media index knows
+    # this exact file (the pipeline renames its output, e.g. [2160p], so the
+    # check above doesn't catch finished files). Checked and inserted in one
+    # transaction, so concurrent webhooks queue a file once.
+    future = _fs_pool.submit(_enqueue_job, queue_file, job)
+    try:
+        job_id, entry = future.result(timeout=FS_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        # The insert can't be cancelled and may still commit: report it as
+        # pending and announce the job if and when it lands
+        logger.warning(f"Job queue write still running after {FS_TIMEOUT:g}s: {input_file}")
+        future.add_done_callback(functools.partial(_announce_late_job, queue_file, job))
+        return True, {
+            "status": "pending",
+            "message": "Queue write in progress; the job will start once it completes",
+            "input": input_file
+        }
+    except Exception as e:
+        logger.error(f"Failed to write job queue: {e}")
+        return False, {"error": f"Queue error: {e}"}
+    if entry is not None:
+        if entry["state"] == "done":
+            logger.info(f"✓ Already upscaled (job #{entry['job_id']}): {entry['output']}")
+            return True, {
+                "status": "ready",
+                "message": "File already upscaled",
+                "file": entry["output"]
+            }
+        if entry["state"] in ("queued", "running"):
+            logger.info(f"✓ Already {entry['state']} as job #{entry['job_id']}")
+            return True, {
+                "status": entry["state"],
+                "message": f"Upscaling job #{entry['job_id']} already {entry['state']}",
+                "job_id": entry["job_id"]
+            }
+        logger.warning(f"Job #{entry['job_id']} for this file failed recently, not retrying yet")
+        return False, {"error": "Upscaling failed recently; it will be retried later"}
+    
+    upscaler = _announce_job(queue_file, job, job_id)
+    
+    logger.info(f"✓ AI upscaling job queued (#{job_id})")
     logger.info(f"  Input:  {input_file}")
     logger.info(f"  Output: {output_path}")
     logger.info(f"  Format: {output_format.upper()}")
     logger.info(f"  Item:   {item.get('name')}")
     logger.info(f"  User:   {item.get('user')}")
-    
-    # Start the upscaler container
-    logger.info("Starting srgan-upscaler container...")
-    try:
-        result = subprocess.run(
-            ["docker", "compose", "up", "-d", "srgan-upscaler"],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
-        if result.returncode != 0:
-            logger.error(f"Docker compose error: {result.stderr}")
-            return False, {"error": f"Docker error: {result.stderr}"}
-        
-        logger.info("✓ Container started successfully")
-    except subprocess.TimeoutExpired:
-        logger.error("Docker compose command timed out")
-        return False, {"error": "Docker timeout"}
-    except FileNotFoundError:
-        logger.error("ERROR: 'docker' command not found")
-        return False, {"error": "Docker not found"}
+    logger.info(f"  Upscaler: {upscaler}")
     
     return True, {
         "status": "queued",
         "message": "AI upscaling job queued successfully",
         "input": input_file,
         "output": output_path,
-        "format": output_format
+        "format": output_format,
+        "upscaler": upscaler
+    }
+
+
+def process_playing_item(item):
+    """Queue one playing item unless it was queued recently; returns a result dict."""
+    item_id = item.get("item_id")
+    
+    # Check if already processed recently
+    if is_recently_processed(item_id):
+        logger.info(f"Item {item['name']} already processed recently, skipping")
+        return {
+            "item": item["name"],
+            "status": "skipped",
+            "reason": "recently_processed"
+        }
+    
+    # Queue the job
+    success, response_data = queue_upscaling_job(item)
+    if success:
+        mark_processed(item_id)
+    return {
+        "item": item["name"],
+        "status": "success" if success else "error",
+        "data": response_data
     }
 
 
 @app.route("/upscale-trigger", methods=["POST"])
+@_limit_concurrency(WEBHOOK_CONCURRENCY)
 def handle_webhook():
     """
     Handle webhook trigger from Jellyfin.
@@ -313,34 +452,7 @@ def handle_webhook():
         # Process each playing item
         results = []
         for item in playing_items:
-            item_id = item.get("item_id")
-            
-            # Check if already processed recently
-            if is_recently_processed(item_id):
-                logger.info(f"Item {item['name']} already processed recently, skipping")
-                results.append({
-                    "item": item["name"],
-                    "status": "skipped",
-                    "reason": "recently_processed"
-                })
-                continue
-            
-            # Queue the job
-            success, response_data = queue_upscaling_job(item)
-            
-            if success:
-                mark_processed(item_id)
-                results.append({
-                    "item": item["name"],
-                    "status": "success",
-                    "data": response_data
-                })
-            else:
-                results.append({
-                    "item": item["name"],
-                    "status": "error",
-                    "data": response_data
-                })
+            results.append(process_playing_item(item))
         
         logger.info("=" * 80)
         
@@ -359,27 +471,68 @@ def handle_webhook():
 
 
 @app.route("/status", methods=["GET"])
+@_limit_concurrency(READ_CONCURRENCY)
 def status():
     """Health check and status endpoint."""
     # Check Jellyfin connectivity
     jellyfin_ok = False
-    if JELLYFIN_API_KEY:
+    websocket_connected = _session_listener is not None and _session_listener.connected
+    if websocket_connected:
+        jellyfin_ok = True
+    elif JELLYFIN_API_KEY:
         sessions = get_jellyfin_sessions()
         jellyfin_ok = sessions is not None
     
+    queue_counts = None
+    try:
+        queue_counts = open_queue(os.environ.get("SRGAN_QUEUE_FILE", "./cache/queue.jsonl")).counts()
+    except Exception as e:
+        logger.warning(f"Could not read job queue: {e}")
+    
     return jsonify({
         "status": "running",
         "jellyfin_url": JELLYFIN_URL,
         "jellyfin_api_configured": bool(JELLYFIN_API_KEY),
         "jellyfin_reachable": jellyfin_ok,
+        "jellyfin_websocket": websocket_connected,
         "queue_file": os.environ.get("SRGAN_QUEUE_FILE", "./cache/queue.jsonl"),
+        "queue_jobs": queue_counts,
+        "upscaler": supervisor.status(),
         "output_location": "Same directory as input file",
         "mode": "AI upscaling (direct file output)",
         "output_format": os.environ.get("OUTPUT_FORMAT", "mkv")
     }), 200
 
 
+@app.route("/progress", methods=["GET"])
+@_limit_concurrency(READ_CONCURRENCY)
+def get_all_progress():
+    """Progress of all active jobs (?all=1 includes finished ones)."""
+    queue_file = os.environ.get("SRGAN_QUEUE_FILE", "./cache/queue.jsonl")
+    active_only = request.args.get("all", "0") != "1"
+    jobs = list_progress(progress_dir(queue_file), active_only=active_only)
+    return jsonify({
+        "count": len(jobs),
+        "jobs": jobs
+    }), 200
+
+
+@app.route("/progress/<path:filename>", methods=["GET"])
+@_limit_concurrency(READ_CONCURRENCY)
+def get_progress(filename):
+    """
+    Progress of the job for one input file, as polled by the playback
+    overlay (playback-progress-overlay.js). 404 until the job is queued.
+    """
+    queue_file = os.environ.get("SRGAN_QUEUE_FILE", "./cache/queue.jsonl")
+    data = read_progress(filename, progress_dir(queue_file))
+    if data is None:
+        return jsonify({"error": "No upscaling job for this file"}), 404
+    return jsonify(data), 200
+
+
 @app.route("/sessions", methods=["GET"])
+@_limit_concurrency(DEBUG_CONCURRENCY)
 def get_sessions():
     """Debug endpoint to view current Jellyfin sessions."""
     sessions = get_jellyfin_sessions()
@@ -390,6 +543,7 @@ def get_sessions():
 
 
 @app.route("/playing", methods=["GET"])
+@_limit_concurrency(DEBUG_CONCURRENCY)
 def get_playing():
     """Debug endpoint to view currently playing items."""
     items = extract_playing_items()
@@ -399,6 +553,106 @@ def get_playing():
     }), 200
 
 
+class _PooledWSGIServer(BaseWSGIServer):
+    """
+    Werkzeug server handing each connection to a fixed thread pool. The
+    development server's threaded mode starts a new thread per request,
+    so a webhook storm would start hundreds of them. At most backlog
+    connections wait for a thread; past that they are answered 503 and
+    closed instead of piling up in the pool's queue.
+    """
+
+    _BUSY_RESPONSE = (b"HTTP/1.0 503 Service Unavailable\r\n"
+                      b"Retry-After: 1\r\n"
+                      b"Content-Length: 0\r\n"
+                      b"Connection: close\r\n\r\n")
+
+    def __init__(self, host, port, wsgi_app, threads, backlog=None):
+        super().__init__(host, port, wsgi_app)
+        # Set after __init__: HTTP/1.0, so idle keep-alive connections
+        # don't hold pool threads
+        self.multithread = True
+        self.port = self.socket.getsockname()[1]
+        self.name = f"werkzeug, {threads} threads"
+        backlog = WATCHDOG_BACKLOG if backlog is None else backlog
+        self._slots = threading.BoundedSemaphore(threads + backlog)
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="watchdog-http"
+        )
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            logger.warning(f"Request queue full, rejecting connection from {client_address[0]}")
+            self._reject(request)
+            return
+        try:
+            self._pool.submit(self._handle, request, client_address)
+        except RuntimeError:  # Shutting down
+            self._slots.release()
+            self.shutdown_request(request)
+
+    def _reject(self, request):
+        try:
+            request.sendall(self._BUSY_RESPONSE)
+            # Drop what the client already sent, so closing doesn't reset
+            # the connection before it reads the response
+            request.setblocking(False)
+            request.recv(65536)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def shutdown(self):
+        super().shutdown()
+        self._pool.shutdown(wait=False)
+
+
+class _WaitressServer:
+    """waitress (pip install waitress) with the same interface as _PooledWSGIServer."""
+
+    def __init__(self, host, port, wsgi_app, threads):
+        import waitress.server
+
+        self.server = waitress.server.create_server(
+            wsgi_app, host=host, port=port, threads=threads,
+            connection_limit=max(100, threads * 8), channel_timeout=30,
+        )
+        self.port = self.server.effective_port
+        self.name = f"waitress, {threads} threads"
+
+    def serve_forever(self):
+        self.server.run()
+
+    def shutdown(self):
+        self.server.close()
+
+
+def make_server(host="0.0.0.0", port=5432, threads=None, kind=None):
+    """
+    Production server for the watchdog with an explicit request thread pool
+    (SRGAN_WATCHDOG_THREADS). kind (SRGAN_WATCHDOG_SERVER): "waitress",
+    "werkzeug", or "auto" (waitress if installed). Call serve_forever().
+    """
+    threads = threads or WATCHDOG_THREADS
+    kind = kind or os.environ.get("SRGAN_WATCHDOG_SERVER", "auto")
+    if kind in ("auto", "waitress"):
+        try:
+            return _WaitressServer(host, port, app, threads)
+        except ImportError:
+            if kind == "waitress":
+                raise
+    return _PooledWSGIServer(host, port, app, threads)
+
+
 if __name__ == "__main__":
     logger.info("=" * 80)
     logger.info("SRGAN Watchdog - API-Based Version")
@@ -413,6 +667,7 @@ if __name__ == "__main__":
     logger.info(f"  Output location: Same directory as input file")
     logger.info(f"  Mode: AI upscaling (direct file output)")
     logger.info(f"  Output format: {os.environ.get('OUTPUT_FORMAT', 'mkv').upper()}")
+    logger.info(f"  Playback detection: {'WebSocket push' if JELLYFIN_WEBSOCKET else 'webhook + /Sessions'}")
     logger.info("")
     
     if not JELLYFIN_API_KEY:
@@ -429,9 +684,22 @@ if __name__ == "__main__":
         logger.error("Then restart this service.")
         logger.error("")
     
-    logger.info("Starting Flask server on 0.0.0.0:5432...")
+    if JELLYFIN_WEBSOCKET and JELLYFIN_API_KEY:
+        # Queue jobs straight from pushed session events; the webhook keeps
+        # working and reads the same index instead of polling /Sessions
+        _session_listener = JellyfinSessionListener(
+            JELLYFIN_URL,
+            JELLYFIN_API_KEY,
+            on_playing=process_playing_item,
+        )
+        if not _session_listener.start():
+            _session_listener = None
+    
+    server = make_server(host="0.0.0.0", port=5432)
+    logger.info(f"Starting server on 0.0.0.0:{server.port} ({server.name})...")
+    logger.info(f"  Concurrency: webhook {WEBHOOK_CONCURRENCY}, status/progress {READ_CONCURRENCY}, "
+                f"debug {DEBUG_CONCURRENCY}")
     logger.info("=" * 80)
     logger.info("")
     
-    # Run Flask app
-    app.run(host="0.0.0.0", port=5432, debug=False)
+    server.serve_forever()
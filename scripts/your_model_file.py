@@ -12,6 +12,17 @@ from typing import Optional, Tuple
 
 import torch
 
+from srgan_inference import (
+    GaussianDenoiser,
+    configure_runtime,
+    cpu_quantize_mode,
+    load_compiled_model,
+    load_onnx_model,
+    model_cache_key,
+    tiled_forward,
+    to_channels_last,
+)
+
 # Check torchaudio availability and version
 try:
     import torchaudio
@@ -106,18 +117,7 @@ class _SRGANGenerator(torch.nn.Module):
         return self.output(out)
 
 
-def _load_model(model_path: str, device: str, scale: int) -> torch.nn.Module:
-    if not os.path.exists(model_path):
-        raise NotImplementedError(
-            f"SRGAN model not found at {model_path}. Provide the Swift-SRGAN weights."
-        )
-
-    force_state = os.environ.get("SRGAN_MODEL_FORMAT", "").lower() == "pth"
-    if model_path.endswith((".pt", ".ts")) and not force_state:
-        model = torch.jit.load(model_path, map_location=device)
-        model.eval()
-        return model
-
+def _load_eager_model(model_path: str, device: str, scale: int) -> torch.nn.Module:
     checkpoint = torch.load(model_path, map_location=device)
     if isinstance(checkpoint, dict):
         state = (
@@ -135,6 +135,58 @@ def _load_model(model_path: str, device: str, scale: int) -> torch.nn.Module:
     return model
 
 
+def _load_model(model_path: str, device: str, scale: int, use_compiled: bool = True) -> torch.nn.Module:
+    if not os.path.exists(model_path):
+        raise NotImplementedError(
+            f"SRGAN model not found at {model_path}. Provide the Swift-SRGAN weights."
+        )
+
+    force_state = os.environ.get("SRGAN_MODEL_FORMAT", "").lower() == "pth"
+    if model_path.endswith((".pt", ".ts")) and not force_state:
+        model = torch.jit.load(model_path, map_location=device)
+        model.eval()
+        return model
+
+    # Prefer the cached TorchScript export of these weights (export_model.py)
+    if use_compiled:
+        model = load_compiled_model(
+            model_path, scale, device,
+            build=lambda: _load_eager_model(model_path, device, scale),
+        )
+        if model is not None:
+            return model
+
+    return _load_eager_model(model_path, device, scale)
+
+
+def _prepare_model(model_path: str, device: str, scale: int, use_fp16: bool,
+                   quantize: str = "off") -> torch.nn.Module:
+    # int8 always runs the calibrated model through ONNX Runtime
+    if quantize == "int8":
+        model = load_onnx_model(model_path, scale, device, quantized=True)
+        if model is not None:
+            return model
+
+    # Inference backend: torch (default) or onnxruntime (CPU)
+    backend = os.environ.get("SRGAN_BACKEND", "torch").lower()
+    if backend == "onnxruntime":
+        model = load_onnx_model(
+            model_path, scale, device,
+            build=lambda: _load_eager_model(model_path, "cpu", scale),
+        )
+        if model is not None:
+            return model
+    elif backend != "torch":
+        print(f"Warning: Unknown SRGAN_BACKEND '{backend}', using torch", file=sys.stderr)
+
+    model = _load_model(model_path, device, scale=scale)
+    if os.environ.get("SRGAN_CHANNELS_LAST", "1") == "1":
+        model = to_channels_last(model)
+    if use_fp16:
+        model = model.half()
+    return model
+
+
 def _parse_fps(frame_rate: Optional[object], fallback: float = 24.0) -> float:
     if frame_rate is None:
         return fallback
@@ -217,46 +269,8 @@ class _WriterThread:
         self.thread.join()
 
 
-def _denoise_tensor(tensor: torch.Tensor, strength: float = 0.5) -> torch.Tensor:
-    """
-    Apply temporal denoising using bilateral filter-like approach.
-    Args:
-        tensor: Input tensor (B, C, H, W) in range [0, 1]
-        strength: Denoising strength (0.0-1.0), higher = more denoising
-    """
-    if strength <= 0:
-        return tensor
-    
-    # Use a simple gaussian blur for denoising
-    # For better quality, could use non-local means or bilateral filter
-    kernel_size = max(3, int(strength * 7) | 1)  # Ensure odd number
-    sigma = strength * 2.0
-    
-    # Create gaussian kernel
-    from torch.nn.functional import conv2d
-    kernel_1d = torch.exp(-torch.arange(-(kernel_size//2), kernel_size//2 + 1, dtype=torch.float32) ** 2 / (2 * sigma ** 2))
-    kernel_1d = kernel_1d / kernel_1d.sum()
-    kernel_2d = kernel_1d.view(-1, 1) * kernel_1d.view(1, -1)
-    kernel_2d = kernel_2d.view(1, 1, kernel_size, kernel_size).to(tensor.device)
-    
-    # Apply to each channel
-    denoised = []
-    for c in range(tensor.shape[1]):
-        channel = tensor[:, c:c+1, :, :]
-        # Add padding
-        pad = kernel_size // 2
-        channel_padded = torch.nn.functional.pad(channel, (pad, pad, pad, pad), mode='reflect')
-        denoised_channel = conv2d(channel_padded, kernel_2d, padding=0)
-        denoised.append(denoised_channel)
-    
-    denoised_tensor = torch.cat(denoised, dim=1)
-    
-    # Blend original and denoised based on strength
-    alpha = min(1.0, strength)
-    return tensor * (1 - alpha) + denoised_tensor * alpha
-
-
-def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.0):
+def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.0,
+            model_cache=None, on_progress=None):
     torch.backends.cudnn.benchmark = True
     device = os.environ.get("SRGAN_DEVICE") or (
         "cuda" if torch.cuda.is_available() else "cpu"
@@ -265,24 +279,43 @@ def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.
         "SRGAN_MODEL_PATH", "/app/models/swift_srgan_4x.pth"
     )
     scale_factor = _infer_scale(scale)
-    model = _load_model(model_path, device, scale=scale_factor)
     use_fp16 = device.startswith("cuda") and os.environ.get("SRGAN_FP16", "1") == "1"
-    if use_fp16:
-        model = model.half()
+    quantize = cpu_quantize_mode(device)
+    runtime = configure_runtime(device)
+    if model_cache is not None:
+        model = model_cache.get(
+            model_path, model_cache_key(device, scale_factor, use_fp16, quantize),
+            lambda: _prepare_model(model_path, device, scale_factor, use_fp16, quantize)
+        )
+    else:
+        model = _prepare_model(model_path, device, scale_factor, use_fp16, quantize)
     
     # Denoising configuration
     enable_denoise = os.environ.get("SRGAN_DENOISE", "0") == "1"
     denoise_strength = float(os.environ.get("SRGAN_DENOISE_STRENGTH", "0.5"))
     
+    # Tiled inference bounds activation memory by tile size instead of frame size
+    tile_size = int(os.environ.get("SRGAN_TILE_SIZE", "0") or "0")
+    tile_overlap = int(os.environ.get("SRGAN_TILE_OVERLAP", "16") or "16")
+    tile_batch = max(1, int(os.environ.get("SRGAN_TILE_BATCH", "1") or "1"))
+    
     print(f"AI Upscaling Configuration:", file=sys.stderr)
     print(f"  Model: {model_path}", file=sys.stderr)
     print(f"  Device: {device}", file=sys.stderr)
     print(f"  FP16: {use_fp16}", file=sys.stderr)
+    if quantize != "off":
+        print(f"  Quantization: {quantize}", file=sys.stderr)
+    print(f"  Threads: {runtime['intra_op_threads']} intra-op, {runtime['inter_op_threads']} inter-op"
+          f" (CPU shared by {runtime['cpu_share']} process(es))", file=sys.stderr)
+    print(f"  Channels-last: {runtime['channels_last']}", file=sys.stderr)
     print(f"  Scale: {scale_factor}x", file=sys.stderr)
     print(f"  Denoising: {'Enabled' if enable_denoise else 'Disabled'}", file=sys.stderr)
     if enable_denoise:
         print(f"  Denoise Strength: {denoise_strength}", file=sys.stderr)
+    if tile_size > 0:
+        print(f"  Tiling: {tile_size}px tiles, {tile_overlap}px overlap, {tile_batch} per pass", file=sys.stderr)
 
+    frame_count = 0
     reader = torchaudio.io.StreamReader(input_path)
     video_stream_idx, video_info = _select_video_stream(reader)
     src_width = int(getattr(video_info, "width", 0) or 0)
@@ -368,6 +401,7 @@ def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.
     )
     writer.open()
     writer_thread = _WriterThread(writer)
+    denoiser = GaussianDenoiser(denoise_strength, device=device) if enable_denoise else None
 
     try:
         for (video_chunk,) in reader.stream():
@@ -377,20 +411,37 @@ def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.
                 video_chunk = video_chunk.unsqueeze(0)
 
             video_chunk = video_chunk.to(device, non_blocking=True)
+            scale_value = 1.0
             if video_chunk.dtype in (torch.uint8, torch.uint16):
                 scale_value = 255.0 if video_chunk.dtype == torch.uint8 else 65535.0
-                video_chunk = video_chunk.float() / scale_value
-            else:
-                video_chunk = video_chunk.float()
+            video_chunk = video_chunk.float()
             
-            # Apply denoising before upscaling if enabled
-            if enable_denoise:
-                video_chunk = _denoise_tensor(video_chunk, denoise_strength)
+            # Apply denoising before upscaling if enabled (normalization is
+            # folded into the denoise pass)
+            if denoiser is not None:
+                video_chunk = denoiser(video_chunk, scale=1.0 / scale_value)
+            elif scale_value != 1.0:
+                video_chunk = video_chunk.div_(scale_value)
+            if runtime["channels_last"]:
+                video_chunk = video_chunk.contiguous(memory_format=torch.channels_last)
 
             with torch.no_grad():
                 if use_fp16:
                     with torch.autocast("cuda", dtype=torch.float16):
-                        output = model(video_chunk.half())
+                        video_chunk = video_chunk.half()
+                        if tile_size > 0:
+                            output = tiled_forward(model, video_chunk, tile_size, tile_overlap, tile_batch)
+                        else:
+                            output = model(video_chunk)
+                elif quantize == "bf16":
+                    with torch.autocast("cpu", dtype=torch.bfloat16):
+                        if tile_size > 0:
+                            output = tiled_forward(model, video_chunk, tile_size, tile_overlap, tile_batch)
+                        else:
+                            output = model(video_chunk)
+                    output = output.float()
+                elif tile_size > 0:
+                    output = tiled_forward(model, video_chunk, tile_size, tile_overlap, tile_batch)
                 else:
                     output = model(video_chunk)
 
@@ -410,6 +461,9 @@ def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.
                 output = output.to(device, non_blocking=True)
 
             writer_thread.write(0, output)
+            frame_count += output.shape[0]
+            if on_progress is not None:
+                on_progress(frame_count)
     finally:
         writer_thread.close()
         writer.close()
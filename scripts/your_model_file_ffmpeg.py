@@ -4,16 +4,34 @@ SRGAN AI Upscaling using FFmpeg for video I/O
 Replaces torchaudio.io with direct FFmpeg subprocess calls
 """
 
+import collections
 import os
+import queue
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 from typing import Optional
 
 import numpy as np
 import torch
 from PIL import Image
 
+from srgan_inference import (
+    GaussianDenoiser,
+    configure_runtime,
+    cpu_quantize_mode,
+    load_compiled_model,
+    load_onnx_model,
+    model_cache_key,
+    rgb_to_yuv420,
+    tiled_forward,
+    to_channels_last,
+    yuv420_to_rgb,
+)
+from srgan_probe import probe_media
+
 
 class _ResidualBlock(torch.nn.Module):
     def __init__(self, channels: int):
@@ -70,12 +88,7 @@ class _SRGANGenerator(torch.nn.Module):
         return self.output(out)
 
 
-def _load_model(model_path: str, device: str, scale: int) -> torch.nn.Module:
-    if not os.path.exists(model_path):
-        raise NotImplementedError(
-            f"SRGAN model not found at {model_path}. Download swift_srgan_4x.pth first."
-        )
-
+def _load_eager_model(model_path: str, device: str, scale: int) -> torch.nn.Module:
     checkpoint = torch.load(model_path, map_location=device)
     if isinstance(checkpoint, dict):
         state = (
@@ -94,42 +107,526 @@ def _load_model(model_path: str, device: str, scale: int) -> torch.nn.Module:
     return model
 
 
-def _denoise_tensor(tensor: torch.Tensor, strength: float = 0.5) -> torch.Tensor:
-    """Apply Gaussian denoising to reduce artifacts before AI upscaling"""
-    if strength <= 0:
-        return tensor
+def _load_model(model_path: str, device: str, scale: int, use_compiled: bool = True) -> torch.nn.Module:
+    if not os.path.exists(model_path):
+        raise NotImplementedError(
+            f"SRGAN model not found at {model_path}. Download swift_srgan_4x.pth first."
+        )
 
-    kernel_size = max(3, int(strength * 7) | 1)
-    sigma = strength * 2.0
+    force_state = os.environ.get("SRGAN_MODEL_FORMAT", "").lower() == "pth"
+    if model_path.endswith((".pt", ".ts")) and not force_state:
+        model = torch.jit.load(model_path, map_location=device)
+        model.eval()
+        return model
+
+    # Prefer the cached TorchScript export of these weights (export_model.py)
+    if use_compiled:
+        model = load_compiled_model(
+            model_path, scale, device,
+            build=lambda: _load_eager_model(model_path, device, scale),
+        )
+        if model is not None:
+            return model
+
+    return _load_eager_model(model_path, device, scale)
+
+
+def _prepare_model(model_path: str, device: str, scale: int, use_fp16: bool,
+                   quantize: str = "off") -> torch.nn.Module:
+    # int8 always runs the calibrated model through ONNX Runtime
+    if quantize == "int8":
+        model = load_onnx_model(model_path, scale, device, quantized=True)
+        if model is not None:
+            return model
+
+    # Inference backend: torch (default) or onnxruntime (CPU)
+    backend = os.environ.get("SRGAN_BACKEND", "torch").lower()
+    if backend == "onnxruntime":
+        model = load_onnx_model(
+            model_path, scale, device,
+            build=lambda: _load_eager_model(model_path, "cpu", scale),
+        )
+        if model is not None:
+            return model
+    elif backend != "torch":
+        print(f"Warning: Unknown SRGAN_BACKEND '{backend}', using torch", file=sys.stderr)
+
+    model = _load_model(model_path, device, scale=scale)
+    if os.environ.get("SRGAN_CHANNELS_LAST", "1") == "1":
+        model = to_channels_last(model)
+    if use_fp16:
+        model = model.half()
+    return model
+
+
+def _is_oom_error(exc: BaseException) -> bool:
+    """Return True if exc is a CUDA or CPU allocator out-of-memory failure"""
+    oom_type = getattr(torch.cuda, "OutOfMemoryError", None)
+    if oom_type is not None and isinstance(exc, oom_type):
+        return True
+    if isinstance(exc, MemoryError):
+        return True
+    message = str(exc).lower()
+    return isinstance(exc, RuntimeError) and (
+        "out of memory" in message or "can't allocate memory" in message
+    )
+
+
+class _BatchInferencer:
+    """
+    Runs the generator over N×3×H×W batches.
+
+    If a forward pass runs out of memory the batch is split in half and
+    retried, and the smaller size is kept for the rest of the job. With
+    tile_size set, frames are upscaled in overlapping tiles instead of
+    whole (see srgan_inference.tiled_forward).
+    """
+
+    def __init__(self, model: torch.nn.Module, batch_size: int, device: str, use_fp16: bool,
+                 tile_size: int = 0, tile_overlap: int = 16, tile_batch: int = 1,
+                 use_bf16: bool = False):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.device = device
+        self.use_fp16 = use_fp16
+        self.use_bf16 = use_bf16
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_batch = tile_batch
+
+    def _forward(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            if self.use_fp16:
+                with torch.autocast("cuda", dtype=torch.float16):
+                    return self.model(batch.half())
+            if self.use_bf16:
+                with torch.autocast("cpu", dtype=torch.bfloat16):
+                    return self.model(batch).float()
+            return self.model(batch)
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        if self.tile_size > 0:
+            return tiled_forward(self._run_batched, batch, self.tile_size,
+                                 self.tile_overlap, self.tile_batch)
+        return self._run_batched(batch)
+
+    def _run_batched(self, batch: torch.Tensor) -> torch.Tensor:
+        outputs = []
+        start = 0
+        while start < batch.shape[0]:
+            chunk = batch[start:start + self.batch_size]
+            try:
+                outputs.append(self._forward(chunk))
+            except Exception as e:
+                if not _is_oom_error(e) or chunk.shape[0] == 1:
+                    raise
+                if self.device.startswith("cuda"):
+                    torch.cuda.empty_cache()
+                self.batch_size = max(1, chunk.shape[0] // 2)
+                print(f"Warning: Out of memory at batch size {chunk.shape[0]}, "
+                      f"retrying with batch size {self.batch_size}", file=sys.stderr)
+                continue
+            start += chunk.shape[0]
+        return outputs[0] if len(outputs) == 1 else torch.cat(outputs, dim=0)
+
+
+class _StderrCollector:
+    """
+    Drains an ffmpeg process's stderr on a background thread.
+
+    Keeps the last lines for error reporting so a chatty ffmpeg can never
+    block on a full stderr pipe.
+    """
+
+    def __init__(self, stream, max_lines: int = 200):
+        self.stream = stream
+        self.lines: "collections.deque[str]" = collections.deque(maxlen=max_lines)
+        self.thread = threading.Thread(target=self._run, name="stderr-thread", daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        for line in iter(self.stream.readline, b""):
+            self.lines.append(line.decode("utf-8", errors="replace").rstrip())
+
+    def text(self, timeout: float = 5.0) -> str:
+        self.thread.join(timeout)
+        return "\n".join(self.lines)
+
+
+class _FramePool:
+    """
+    Fixed set of reusable H×W×3 uint8 frame buffers with reference counts.
+
+    Buffers are handed around by index. acquire() blocks until one is free,
+    which also bounds how far a producer can run ahead; every holder (a
+    pending batch, the writer queue, the last-output slot) takes a
+    reference and drops it with release(). Buffers are pinned on CUDA so
+    host/device copies can use DMA.
+    """
+
+    def __init__(self, shape, count: int, pin: bool = False):
+        self.tensors = [torch.empty(shape, dtype=torch.uint8, pin_memory=pin) for _ in range(count)]
+        self.arrays = [tensor.numpy() for tensor in self.tensors]
+        self.views = [memoryview(array).cast("B") for array in self.arrays]
+        self.refs = [0] * count
+        self.free = list(range(count))
+        self.cond = threading.Condition()
+
+    def acquire(self, stopped: Optional[threading.Event] = None) -> Optional[int]:
+        """Take a free buffer, or return None if stopped is set while waiting"""
+        with self.cond:
+            while not self.free:
+                if stopped is not None and stopped.is_set():
+                    return None
+                self.cond.wait(0.5)
+            index = self.free.pop()
+            self.refs[index] = 1
+            return index
+
+    def retain(self, index: int) -> None:
+        with self.cond:
+            self.refs[index] += 1
+
+    def release(self, index: int) -> None:
+        with self.cond:
+            self.refs[index] -= 1
+            if self.refs[index] == 0:
+                self.free.append(index)
+                self.cond.notify()
+
+
+class _StageClock:
+    """
+    Busy time and frame count of one pipeline stage (decode, infer, encode).
+
+    Only the stage's own work is timed: blocking pipe reads for decode,
+    pipe writes for encode, conversion plus the model for infer. Waiting
+    on the other stages is not counted, so frames / busy seconds is the
+    rate the stage could sustain alone, and the slowest stage is the
+    bottleneck.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.seconds = 0.0
+
+    def add(self, frames: int, seconds: float) -> None:
+        self.frames += frames
+        self.seconds += seconds
+
+    def fps(self) -> Optional[float]:
+        return round(self.frames / self.seconds, 2) if self.seconds > 0 else None
+
+
+class _FrameReaderThread:
+    """
+    Reads fixed-size raw frames from the decoder pipe into pooled buffers.
+
+    Frames are read with readinto() straight into _FramePool buffers, so
+    decoding allocates nothing per frame. The bounded queue and the pool
+    provide backpressure: the decoder only runs ahead of inference by
+    queue_size frames.
+    """
+
+    def __init__(self, stream, pool: _FramePool, queue_size: int = 4):
+        self.stream = stream
+        self.pool = pool
+        self.queue: "queue.Queue[object]" = queue.Queue(maxsize=queue_size)
+        self.sentinel = object()
+        self.error: Optional[BaseException] = None
+        self.stopped = threading.Event()
+        self.clock = _StageClock()
+        self.thread = threading.Thread(target=self._run, name="reader-thread", daemon=True)
+        self.thread.start()
+
+    def _put(self, item: object) -> None:
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _fill(self, view: memoryview) -> bool:
+        """Read one whole frame into view; False at end of video"""
+        filled = 0
+        while filled < len(view):
+            count = self.stream.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        if filled != len(view):
+            if filled != 0:
+                print(f"Warning: Incomplete frame data ({filled} bytes), skipping", file=sys.stderr)
+            return False
+        return True
+
+    def _run(self) -> None:
+        try:
+            while not self.stopped.is_set():
+                index = self.pool.acquire(self.stopped)
+                if index is None:
+                    break
+                start = time.perf_counter()
+                if not self._fill(self.pool.views[index]):
+                    self.pool.release(index)
+                    break
+                self.clock.add(1, time.perf_counter() - start)
+                self._put(index)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(self.sentinel)
+
+    def read(self) -> Optional[int]:
+        """Return the pool index of the next frame, or None at end of video"""
+        item = self.queue.get()
+        if item is self.sentinel:
+            if self.error is not None:
+                raise RuntimeError(f"FFmpeg decoder pipe failed: {self.error}")
+            return None
+        return item
+
+    def close(self) -> None:
+        self.stopped.set()
+        self.thread.join(timeout=5)
 
-    # Create Gaussian kernel
-    x = torch.arange(kernel_size, dtype=torch.float32, device=tensor.device) - (kernel_size - 1) / 2
-    gauss_1d = torch.exp(-x**2 / (2 * sigma**2))
-    gauss_1d = gauss_1d / gauss_1d.sum()
-    
-    kernel_2d = gauss_1d.view(-1, 1) @ gauss_1d.view(1, -1)
-    kernel_2d = kernel_2d.view(1, 1, kernel_size, kernel_size)
 
-    # Apply to each channel
-    from torch.nn.functional import conv2d, pad
-    denoised = []
-    for c in range(tensor.shape[1]):
-        channel = tensor[:, c:c+1, :, :]
-        p = kernel_size // 2
-        channel_padded = pad(channel, (p, p, p, p), mode='reflect')
-        denoised_channel = conv2d(channel_padded, kernel_2d, padding=0)
-        denoised.append(denoised_channel)
+class _FrameWriterThread:
+    """
+    Writes upscaled frames to the encoder pipe from a bounded queue.
+
+    Mirrors _WriterThread in your_model_file.py, but queues _FramePool
+    indexes and writes each buffer through a memoryview, releasing it once
+    written. If the pipe breaks the error is recorded, remaining frames
+    are discarded so the producer never blocks, and the next write()
+    raises.
+    """
+
+    def __init__(self, stream, pool: _FramePool, queue_size: int = 4):
+        self.stream = stream
+        self.pool = pool
+        self.queue: "queue.Queue[object]" = queue.Queue(maxsize=queue_size)
+        self.sentinel = object()
+        self.error: Optional[BaseException] = None
+        self.closed = False
+        self.clock = _StageClock()
+        self.thread = threading.Thread(target=self._run, name="writer-thread", daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is self.sentinel:
+                break
+            if self.error is None:
+                try:
+                    start = time.perf_counter()
+                    self.stream.write(self.pool.views[item])
+                    self.clock.add(1, time.perf_counter() - start)
+                except (BrokenPipeError, OSError, ValueError) as e:
+                    self.error = e
+            self.pool.release(item)
+
+    def write(self, index: int) -> None:
+        """Queue pool buffer index for writing; the writer takes its own reference"""
+        if self.error is not None:
+            raise self.error
+        self.pool.retain(index)
+        self.queue.put(index)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.queue.put(self.sentinel)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+_YUV_PIPE_FORMATS = ("yuv420p", "nv12")
+
+
+def _is_full_range(media_info) -> bool:
+    """True for full-range ("pc"/JPEG) video, going by the probed range and pixel format"""
+    color_range = (media_info.get("color_range") or "").lower()
+    return color_range in ("pc", "jpeg") or (media_info.get("pix_fmt") or "").startswith("yuvj")
+
+
+def _pipe_frame_shape(pipe_format: str, height: int, width: int):
+    """Shape of one raw frame on the ffmpeg pipe (flat bytes for YUV 4:2:0)"""
+    if pipe_format in _YUV_PIPE_FORMATS:
+        return (height * width * 3 // 2,)
+    return (height, width, 3)
+
+
+class _FrameConverter:
+    """
+    Moves frames between pooled raw pipe buffers and the model's float
+    N×3×H×W RGB layout through preallocated tensors.
+
+    Input frames are copied into a (pinned) staging batch and converted
+    into a reused float buffer (rgb24) or through yuv420_to_rgb (yuv420p,
+    nv12); results are rounded in place and cast straight into output
+    pool buffers. Nothing on the rgb24 path allocates per frame apart from
+    the model's own activations.
+    """
+
+    def __init__(self, batch_size: int, height: int, width: int, device: str,
+                 pipe_format: str = "rgb24", matrix: str = "bt709"):
+        self.height = height
+        self.width = width
+        self.pipe_format = pipe_format
+        self.matrix = matrix
+        pin = device.startswith("cuda")
+        self.staging = torch.empty(
+            (batch_size,) + _pipe_frame_shape(pipe_format, height, width),
+            dtype=torch.uint8, pin_memory=pin,
+        )
+        self.device_staging = (
+            torch.empty_like(self.staging, device=device) if pin else self.staging
+        )
+        # Channels-last, like the decoded frames, so the uint8 -> float
+        # conversion is a straight element-wise copy
+        self.batch = torch.empty(
+            (batch_size, height, width, 3), dtype=torch.float32, device=device
+        ).permute(0, 3, 1, 2)
+
+    def _split_planes(self, frames: torch.Tensor, height: int, width: int):
+        """View flat YUV 4:2:0 frames as (y, u, v) planes"""
+        count = frames.shape[0]
+        luma = height * width
+        y = frames[:, :luma].view(count, height, width)
+        if self.pipe_format == "nv12":
+            uv = frames[:, luma:].view(count, height // 2, width // 2, 2)
+            return y, uv[..., 0], uv[..., 1]
+        chroma = luma // 4
+        u = frames[:, luma:luma + chroma].view(count, height // 2, width // 2)
+        v = frames[:, luma + chroma:].view(count, height // 2, width // 2)
+        return y, u, v
+
+    def load(self, pool: _FramePool, indexes, denoiser: Optional[GaussianDenoiser] = None) -> torch.Tensor:
+        """Gather pool frames into an RGB float batch (values in [0, 1]), denoised if given"""
+        count = len(indexes)
+        for slot, index in enumerate(indexes):
+            self.staging[slot].copy_(pool.tensors[index])
+        frames = self.staging[:count]
+        if self.device_staging is not self.staging:
+            self.device_staging[:count].copy_(frames, non_blocking=True)
+            frames = self.device_staging[:count]
+        if self.pipe_format in _YUV_PIPE_FORMATS:
+            batch = yuv420_to_rgb(*self._split_planes(frames, self.height, self.width), self.matrix)
+            return denoiser(batch) if denoiser is not None else batch
+        batch = self.batch[:count]
+        batch.copy_(frames.permute(0, 3, 1, 2))
+        if denoiser is not None:
+            # Normalization is folded into the denoise pass
+            return denoiser(batch, scale=1.0 / 255.0)
+        return batch.div_(255.0)
+
+    def store(self, upscaled: torch.Tensor, pool: _FramePool):
+        """Write an upscaled RGB float batch into newly acquired pool buffers"""
+        upscaled = upscaled.clamp_(0, 1)
+        indexes = []
+        if self.pipe_format in _YUV_PIPE_FORMATS:
+            height, width = upscaled.shape[-2:]
+            y, u, v = rgb_to_yuv420(upscaled, self.matrix)
+            for frame in range(upscaled.shape[0]):
+                index = pool.acquire()
+                out_y, out_u, out_v = self._split_planes(pool.tensors[index].unsqueeze(0), height, width)
+                out_y[0].copy_(y[frame])
+                out_u[0].copy_(u[frame])
+                out_v[0].copy_(v[frame])
+                indexes.append(index)
+            return indexes
+
+        upscaled = upscaled.mul_(255).round_()
+        for frame in upscaled:
+            index = pool.acquire()
+            pool.tensors[index].copy_(frame.permute(1, 2, 0))
+            indexes.append(index)
+        return indexes
+
+
+class _DuplicateFrameDetector:
+    """
+    Flags decoded frames that repeat the last frame sent to the model.
+
+    Frames are compared against the last *upscaled* frame rather than the
+    previous decoded one, so a slow fade can't drift across many frames
+    while reusing a stale output. threshold is the largest per-pixel
+    absolute difference (0-255 scale) that still counts as a duplicate,
+    to absorb decoder noise; 0 (the default) means bit-identical only.
+    It is a per-pixel bound rather than a frame average, so a small
+    change such as a subtitle, a mouth or a cursor is never skipped.
+    """
+
+    def __init__(self, threshold: float = 0.0):
+        self.threshold = threshold
+        self.reference = None
+        self.frames = 0
+        self.skipped = 0
+
+    def is_duplicate(self, frame: np.ndarray) -> bool:
+        self.frames += 1
+        reference = self.reference
+        if reference is not None:
+            if np.array_equal(frame, reference):
+                duplicate = True
+            elif self.threshold > 0:
+                # |a - b| without leaving uint8
+                diff = np.maximum(frame, reference) - np.minimum(frame, reference)
+                duplicate = int(diff.max()) <= self.threshold
+            else:
+                duplicate = False
+            if duplicate:
+                self.skipped += 1
+                return True
+            # frame is a reused pool buffer, so keep a copy
+            np.copyto(reference, frame)
+        else:
+            self.reference = frame.copy()
+        return False
+
+
+class UpscaleCancelled(RuntimeError):
+    """upscale() was stopped through its cancel event"""
+
+
+def _upscale_batch(batch: torch.Tensor, inferencer: _BatchInferencer, out_size) -> torch.Tensor:
+    """Upscale an N×3×H×W float batch in [0, 1] to out_size"""
+    # AI upscale
+    upscaled = inferencer(batch)
 
-    denoised_tensor = torch.cat(denoised, dim=1)
-    alpha = min(1.0, strength)
-    return tensor * (1 - alpha) + denoised_tensor * alpha
+    # Resize if needed
+    if upscaled.shape[-2:] != out_size:
+        upscaled = torch.nn.functional.interpolate(
+            upscaled, size=out_size,
+            mode='bicubic', align_corners=False
+        )
+    return upscaled
 
 
-def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.0):
+def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.0,
+            model_cache=None, video_only=False, media_info=None, on_progress=None,
+            start_time=None, max_frames=None, cancel=None, cpu_share=1):
     """
     AI upscale video using SRGAN model with FFmpeg for video I/O
     
-    This version uses FFmpeg subprocess instead of torchaudio.io for better compatibility
+    This version uses FFmpeg subprocess instead of torchaudio.io for better compatibility.
+    Pass the pipeline worker's model_cache to reuse a warm model across jobs.
+    With video_only=True audio/subtitles are not copied (used for segments).
+    media_info is the srgan_probe.probe_media() result when the caller
+    already has it; otherwise the input is probed here. on_progress, if
+    given, is called after each batch with the number of frames written
+    and the decode/infer/encode stage rates (see _StageClock).
+    start_time (seconds) and max_frames restrict the job to max_frames
+    frames from the first frame at or after start_time, decoded from the
+    nearest keyframe before it (used for segments). Setting cancel (a
+    threading.Event) stops the job after the current batch: both ffmpeg
+    processes are killed and UpscaleCancelled is raised. cpu_share is the
+    number of upscale() calls running at once in this process; they split
+    its inference threads (see srgan_inference.configure_runtime).
     """
     print("=" * 80, file=sys.stderr)
     print("AI Upscaling with FFmpeg backend", file=sys.stderr)
@@ -141,14 +638,35 @@ def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.
     model_path = os.environ.get("SRGAN_MODEL_PATH", "/app/models/swift_srgan_4x.pth")
     scale_factor = int(scale) if scale >= 2 else 2
     use_fp16 = device == "cuda" and os.environ.get("SRGAN_FP16", "1") == "1"
+    quantize = cpu_quantize_mode(device)
+    runtime = configure_runtime(device, cpu_share)
     enable_denoise = os.environ.get("SRGAN_DENOISE", "1") == "1"
     denoise_strength = float(os.environ.get("SRGAN_DENOISE_STRENGTH", "0.5"))
+    batch_size = max(1, int(os.environ.get("SRGAN_BATCH_SIZE", "1") or "1"))
+    queue_size = max(1, int(os.environ.get("SRGAN_PIPELINE_QUEUE_SIZE", "4") or "4"))
+    tile_size = int(os.environ.get("SRGAN_TILE_SIZE", "0") or "0")
+    tile_overlap = int(os.environ.get("SRGAN_TILE_OVERLAP", "16") or "16")
+    tile_batch = max(1, int(os.environ.get("SRGAN_TILE_BATCH", "1") or "1"))
+    pipe_format = os.environ.get("SRGAN_PIPE_FORMAT", "rgb24").lower() or "rgb24"
+    skip_duplicates = os.environ.get("SRGAN_SKIP_DUPLICATES", "1") == "1"
+    duplicate_threshold = float(os.environ.get("SRGAN_DUPLICATE_THRESHOLD", "0") or "0")
     
     print(f"Configuration:", file=sys.stderr)
     print(f"  Model: {model_path}", file=sys.stderr)
     print(f"  Device: {device}", file=sys.stderr)
     print(f"  FP16: {use_fp16}", file=sys.stderr)
+    if quantize != "off":
+        print(f"  Quantization: {quantize}", file=sys.stderr)
+    print(f"  Threads: {runtime['intra_op_threads']} intra-op, {runtime['inter_op_threads']} inter-op"
+          f" (CPU shared by {runtime['cpu_share']} process(es)/segment(s))", file=sys.stderr)
+    print(f"  Channels-last: {runtime['channels_last']}", file=sys.stderr)
     print(f"  Scale: {scale_factor}x", file=sys.stderr)
+    print(f"  Batch size: {batch_size}", file=sys.stderr)
+    if tile_size > 0:
+        print(f"  Tiling: {tile_size}px tiles, {tile_overlap}px overlap, {tile_batch} per pass", file=sys.stderr)
+    if skip_duplicates:
+        match = f"max pixel difference {duplicate_threshold:g}" if duplicate_threshold > 0 else "exact"
+        print(f"  Duplicate frame skipping: {match}", file=sys.stderr)
     print(f"  Denoising: {'Enabled' if enable_denoise else 'Disabled'}", file=sys.stderr)
     if enable_denoise:
         print(f"  Denoise Strength: {denoise_strength}", file=sys.stderr)
@@ -156,44 +674,55 @@ def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.
     
     # Load model
     print("Loading AI model...", file=sys.stderr)
-    model = _load_model(model_path, device, scale=scale_factor)
-    if use_fp16:
-        model = model.half()
+    if model_cache is not None:
+        model = model_cache.get(
+            model_path, model_cache_key(device, scale_factor, use_fp16, quantize),
+            lambda: _prepare_model(model_path, device, scale_factor, use_fp16, quantize)
+        )
+    else:
+        model = _prepare_model(model_path, device, scale_factor, use_fp16, quantize)
     print("✓ Model loaded", file=sys.stderr)
     print("", file=sys.stderr)
     
     # Get input video info
     print("Analyzing input video...", file=sys.stderr)
-    probe_cmd = [
-        "ffprobe", "-v", "error",
-        "-select_streams", "v:0",
-        "-show_entries", "stream=width,height,r_frame_rate,codec_name",
-        "-of", "default=noprint_wrappers=1",
-        input_path
-    ]
-    probe_output = subprocess.check_output(probe_cmd, text=True)
-    
-    # Parse video info
-    info = {}
-    for line in probe_output.strip().split('\n'):
-        if '=' in line:
-            key, value = line.split('=', 1)
-            info[key] = value
+    if media_info is None:
+        media_info = probe_media(input_path)
+    if not media_info:
+        raise ValueError(f"No video stream found in input: {input_path}")
     
-    src_width = int(info.get('width', 1920))
-    src_height = int(info.get('height', 1080))
-    fps_str = info.get('r_frame_rate', '24/1')
-    if '/' in fps_str:
-        num, den = map(int, fps_str.split('/'))
-        fps = num / den if den > 0 else 24
-    else:
-        fps = float(fps_str)
+    src_width = media_info["width"] or 1920
+    src_height = media_info["height"] or 1080
+    fps = media_info["fps"] or 24
     
     out_width = int(width) if width else src_width * scale_factor
     out_height = int(height) if height else src_height * scale_factor
     
     print(f"✓ Input: {src_width}x{src_height} @ {fps:.2f} fps", file=sys.stderr)
     print(f"✓ Output: {out_width}x{out_height}", file=sys.stderr)
+    
+    # YUV 4:2:0 halves pipe bandwidth but needs even dimensions
+    color_matrix = "bt709"
+    if pipe_format in _YUV_PIPE_FORMATS:
+        if any(size % 2 for size in (src_width, src_height, out_width, out_height)):
+            print(f"Warning: {pipe_format} pipes need even dimensions, using rgb24", file=sys.stderr)
+            pipe_format = "rgb24"
+        elif _is_full_range(media_info):
+            # yuv420_to_rgb/rgb_to_yuv420 are limited-range only, and whether
+            # ffmpeg rescales full-range samples for a yuv420p pipe depends
+            # on its version; its own RGB conversion gets either right
+            print(f"Warning: Full-range source, using rgb24 instead of {pipe_format}", file=sys.stderr)
+            pipe_format = "rgb24"
+        else:
+            color_space = (media_info.get("color_space") or "").lower()
+            if color_space.startswith("bt2020"):
+                color_matrix = "bt2020"
+            elif color_space in ("bt470bg", "smpte170m") or (not color_space and src_height < 720):
+                color_matrix = "bt601"
+            print(f"✓ Pipe format: {pipe_format} ({color_matrix})", file=sys.stderr)
+    elif pipe_format != "rgb24":
+        print(f"Warning: Unknown SRGAN_PIPE_FORMAT '{pipe_format}', using rgb24", file=sys.stderr)
+        pipe_format = "rgb24"
     print("", file=sys.stderr)
     
     # Validate output format
@@ -203,12 +732,22 @@ def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.
     
     # Start FFmpeg to read frames
     print("Starting AI upscaling...", file=sys.stderr)
-    ffmpeg_input = [
-        "ffmpeg", "-i", input_path,
+    ffmpeg_input = ["ffmpeg"]
+    if start_time is not None:
+        # Decodes from the keyframe before start_time and drops the frames
+        # before it, so any frame can start a segment (open GOPs included)
+        ffmpeg_input.extend(["-ss", f"{max(0.0, start_time):.6f}"])
+    ffmpeg_input.extend(["-i", input_path])
+    if start_time is not None or max_frames is not None:
+        # Every decoded frame exactly once, whatever the source's timing
+        ffmpeg_input.extend(["-map", "0:v:0", "-vsync", "passthrough"])
+    if max_frames is not None:
+        ffmpeg_input.extend(["-frames:v", str(max_frames)])
+    ffmpeg_input.extend([
         "-f", "rawvideo",
-        "-pix_fmt", "rgb24",
+        "-pix_fmt", pipe_format,
         "-"
-    ]
+    ])
     
     # Start FFmpeg to write frames
     encoder = os.environ.get("SRGAN_FFMPEG_ENCODER", "hevc_nvenc")
@@ -217,17 +756,22 @@ def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.
     ffmpeg_output = [
         "ffmpeg", "-y",
         "-f", "rawvideo",
-        "-pix_fmt", "rgb24",
+        "-pix_fmt", pipe_format,
         "-s", f"{out_width}x{out_height}",
         "-r", str(fps),
         "-i", "-",  # Read from stdin
-        "-i", input_path,  # For audio/subtitle streams
-        "-map", "0:v:0",  # Video from pipe
-        "-map", "1:a?",   # Audio from input file
-        "-map", "1:s?",   # Subtitles from input file
+    ]
+    if not video_only:
+        ffmpeg_output.extend([
+            "-i", input_path,  # For audio/subtitle streams
+            "-map", "0:v:0",  # Video from pipe
+            "-map", "1:a?",   # Audio from input file
+            "-map", "1:s?",   # Subtitles from input file
+        ])
+    ffmpeg_output.extend([
         "-c:v", encoder,
         "-preset", preset,
-    ]
+    ])
     
     # Quality settings
     if "nvenc" in encoder.lower():
@@ -235,83 +779,141 @@ def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.
     else:
         ffmpeg_output.extend(["-crf", "18"])
     
-    ffmpeg_output.extend([
-        "-c:a", "copy",
-        "-c:s", "copy",
-        output_path
-    ])
+    # YUV pipes carry the source's own samples, so keep its color tags
+    if pipe_format in _YUV_PIPE_FORMATS:
+        for option, key in (("-colorspace", "color_space"), ("-color_trc", "color_transfer"),
+                            ("-color_primaries", "color_primaries")):
+            if media_info.get(key) and media_info[key] != "unknown":
+                ffmpeg_output.extend([option, media_info[key]])
     
-    # Process video frame by frame
+    if not video_only:
+        ffmpeg_output.extend(["-c:a", "copy", "-c:s", "copy"])
+    ffmpeg_output.append(output_path)
+    
+    # Decode, inference and encode run as three overlapping stages:
+    # reader thread -> main thread (model) -> writer thread
     input_proc = subprocess.Popen(ffmpeg_input, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     output_proc = subprocess.Popen(ffmpeg_output, stdin=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=10**8)
+    input_stderr = _StderrCollector(input_proc.stderr)
+    output_stderr = _StderrCollector(output_proc.stderr)
     
-    frame_size = src_width * src_height * 3  # RGB24
     frame_count = 0
+    inferencer = _BatchInferencer(model, batch_size, device, use_fp16,
+                                  tile_size, tile_overlap, tile_batch,
+                                  use_bf16=quantize == "bf16")
+    
+    # Preallocated frame buffers: decoded frames are read into input_pool,
+    # staged through converter, and upscaled frames written from output_pool
+    reader_queue_size = max(queue_size, batch_size)
+    pin = device.startswith("cuda")
+    input_pool = _FramePool(_pipe_frame_shape(pipe_format, src_height, src_width),
+                            reader_queue_size + batch_size + 2, pin)
+    output_pool = _FramePool(_pipe_frame_shape(pipe_format, out_height, out_width),
+                             queue_size + batch_size + 3, pin)
+    converter = _FrameConverter(batch_size, src_height, src_width, device,
+                                pipe_format, color_matrix)
+    denoiser = GaussianDenoiser(denoise_strength, device=device) if enable_denoise else None
     
-    # Capture stderr once to avoid multiple read attempts
-    output_stderr = None
+    # pending holds input_pool indexes in order; None marks a duplicate of
+    # the frame before it, which reuses that frame's upscaled output
+    pending = []
+    pending_unique = 0
+    last_output = None
+    detector = _DuplicateFrameDetector(duplicate_threshold) if skip_duplicates else None
+    reader = _FrameReaderThread(input_proc.stdout, input_pool, reader_queue_size)
+    writer = _FrameWriterThread(output_proc.stdin, output_pool, queue_size)
+    infer_clock = _StageClock()
     
     try:
         while True:
+            if cancel is not None and cancel.is_set():
+                raise UpscaleCancelled(f"Upscaling cancelled after {frame_count} frames")
+            
             # Check if output process has died
             if output_proc.poll() is not None:
-                # Read and cache stderr once
-                if output_stderr is None:
-                    output_stderr = output_proc.stderr.read().decode('utf-8', errors='replace')
-                raise RuntimeError(f"FFmpeg encoder died unexpectedly:\n{output_stderr}")
+                raise RuntimeError(f"FFmpeg encoder died unexpectedly:\n{output_stderr.text()}")
             
             # Read frame
-            frame_data = input_proc.stdout.read(frame_size)
-            if len(frame_data) != frame_size:
-                if len(frame_data) == 0:
-                    break  # End of video
+            index = reader.read()
+            end_of_video = index is None
+            if not end_of_video:
+                if detector is not None and detector.is_duplicate(input_pool.arrays[index]):
+                    input_pool.release(index)
+                    pending.append(None)
                 else:
-                    print(f"Warning: Incomplete frame data ({len(frame_data)} bytes), skipping", file=sys.stderr)
-                    break
-            
-            # Convert to tensor (copy to make writable)
-            frame = np.frombuffer(frame_data, dtype=np.uint8).reshape(src_height, src_width, 3).copy()
-            frame_tensor = torch.from_numpy(frame).permute(2, 0, 1).unsqueeze(0).float() / 255.0
-            frame_tensor = frame_tensor.to(device)
+                    pending.append(index)
+                    pending_unique += 1
             
-            # Apply denoising
-            if enable_denoise:
-                frame_tensor = _denoise_tensor(frame_tensor, denoise_strength)
-            
-            # AI upscale
-            with torch.no_grad():
-                if use_fp16:
-                    with torch.autocast("cuda", dtype=torch.float16):
-                        upscaled = model(frame_tensor.half())
-                else:
-                    upscaled = model(frame_tensor)
-            
-            # Resize if needed
-            if upscaled.shape[-2:] != (out_height, out_width):
-                upscaled = torch.nn.functional.interpolate(
-                    upscaled, size=(out_height, out_width),
-                    mode='bicubic', align_corners=False
-                )
-            
-            # Convert back to bytes
-            upscaled = upscaled.clamp(0, 1).mul(255).round().byte()
-            upscaled = upscaled.squeeze(0).permute(1, 2, 0).cpu().numpy()
-            
-            # Write frame
-            try:
-                output_proc.stdin.write(upscaled.tobytes())
-            except BrokenPipeError:
-                # Read and cache stderr once if not already read
-                if output_stderr is None:
-                    output_stderr = output_proc.stderr.read().decode('utf-8', errors='replace')
-                raise RuntimeError(f"FFmpeg encoder pipe broken:\n{output_stderr}")
+            # Upscale a full batch, or whatever is left at end of video.
+            # A run of duplicates with nothing to infer is written straight away.
+            if pending and (end_of_video or pending_unique >= batch_size or pending_unique == 0):
+                unique = [index for index in pending if index is not None]
+                upscaled_frames = iter(())
+                if unique:
+                    start = time.perf_counter()
+                    batch = converter.load(input_pool, unique, denoiser)
+                    for index in unique:
+                        input_pool.release(index)
+                    upscaled = _upscale_batch(batch, inferencer, (out_height, out_width))
+                    upscaled_frames = iter(converter.store(upscaled, output_pool))
+                    infer_clock.add(len(unique), time.perf_counter() - start)
+                
+                for index in pending:
+                    if index is not None:
+                        if last_output is not None:
+                            output_pool.release(last_output)
+                        last_output = next(upscaled_frames)
+                    
+                    # Write frame
+                    try:
+                        writer.write(last_output)
+                    except (BrokenPipeError, OSError, ValueError):
+                        raise RuntimeError(f"FFmpeg encoder pipe broken:\n{output_stderr.text()}")
+                    
+                    frame_count += 1
+                    if frame_count % 30 == 0:
+                        print(f"  Processed {frame_count} frames...", file=sys.stderr)
+                pending = []
+                pending_unique = 0
+                if on_progress is not None:
+                    on_progress(frame_count, {
+                        "decode": reader.clock.fps(),
+                        "infer": infer_clock.fps(),
+                        "encode": writer.clock.fps(),
+                    })
             
-            frame_count += 1
-            if frame_count % 30 == 0:
-                print(f"  Processed {frame_count} frames...", file=sys.stderr)
+            if end_of_video:
+                break
+        
+        # Wait for the encoder to consume every queued frame
+        try:
+            writer.close()
+        except (BrokenPipeError, OSError, ValueError):
+            raise RuntimeError(f"FFmpeg encoder pipe broken:\n{output_stderr.text()}")
+        
+        # A decoder that exits non-zero means frames were lost, not end of video
+        if input_proc.wait() != 0:
+            raise RuntimeError(
+                f"FFmpeg decoder failed (exit code {input_proc.returncode}):\n{input_stderr.text()}"
+            )
+        
+        try:
+            output_proc.stdin.close()
+        except BrokenPipeError:
+            pass  # Reported through the exit code below
+        if output_proc.wait() != 0:
+            raise RuntimeError(
+                f"FFmpeg encoder failed (exit code {output_proc.returncode}):\n{output_stderr.text()}"
+            )
         
         print("", file=sys.stderr)
         print(f"✓ Processed {frame_count} frames total", file=sys.stderr)
+        print(f"✓ Stage throughput: decode {reader.clock.fps() or 0:.1f} fps, "
+              f"infer {infer_clock.fps() or 0:.1f} fps, encode {writer.clock.fps() or 0:.1f} fps",
+              file=sys.stderr)
+        if detector is not None:
+            percent = 100.0 * detector.skipped / max(1, detector.frames)
+            print(f"✓ Skipped inference on {detector.skipped} duplicate frames ({percent:.1f}%)", file=sys.stderr)
         
     except Exception as e:
         # Clean up processes on error
@@ -326,6 +928,11 @@ def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.
         raise
     finally:
         # Normal cleanup
+        reader.close()
+        try:
+            writer.close()
+        except Exception:
+            pass
         try:
             input_proc.stdout.close()
         except:
@@ -337,14 +944,6 @@ def upscale(input_path: str, output_path: str, width=None, height=None, scale=2.
         except:
             pass
         output_proc.wait()
-        
-        # Check for FFmpeg errors
-        if output_proc.returncode != 0:
-            # Use cached stderr if already read, otherwise read it now
-            if output_stderr is None:
-                output_stderr = output_proc.stderr.read().decode('utf-8', errors='replace')
-            print(f"FFmpeg encoder error (exit code {output_proc.returncode}):", file=sys.stderr)
-            print(output_stderr, file=sys.stderr)
     
     print("✓ AI upscaling complete", file=sys.stderr)
     print("=" * 80, file=sys.stderr)